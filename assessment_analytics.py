@@ -0,0 +1,118 @@
+from db import get_collection
+from ttl_cache import TTLCache
+from dyslexia_features import N_ROUNDS
+
+# Demographic fields a cohort is made of, db.ensure_indexes creates the
+# matching compound indexes
+COHORT_FIELDS = ['Age', 'Gender', 'Nativelang']
+SUMMARY_COLLECTION = 'assessment_summary'
+
+# Answers to cohort queries, keyed by the query parameters
+_result_cache = TTLCache(max_size=256, ttl=60.0)
+
+def _summary_pipeline(cohorts):
+    """Aggregation grouping raw rows into per-cohort sums"""
+    group = {
+        '_id': {field: f'${field}' for field in COHORT_FIELDS},
+        'count': {'$sum': 1},
+        'dyslexia_count': {'$sum': {'$cond': [{'$eq': ['$Dyslexia', 'Yes']}, 1, 0]}}
+    }
+    for round_number in range(1, N_ROUNDS + 1):
+        group[f'accuracy_sum_{round_number}'] = {'$sum': f'$Accuracy{round_number}'}
+
+    pipeline = [{'$group': group}]
+    if cohorts is not None:
+        match = [dict(zip(COHORT_FIELDS, cohort)) for cohort in cohorts]
+        pipeline.insert(0, {'$match': {'$or': match}})
+    return pipeline
+
+def _summary_id(source, cohort):
+    return ':'.join([source] + [str(value) for value in cohort])
+
+def refresh_summary(source='assessments', cohorts=None):
+    """
+    Materialize per-cohort sums of a raw assessment collection
+    Sums (not means) are stored so any coarser grouping can be rolled up
+    exactly at query time.
+    Args:
+        source: Raw collection loaded from Dyt-desktop.csv
+        cohorts: Iterable of (Age, Gender, Nativelang) tuples to recompute,
+            None recomputes every cohort
+    Returns:
+        refreshed: Number of cohort documents written or removed
+    """
+    if cohorts is not None:
+        cohorts = list(cohorts)
+        if not cohorts:
+            return 0
+
+    summary = get_collection(SUMMARY_COLLECTION)
+    written = set()
+    for group in get_collection(source).aggregate(_summary_pipeline(cohorts)):
+        cohort = tuple(group['_id'].get(field) for field in COHORT_FIELDS)
+        document = dict(zip(COHORT_FIELDS, cohort))
+        document.update({
+            'source': source,
+            'count': group['count'],
+            'dyslexia_count': group['dyslexia_count'],
+            'accuracy_sums': [group[f'accuracy_sum_{round_number}']
+                              for round_number in range(1, N_ROUNDS + 1)]
+        })
+        summary_id = _summary_id(source, cohort)
+        summary.replace_one({'_id': summary_id}, document, upsert=True)
+        written.add(summary_id)
+
+    # Cohorts that no longer have any rows
+    if cohorts is None:
+        stale = {'source': source, '_id': {'$nin': list(written)}}
+    else:
+        stale = {'_id': {'$in': [_summary_id(source, cohort) for cohort in cohorts
+                                 if _summary_id(source, cohort) not in written]}}
+    removed = summary.delete_many(stale).deleted_count
+
+    _result_cache.clear()
+    return len(written) + removed
+
+def cohort_stats(source='assessments', group_by=('Gender',), filters=None):
+    """
+    Dyslexia rate and mean Accuracy per round for each cohort
+    Args:
+        source: Raw collection the summary was built from
+        group_by: Cohort fields to group the answer by
+        filters: Dict of cohort field values to restrict to
+    Returns:
+        cohorts: List of dicts with the group_by values, count,
+            dyslexia_rate and mean_accuracy (one value per round)
+    """
+    filters = filters or {}
+    key = (source, tuple(group_by), tuple(sorted(filters.items())))
+    cached = _result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    query = dict(filters, source=source)
+    groups = {}
+    for document in get_collection(SUMMARY_COLLECTION).find(query, {'_id': 0}):
+        group_key = tuple(document.get(field) for field in group_by)
+        group = groups.setdefault(group_key, {'count': 0, 'dyslexia_count': 0,
+                                              'accuracy_sums': [0.0] * N_ROUNDS})
+        group['count'] += document['count']
+        group['dyslexia_count'] += document['dyslexia_count']
+        group['accuracy_sums'] = [a + b for a, b in zip(group['accuracy_sums'],
+                                                        document['accuracy_sums'])]
+
+    result = []
+    # Missing values sort last without being compared to real ones
+    ordered = sorted(groups.items(), key=lambda item: tuple((value is None, value) for value in item[0]))
+    for group_key, group in ordered:
+        count = group['count']
+        row = dict(zip(group_by, group_key))
+        row.update({
+            'count': count,
+            'dyslexia_rate': group['dyslexia_count'] / count if count else 0.0,
+            'mean_accuracy': [total / count if count else 0.0 for total in group['accuracy_sums']]
+        })
+        result.append(row)
+
+    _result_cache.set(key, result)
+    return result
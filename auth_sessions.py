@@ -0,0 +1,110 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+# Tokens are signed with SESSION_SECRET, without it a random per-process
+# secret is used and sessions do not survive a restart
+SESSION_SECRET = os.environ.get('SESSION_SECRET', '').encode() or os.urandom(32)
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 12 * 3600))
+
+PASSWORD_SCHEME = 'pbkdf2_sha256'
+PASSWORD_ITERATIONS = 260000
+
+# PBKDF2 runs on the calling request thread (it releases the GIL). At most
+# one hash per core runs at once, so a burst of logins waits here instead
+# of oversubscribing the CPU the other requests need
+_hash_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign(payload):
+    return _b64encode(hmac.new(SESSION_SECRET, payload.encode('ascii'), hashlib.sha256).digest())
+
+def issue_token(email, ttl=SESSION_TTL):
+    """
+    Create a signed session token
+    Args:
+        email: Email of the logged in user
+        ttl: Seconds the token stays valid
+    Returns:
+        token: "<payload>.<signature>" string
+    """
+    now = time.time()
+    payload = _b64encode(json.dumps({'email': email, 'iat': now, 'exp': now + ttl}).encode('utf-8'))
+    return f'{payload}.{_sign(payload)}'
+
+def verify_token(token):
+    """
+    Check a token's signature and expiry
+    Returns:
+        claims: Dict with email, iat and exp, or None if the token is invalid
+    """
+    # Issued tokens are ASCII, anything else is forged (and would make the
+    # signature comparison and payload encoding raise)
+    if not isinstance(token, str) or not token.isascii():
+        return None
+    try:
+        payload, signature = token.split('.')
+    except ValueError:
+        return None
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    return claims if claims.get('exp', 0) > time.time() else None
+
+def bearer_email(authorization):
+    """Email of a valid "Bearer <token>" Authorization header, or None"""
+    if not authorization or not authorization.startswith('Bearer '):
+        return None
+    claims = verify_token(authorization[len('Bearer '):].strip())
+    return claims.get('email') if claims else None
+
+def _pbkdf2(password, salt, iterations):
+    with _hash_slots:
+        return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+
+def hash_password(password):
+    """Hash a password (blocks the calling thread for the whole PBKDF2 run)"""
+    salt = os.urandom(16)
+    digest = _pbkdf2(password, salt, PASSWORD_ITERATIONS)
+    return f'{PASSWORD_SCHEME}${PASSWORD_ITERATIONS}${_b64encode(salt)}${_b64encode(digest)}'
+
+def is_hashed(stored):
+    """Whether a stored password is already hashed"""
+    return isinstance(stored, str) and stored.startswith(PASSWORD_SCHEME + '$')
+
+def verify_password(password, stored):
+    """
+    Compare a password with its stored value
+    Plain-text passwords migrated from users.csv are still accepted, callers
+    should re-hash them after a successful login.
+    """
+    if not isinstance(stored, str) or not isinstance(password, str):
+        return False
+
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        salt = _b64decode(salt)
+        expected = _b64decode(expected)
+        iterations = int(iterations)
+    except ValueError:
+        return False
+
+    digest = _pbkdf2(password, salt, iterations)
+    return hmac.compare_digest(digest, expected)
@@ -0,0 +1,492 @@
+"""
+Reproducible performance benchmarks for the detection, migration and auth paths
+
+Synthetic handwriting pages and Dyt-desktop-style CSVs are generated into a
+scratch directory, so runs do not depend on the private datasets. Results are
+written as JSON and can be compared with an earlier run to flag regressions:
+
+    python benchmarks.py --output bench.json
+    python benchmarks.py --profile full --compare bench.json --threshold 0.2
+
+Migration and /login benchmarks run against an in-memory mongomock database
+unless --mongo-uri points at a real server (a separate benchmark database is
+used and dropped afterwards). Credentials in the URI are not written to the
+results.
+"""
+import argparse
+import csv
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from urllib.parse import urlsplit, urlunsplit
+import numpy as np
+import cv2
+
+BENCHMARK_DB = 'dysgraphia_benchmark'
+
+# (name, width, height) of the synthetic pages
+RESOLUTIONS = [
+    ('a4_150dpi', 1240, 1754),
+    ('a4_300dpi', 2480, 3508),
+    ('photo_12mp', 4000, 3000)
+]
+# Handwritten lines per page
+DENSITIES = [('sparse', 8), ('dense', 28)]
+
+PROFILES = {
+    'quick': {'csv_rows': [10000], 'repeat': 5, 'login_seconds': 3.0},
+    'full': {'csv_rows': [10000, 100000, 1000000], 'repeat': 20, 'login_seconds': 10.0}
+}
+
+def _peak_rss_mb():
+    """Peak resident set size of this process"""
+    # ru_maxrss survives fork and exec on Linux, so a spawned worker would
+    # report its parent's peak, VmHWM starts fresh with the new process image
+    try:
+        with open('/proc/self/status', 'r') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _timings(fn, repeat):
+    """Run fn repeat times and summarize its latency in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {
+        'median_ms': float(np.median(samples)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'mean_ms': float(samples.mean())
+    }
+
+def synthetic_page(width, height, lines, seed=0):
+    """
+    Draw a page of handwriting-like text
+    Letters use OpenCV's script font with random slant, size and baseline
+    jitter so the features vary like real samples.
+    """
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width), 255, dtype=np.uint8)
+    scale = width / 1240
+    line_height = height / (lines + 2)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+
+    for line in range(lines):
+        x = int(60 * scale)
+        baseline = (line + 1.5) * line_height
+        while x < width - 120 * scale:
+            word = ''.join(rng.choice(list(letters), size=rng.integers(2, 8)))
+            font_scale = scale * rng.uniform(1.0, 1.6)
+            y = int(baseline + rng.normal(0, 4 * scale))
+            cv2.putText(page, word, (x, y), cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, font_scale, 0,
+                        max(1, int(round(2 * scale))), cv2.LINE_AA)
+            (text_width, _), _ = cv2.getTextSize(word, cv2.FONT_HERSHEY_SCRIPT_SIMPLEX, font_scale, 1)
+            x += text_width + int(rng.uniform(15, 40) * scale)
+
+    # Slant the page a little, like a tilted scan
+    shear = np.float32([[1, rng.uniform(-0.15, 0.15), 0], [0, 1, 0]])
+    return cv2.warpAffine(page, shear, (width, height), borderValue=255)
+
+def write_synthetic_pages(directory):
+    """Write one JPEG per resolution and density, returns {name: path}"""
+    pages = {}
+    for resolution, width, height in RESOLUTIONS:
+        for density, lines in DENSITIES:
+            path = os.path.join(directory, f'{resolution}_{density}.jpg')
+            cv2.imwrite(path, synthetic_page(width, height, lines))
+            pages[f'{resolution}_{density}'] = path
+    return pages
+
+def write_synthetic_csv(path, rows, seed=0):
+    """Write a Dyt-desktop-style semicolon CSV with the given number of rows"""
+    from dyslexia_features import N_ROUNDS
+    rng = np.random.default_rng(seed)
+    round_fields = ['Clicks', 'Hits', 'Misses', 'Score', 'Accuracy', 'Missrate']
+    headers = ['Gender', 'Nativelang', 'Otherlang', 'Age']
+    headers += [f'{field}{n}' for n in range(1, N_ROUNDS + 1) for field in round_fields]
+    headers.append('Dyslexia')
+
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file, delimiter=';')
+        writer.writerow(headers)
+        # Generate in chunks so a million rows stay cheap to produce
+        for chunk_start in range(0, rows, 10000):
+            n = min(10000, rows - chunk_start)
+            clicks = rng.integers(1, 30, size=(n, N_ROUNDS))
+            hits = (clicks * rng.uniform(0, 1, size=(n, N_ROUNDS))).astype(int)
+            misses = clicks - hits
+            accuracy = np.round(hits / clicks, 6)
+            genders = rng.choice(['Male', 'Female'], size=n)
+            yes_no = rng.choice(['Yes', 'No'], size=(n, 3))
+            ages = rng.integers(7, 18, size=n)
+            for i in range(n):
+                row = [genders[i], yes_no[i, 0], yes_no[i, 1], ages[i]]
+                for r in range(N_ROUNDS):
+                    row += [clicks[i, r], hits[i, r], misses[i, r], hits[i, r],
+                            accuracy[i, r], round(1 - accuracy[i, r], 6)]
+                row.append(yes_no[i, 2])
+                writer.writerow(row)
+
+def bench_features(pages, repeat):
+    """Per-stage timings of extract_features on every synthetic page"""
+    from dysgraphia_detector import DysgraphiaDetector
+    detector = DysgraphiaDetector()
+    results = {}
+
+    for name, path in pages.items():
+        image = cv2.imread(path)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        geometry = detector._extract_contour_geometry(binary)
+
+        stages = {
+            'decode': lambda: cv2.imread(path),
+            'decode_reduced_150dpi': lambda: detector.load_image(path, 150),
+            'threshold': lambda: cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU),
+            'contour_geometry': lambda: detector._extract_contour_geometry(binary),
+            'line_spacing': lambda: detector._calculate_line_spacing(geometry),
+            'letter_size_variation': lambda: detector._calculate_letter_size_variation(geometry),
+            'writing_pressure': lambda: detector._estimate_writing_pressure(binary),
+            'letter_spacing': lambda: detector._calculate_letter_spacing(geometry),
+            'slant_angle': lambda: detector._calculate_slant_angle(geometry),
+            'baseline_deviation': lambda: detector._calculate_baseline_deviation(geometry),
+            'extract_features': lambda: detector.extract_features(image)
+        }
+        results[name] = {'contours': int(geometry.count)}
+        for stage, fn in stages.items():
+            results[name][stage] = _timings(fn, repeat)
+    return results
+
+def bench_predict(pages, repeat, batch_size=1000):
+    """predict latency and batch scoring throughput of a trained detector"""
+    from dysgraphia_detector import DysgraphiaDetector, FEATURE_NAMES
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(2000, len(FEATURE_NAMES))) * [50, 0.3, 0.1, 20, 10, 30] + [100, 0.5, 0.2, 40, 5, 80]
+    y = (X[:, 0] + rng.normal(0, 20, len(X)) > 100).astype(int)
+
+    detector = DysgraphiaDetector()
+    detector.train(X, y)
+    image = cv2.imread(pages['a4_150dpi_sparse'])
+    batch = X[:batch_size]
+    compiled = detector.compiled
+
+    results = {
+        'predict_image': _timings(lambda: detector.predict(image), repeat),
+        'score_row_compiled': _timings(lambda: detector._score(X[:1]), repeat * 10)
+    }
+    batch_timings = _timings(lambda: detector.predict_batch(batch), repeat)
+    results['predict_batch'] = dict(batch_timings, batch_size=batch_size,
+                                    rows_per_sec=batch_size / (batch_timings['median_ms'] / 1000))
+
+    # Same calls through sklearn, to keep the compiled path honest
+    detector.compiled = None
+    results['score_row_sklearn'] = _timings(lambda: detector._score(X[:1]), repeat * 10)
+    sklearn_batch = _timings(lambda: detector.predict_batch(batch), repeat)
+    results['predict_batch_sklearn'] = dict(sklearn_batch, batch_size=batch_size,
+                                            rows_per_sec=batch_size / (sklearn_batch['median_ms'] / 1000))
+    detector.compiled = compiled
+    return results
+
+def _migration_worker(csv_path, mode, checkpoint_path, result_queue):
+    """Run one migration in a fresh process and report its stats and peak RSS"""
+    try:
+        from db import get_collection
+        from bulk_loader import load_csv
+        from incremental_sync import sync_csv
+
+        collection = get_collection(f'bench_{mode}')
+        collection.drop()
+        runs = {}
+        if mode == 'full':
+            runs['full'] = load_csv(collection, csv_path, delimiter=';')
+        else:
+            # First run loads everything, the second finds nothing changed
+            runs['sync_initial'] = sync_csv(collection, csv_path, delimiter=';',
+                                            checkpoint_path=checkpoint_path)
+            runs['sync_unchanged'] = sync_csv(collection, csv_path, delimiter=';',
+                                              checkpoint_path=checkpoint_path)
+        collection.drop()
+
+        stats = {name: {'rows': run['rows'], 'seconds': run['seconds'],
+                        'rows_per_sec': run['rows_per_sec'], 'errors': len(run['errors'])}
+                 for name, run in runs.items()}
+        result_queue.put({'runs': stats, 'peak_rss_mb': _peak_rss_mb()})
+    except Exception:
+        result_queue.put({'error': traceback.format_exc(), 'peak_rss_mb': _peak_rss_mb()})
+
+def _migration_result(process, result_queue):
+    """Wait for a migration worker's result, raising if it failed or died"""
+    while True:
+        try:
+            result = result_queue.get(timeout=1.0)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"Migration worker exited with code {process.exitcode}")
+    process.join()
+
+    if 'error' in result:
+        raise RuntimeError(f"Migration worker failed:\n{result['error']}")
+    failed = {name: run['errors'] for name, run in result['runs'].items() if run['errors']}
+    if failed:
+        raise RuntimeError(f"Migration runs reported write errors: {failed}")
+    return result
+
+def bench_migration(directory, csv_rows):
+    """
+    Rows/sec and peak RSS of full and incremental migrations, one process each
+    Raises RuntimeError when a migration fails, rather than recording a
+    result without the metrics a comparison would look for
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for rows in csv_rows:
+        csv_path = os.path.join(directory, f'dyt_{rows}.csv')
+        write_synthetic_csv(csv_path, rows)
+        results[str(rows)] = {'file_mb': os.path.getsize(csv_path) / (1024 * 1024)}
+
+        for mode in ('full', 'incremental'):
+            result_queue = context.Queue()
+            checkpoint_path = os.path.join(directory, f'sync_{rows}.json')
+            process = context.Process(target=_migration_worker,
+                                      args=(csv_path, mode, checkpoint_path, result_queue))
+            process.start()
+            result = _migration_result(process, result_queue)
+            results[str(rows)][mode] = result
+            print(f"  migration {rows} rows, {mode}: "
+                  f"{ {k: round(v['rows_per_sec']) for k, v in result['runs'].items()} }")
+        os.remove(csv_path)
+    return results
+
+def bench_login(seconds, concurrency):
+    """/login requests per second against an in-process auth server"""
+    import logging
+    import user_auth
+    from auth_sessions import hash_password
+    # The access log would dominate the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+
+    email, password = 'benchmark@example.com', 'benchmark-password'
+    users = user_auth.users_collection()
+    users.delete_many({'email': email})
+    users.insert_one({'name': 'Benchmark', 'email': email, 'password': hash_password(password)})
+
+    server = user_auth.CORSHTTPServer(('127.0.0.1', 0), user_auth.AuthHandler,
+                                      max_workers=max(concurrency, 4))
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    port = server.server_address[1]
+
+    body = json.dumps({'email': email, 'password': password})
+    headers = {'Content-Type': 'application/json'}
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        # One keep-alive connection per client, like a browser
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            connection.request('POST', '/login', body, headers)
+            response = connection.getresponse()
+            ok = response.status == 200 and json.loads(response.read()).get('success')
+            local.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                with lock:
+                    failures[0] += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+
+    start = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+    users.delete_many({'email': email})
+
+    latencies = np.array(latencies)
+    return {
+        'concurrency': concurrency,
+        'requests': int(len(latencies)),
+        'failures': failures[0],
+        'requests_per_sec': len(latencies) / elapsed,
+        'median_ms': float(np.median(latencies)) if len(latencies) else None,
+        'p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else None
+    }
+
+# Metric name suffixes and whether a larger value is better
+_METRIC_DIRECTIONS = [('rows_per_sec', True), ('requests_per_sec', True),
+                      ('median_ms', False), ('peak_rss_mb', False)]
+
+def flatten_metrics(results, prefix=''):
+    """Flatten nested results into {'a.b.median_ms': value} for comparison"""
+    metrics = {}
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            metrics.update(flatten_metrics(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[name] = value
+    return metrics
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Compare two result files
+    A metric of the baseline that is missing from a section this run did
+    measure is reported as a regression (current and change are None),
+    sections that were not run are not compared.
+    Args:
+        baseline: Results of an earlier run
+        current: Results of this run
+        threshold: Relative change that counts as a regression
+    Returns:
+        regressions: List of dicts with metric, baseline, current and change
+    """
+    before = flatten_metrics(baseline['results'])
+    after = flatten_metrics(current['results'])
+    regressions = []
+    for name, old in before.items():
+        for suffix, higher_is_better in _METRIC_DIRECTIONS:
+            if name.endswith(suffix):
+                value = after.get(name)
+                if value is None:
+                    if name.split('.', 1)[0] in current['results']:
+                        regressions.append({'metric': name, 'baseline': old,
+                                            'current': None, 'change': None})
+                    break
+                if not old:
+                    break
+                change = (value - old) / old
+                if (-change if higher_is_better else change) > threshold:
+                    regressions.append({'metric': name, 'baseline': old,
+                                        'current': value, 'change': change})
+                break
+    return regressions
+
+def redact_uri(uri):
+    """A MongoDB URI without the user and password, safe to write to results"""
+    if not uri:
+        return uri
+    parts = urlsplit(uri)
+    if '@' not in parts.netloc:
+        return uri
+    return urlunsplit(parts._replace(netloc='***@' + parts.netloc.rsplit('@', 1)[1]))
+
+def drop_benchmark_db():
+    """Drop the scratch database the migration and /login benchmarks wrote to"""
+    from db import get_client
+    try:
+        get_client().drop_database(BENCHMARK_DB)
+    except Exception as e:
+        print(f"Could not drop benchmark database {BENCHMARK_DB}: {str(e)}")
+
+def run(profile='quick', sections=('features', 'predict', 'migration', 'login'),
+        login_concurrency=8, scratch_dir=None):
+    """
+    Run the selected benchmark sections
+    Returns:
+        report: Dict with meta (environment) and results (per section)
+    """
+    settings = PROFILES[profile]
+    directory = scratch_dir or tempfile.mkdtemp(prefix='dysgraphia-bench-')
+    results = {}
+    try:
+        pages = write_synthetic_pages(directory)
+        if 'features' in sections:
+            print('Benchmarking feature extraction...')
+            results['features'] = bench_features(pages, settings['repeat'])
+        if 'predict' in sections:
+            print('Benchmarking prediction...')
+            results['predict'] = bench_predict(pages, settings['repeat'])
+        if 'migration' in sections:
+            print('Benchmarking migration...')
+            results['migration'] = bench_migration(directory, settings['csv_rows'])
+        if 'login' in sections:
+            print('Benchmarking /login...')
+            results['login'] = bench_login(settings['login_seconds'], login_concurrency)
+    finally:
+        if scratch_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    return {
+        'meta': {
+            'profile': profile,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'mongo': redact_uri(os.environ.get('MONGODB_URI')),
+            'peak_rss_mb': _peak_rss_mb()
+        },
+        'results': results
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run performance benchmarks')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='quick',
+                        help='quick: 10k-row CSV, full: 10k/100k/1M-row CSVs and more repeats')
+    parser.add_argument('--sections', default='features,predict,migration,login',
+                        help='Comma-separated sections to run')
+    parser.add_argument('--output', default='bench_results.json', help='Result JSON file')
+    parser.add_argument('--compare', help='Earlier result JSON to flag regressions against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Relative change that counts as a regression')
+    parser.add_argument('--mongo-uri', default='mongomock://',
+                        help='MongoDB to benchmark against (default: in-memory mongomock)')
+    parser.add_argument('--login-concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    # Set before anything creates the shared client, spawned workers inherit it
+    os.environ['MONGODB_URI'] = args.mongo_uri
+    os.environ['MONGODB_DB'] = BENCHMARK_DB
+
+    try:
+        report = run(args.profile, args.sections.split(','), args.login_concurrency)
+    finally:
+        drop_benchmark_db()
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, report, args.threshold)
+        for regression in regressions:
+            if regression['current'] is None:
+                print(f"REGRESSION {regression['metric']}: {regression['baseline']:.4g} -> missing")
+                continue
+            print(f"REGRESSION {regression['metric']}: {regression['baseline']:.4g} -> "
+                  f"{regression['current']:.4g} ({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
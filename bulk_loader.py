@@ -0,0 +1,171 @@
+import csv
+import itertools
+import queue
+import threading
+import time
+from pymongo.errors import PyMongoError
+
+# Column types in promotion order, a column only ever moves to the right
+COLUMN_TYPES = [int, float, str]
+
+def _fits(column_type, value):
+    try:
+        column_type(value)
+        return True
+    except ValueError:
+        return False
+
+def _promote(column_type, value):
+    """The narrowest type at or after column_type that value fits"""
+    index = COLUMN_TYPES.index(column_type)
+    while not _fits(COLUMN_TYPES[index], value):
+        index += 1
+    return COLUMN_TYPES[index]
+
+def infer_column_types(headers, rows):
+    """
+    Infer each column's type from a sample of rows
+    Args:
+        headers: Column names
+        rows: Iterable of rows (lists of strings), read once
+    Returns:
+        types: The narrowest of int, float or str every non-empty value fits
+    """
+    types = [COLUMN_TYPES[0]] * len(headers)
+    for row in rows:
+        for i, value in enumerate(row[:len(headers)]):
+            if types[i] is not str and value != '':
+                types[i] = _promote(types[i], value)
+    return types
+
+def _convert_row(headers, types, row):
+    """
+    Convert one row, promoting (in place in types) a column whose value
+    does not fit its current type
+    """
+    try:
+        return {header: value if value == '' or column_type is str else column_type(value)
+                for header, column_type, value in zip(headers, types, row)}
+    except ValueError:
+        for i, value in enumerate(row[:len(headers)]):
+            if types[i] is not str and value != '':
+                types[i] = _promote(types[i], value)
+        return _convert_row(headers, types, row)
+
+def iter_typed_batches(csv_path, delimiter=',', batch_size=1000, infer_types=True,
+                       sample_rows=10000):
+    """
+    Stream a CSV file as fixed-size batches of typed documents, in one pass
+    Column types are inferred once from the first sample_rows rows, which
+    are held in memory until then. A later value that does not fit promotes
+    its column to float or str from that row on; rows already yielded keep
+    the narrower type, so sample_rows should cover the file's variety.
+    Args:
+        csv_path: Path to the CSV file
+        delimiter: Field separator
+        batch_size: Documents per batch
+        infer_types: Keep every value as a string when False
+        sample_rows: Rows the column types are inferred from
+    Yields:
+        batch: List of dicts
+    """
+    with open(csv_path, 'r', newline='') as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        headers = next(reader)
+        sample = list(itertools.islice(reader, sample_rows)) if infer_types else []
+        types = infer_column_types(headers, sample) if infer_types else [str] * len(headers)
+
+        rows = itertools.chain(sample, reader)
+        while True:
+            chunk = list(itertools.islice(rows, batch_size))
+            if not chunk:
+                return
+            yield [_convert_row(headers, types, row) for row in chunk]
+
+class BulkWriter:
+    """
+    Writes batches through a small pool of concurrent insert_many workers
+    The queue between the reader and the writers is bounded, so memory stays
+    at roughly (max_pending + workers) batches whatever the file size.
+    MongoDB errors are collected in errors and the run continues. Workers
+    keep draining the queue whatever happens, so write() and close() never
+    block on a dead thread; an unexpected error is raised again by close().
+    """
+
+    def __init__(self, collection, workers=4, max_pending=8):
+        self.collection = collection
+        self.rows = 0
+        self.errors = []
+        self._failure = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            written = 0
+            try:
+                written = len(self.collection.insert_many(batch, ordered=False).inserted_ids)
+            except PyMongoError as e:
+                # Unordered inserts still write every valid document, other
+                # errors (AutoReconnect, timeouts) carry a list or None here
+                details = getattr(e, 'details', None)
+                if isinstance(details, dict):
+                    written = details.get('nInserted', 0)
+                with self._lock:
+                    self.errors.append(str(e))
+            except BaseException as e:
+                with self._lock:
+                    self.errors.append(str(e))
+                    if self._failure is None:
+                        self._failure = e
+            finally:
+                with self._lock:
+                    self.rows += written
+
+    def write(self, batch):
+        """Queue a batch, blocking while the queue is full"""
+        self._queue.put(batch)
+
+    def close(self):
+        """Wait for all queued batches to be written, raising any unexpected worker error"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self._failure is not None:
+            raise self._failure
+
+def load_csv(collection, csv_path, delimiter=',', batch_size=1000, workers=4, max_pending=8):
+    """
+    Stream a CSV file into a collection
+    Args:
+        collection: Target MongoDB collection
+        csv_path: Path to the CSV file
+        delimiter: Field separator
+        batch_size: Documents per insert_many
+        workers: Concurrent writer threads
+        max_pending: Batches allowed to wait for a writer
+    Returns:
+        stats: Dict with rows, seconds, rows_per_sec and errors
+    """
+    start = time.time()
+    writer = BulkWriter(collection, workers, max_pending)
+    try:
+        for batch in iter_typed_batches(csv_path, delimiter, batch_size):
+            writer.write(batch)
+    finally:
+        writer.close()
+
+    seconds = time.time() - start
+    return {
+        'rows': writer.rows,
+        'seconds': seconds,
+        'rows_per_sec': writer.rows / seconds if seconds > 0 else 0.0,
+        'errors': writer.errors
+    }
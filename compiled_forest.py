@@ -0,0 +1,141 @@
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Flattened RandomForestClassifier for low-latency scoring
+    All trees are packed into contiguous NumPy arrays and the StandardScaler
+    mean/scale are stored alongside them, so rows can be scaled and scored
+    without going through sklearn's validation and joblib dispatch.
+    """
+
+    def __init__(self, mean, scale, roots, feature, threshold, children, leaf_proba,
+                 max_depth, classes):
+        self.mean = mean
+        self.scale = scale
+        self.roots = roots
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.leaf_proba = leaf_proba
+        self.max_depth = max_depth
+        self.classes = classes
+
+    @classmethod
+    def from_sklearn(cls, model, scaler):
+        """
+        Export a fitted forest and scaler
+        Args:
+            model: Fitted RandomForestClassifier with a single output
+            scaler: Fitted StandardScaler used on the model inputs
+        Returns:
+            compiled: CompiledForest
+        """
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only single-output forests can be compiled")
+
+        roots = []
+        features = []
+        thresholds = []
+        children = []
+        leaf_probas = []
+        max_depth = 0
+        offset = 0
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            left = tree.children_left.astype(np.intp)
+            right = tree.children_right.astype(np.intp)
+            is_leaf = left == -1
+            own_index = np.arange(n_nodes)
+
+            # Leaves point back to themselves and always take the left
+            # branch, so every row can walk exactly max_depth steps
+            left = np.where(is_leaf, own_index, left) + offset
+            right = np.where(is_leaf, own_index, right) + offset
+            threshold = np.where(is_leaf, np.inf, tree.threshold)
+            feature = np.where(is_leaf, 0, tree.feature).astype(np.intp)
+
+            # Per-leaf class probabilities, normalized like DecisionTreeClassifier
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+
+            roots.append(offset)
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(np.stack([left, right], axis=1))
+            leaf_probas.append(value / normalizer)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        return cls(
+            mean=np.asarray(scaler.mean_, dtype=np.float64) if scaler.with_mean else 0.0,
+            scale=np.asarray(scaler.scale_, dtype=np.float64) if scaler.with_std else 1.0,
+            roots=np.array(roots, dtype=np.intp),
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            children=np.ascontiguousarray(np.concatenate(children)),
+            leaf_proba=np.ascontiguousarray(np.concatenate(leaf_probas)),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_)
+        )
+
+    def predict_proba(self, X):
+        """
+        Scale and score one or many feature rows
+        Args:
+            X: Feature matrix (n_samples, n_features) or a single feature row
+        Returns:
+            proba: Class probabilities (n_samples, n_classes)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+
+        # Trees compare float32 inputs, exactly like sklearn does
+        X_scaled = ((X - self.mean) / self.scale).astype(np.float32)
+        n_samples, n_features = X_scaled.shape
+        flat = X_scaled.ravel()
+
+        # Walk all rows through all trees at once, one level per step
+        nodes = np.broadcast_to(self.roots, (n_samples, len(self.roots))).copy()
+        row_offsets = (np.arange(n_samples) * n_features)[:, np.newaxis]
+        for _ in range(self.max_depth):
+            go_right = flat[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes, go_right.view(np.uint8)]
+
+        # Sum trees in order (axis 0) to match sklearn's accumulation
+        return self.leaf_proba[nodes.T].sum(axis=0) / len(self.roots)
+
+    def predict(self, X):
+        """
+        Score feature rows
+        Returns:
+            predictions: Array of predicted labels
+            proba: Class probabilities (n_samples, n_classes)
+        """
+        proba = self.predict_proba(X)
+        return self.classes.take(np.argmax(proba, axis=1)), proba
+
+    def validate(self, model, scaler, X, atol=1e-9):
+        """
+        Check the compiled probabilities against sklearn
+        Args:
+            model: Forest the evaluator was exported from
+            scaler: Scaler the evaluator was exported from
+            X: Unscaled feature rows to compare on
+            atol: Largest allowed absolute difference
+        Raises:
+            ValueError: If the probabilities or labels disagree
+        """
+        X = np.asarray(X, dtype=np.float64)
+        expected = model.predict_proba(scaler.transform(X))
+        labels, proba = self.predict(X)
+
+        difference = np.max(np.abs(proba - expected)) if len(X) else 0.0
+        if difference > atol:
+            raise ValueError(f"Compiled forest differs from sklearn by {difference:.3g}")
+        if not np.array_equal(labels, model.classes_.take(np.argmax(expected, axis=1))):
+            raise ValueError("Compiled forest labels differ from sklearn")
@@ -0,0 +1,104 @@
+# Shared MongoDB access for all Python components
+# The client is created lazily on first use from the environment (and .env),
+# so importing a module never touches the network and every component
+# shares the same connection pool.
+# MONGODB_URI ("mongomock://" for an in-memory database), MONGODB_DB,
+# MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE and the
+# MONGODB_*_TIMEOUT_MS variables configure the client.
+# Every command's duration is recorded in metrics.MONGO_SECONDS.
+import os
+import threading
+from metrics import mongo_command_listener
+
+DEFAULT_URI = 'mongodb://localhost:27017/'
+DEFAULT_DB = 'user_auth_db'
+
+_client = None
+_env_loaded = False
+_lock = threading.Lock()
+
+def load_env_file(path='.env'):
+    """Read KEY=VALUE lines into os.environ once, without overriding real variables"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    try:
+        with open(path, 'r') as file:
+            for line in file:
+                line = line.strip()
+                if not line or line.startswith('#') or '=' not in line:
+                    continue
+                key, value = line.split('=', 1)
+                os.environ.setdefault(key.strip(), value.strip().strip('"\''))
+    except OSError:
+        pass
+
+def _int_env(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+def _create_client():
+    load_env_file()
+    uri = os.environ.get('MONGODB_URI', DEFAULT_URI)
+
+    if uri.startswith('mongomock://'):
+        import mongomock
+        return mongomock.MongoClient()
+
+    from pymongo import MongoClient
+    return MongoClient(
+        uri,
+        maxPoolSize=_int_env('MONGODB_MAX_POOL_SIZE', 100),
+        minPoolSize=_int_env('MONGODB_MIN_POOL_SIZE', 0),
+        serverSelectionTimeoutMS=_int_env('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        connectTimeoutMS=_int_env('MONGODB_CONNECT_TIMEOUT_MS', 5000),
+        socketTimeoutMS=_int_env('MONGODB_SOCKET_TIMEOUT_MS', None),
+        event_listeners=[mongo_command_listener()],
+        connect=False
+    )
+
+def get_client():
+    """The shared client, created on first use"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _create_client()
+    return _client
+
+def set_client(client):
+    """Use an existing client, e.g. a mongomock.MongoClient in tests"""
+    global _client
+    with _lock:
+        _client = client
+
+def get_db():
+    """The application database"""
+    load_env_file()
+    return get_client()[os.environ.get('MONGODB_DB', DEFAULT_DB)]
+
+def get_collection(name):
+    """A collection of the application database"""
+    return get_db()[name]
+
+def ensure_indexes():
+    """Create the indexes the application relies on, run once at startup"""
+    get_collection('users').create_index('email', unique=True)
+
+    # Demographic cohort lookups used by assessment_analytics
+    cohort_index = [('Age', 1), ('Gender', 1), ('Nativelang', 1)]
+    for name in ('assessments', 'assessment_data'):
+        get_collection(name).create_index(cohort_index)
+    get_collection('assessment_summary').create_index([('source', 1)] + cohort_index)
+
+    # Screening history per user, written by result_recorder
+    get_collection('screening_results').create_index([('user', 1), ('created_at', -1)])
+
+def close():
+    """Close the shared client"""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+import cv2
+from dysgraphia_detector import DysgraphiaDetector, FEATURE_NAMES
+from image_preprocessing import DEFAULT_DPI, load_grayscale, crop_to_ink, downsample
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+def iter_pdf_pages(pdf_path, target_dpi=DEFAULT_DPI):
+    """
+    Render the pages of a PDF one at a time, requires PyMuPDF
+    Yields:
+        (name, gray, scale) with pages rendered directly at target_dpi
+    """
+    try:
+        import fitz
+    except ImportError:
+        raise ImportError("Reading PDF documents requires PyMuPDF (pip install pymupdf)")
+
+    with fitz.open(pdf_path) as document:
+        for number, page in enumerate(document, start=1):
+            pixmap = page.get_pixmap(dpi=target_dpi, colorspace=fitz.csGRAY, alpha=False)
+            gray = np.frombuffer(pixmap.samples, dtype=np.uint8).reshape(
+                pixmap.height, pixmap.stride)[:, :pixmap.width].copy()
+            yield f'{os.path.basename(pdf_path)}#{number}', gray, 1.0
+
+def iter_tiff_pages(tiff_path, target_dpi=DEFAULT_DPI):
+    """
+    Decode the pages of a multi-page TIFF one at a time
+    Yields:
+        (name, gray, scale), or (name, None, exception) for a page that
+        cannot be decoded
+    Raises:
+        ValueError: If the file is not a readable TIFF
+    """
+    try:
+        count = cv2.imcount(tiff_path)
+    except cv2.error:
+        count = 0
+    if count == 0:
+        raise ValueError(f"Could not read TIFF {os.path.basename(tiff_path)}")
+
+    for index in range(count):
+        name = f'{os.path.basename(tiff_path)}#{index + 1}'
+        try:
+            ok, pages = cv2.imreadmulti(tiff_path, start=index, count=1, flags=cv2.IMREAD_GRAYSCALE)
+        except cv2.error:
+            ok, pages = False, []
+        if not ok or not pages:
+            yield name, None, ValueError(f"Could not decode page {index + 1} of {os.path.basename(tiff_path)}")
+            continue
+        gray, scale = downsample(pages[0], target_dpi)
+        yield name, gray, scale
+
+def iter_pages(source, target_dpi=DEFAULT_DPI):
+    """
+    Lazily decode the pages of a document
+    Args:
+        source: PDF, multi-page TIFF, single image, or a folder of those
+            (files are read in name order)
+        target_dpi: Resolution pages are normalized to
+    Yields:
+        (name, gray, scale): page name, grayscale page and its size relative
+            to the original, to be passed to extract_features. A page, or a
+            file of a folder, that cannot be read yields (name, None,
+            exception) and the remaining ones are still read
+    """
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            path = os.path.join(source, name)
+            if os.path.isfile(path) and name.lower().endswith(IMAGE_EXTENSIONS + TIFF_EXTENSIONS + ('.pdf',)):
+                try:
+                    yield from iter_pages(path, target_dpi)
+                except Exception as e:
+                    yield name, None, e
+        return
+
+    extension = os.path.splitext(source)[1].lower()
+    if extension == '.pdf':
+        yield from iter_pdf_pages(source, target_dpi)
+    elif extension in TIFF_EXTENSIONS:
+        yield from iter_tiff_pages(source, target_dpi)
+    else:
+        gray, scale = load_grayscale(source, target_dpi)
+        if gray is None:
+            raise ValueError(f"Could not read image {source}")
+        yield os.path.basename(source), gray, scale
+
+def split_lines(gray, min_height=8, max_gap=3, min_ink=0.002, threshold=None):
+    """
+    Split a page into text-line bands with a horizontal projection profile
+    Args:
+        gray: Grayscale page, dark ink on a light background
+        min_height: Bands shorter than this many rows are ignored (noise)
+        max_gap: Ink-free runs up to this many rows do not end a line
+        min_ink: Fraction of a row's pixels that must be ink
+        threshold: Ink threshold from crop_to_ink, None runs Otsu on gray
+    Returns:
+        lines: List of (top, bottom) row ranges
+    """
+    if threshold is None:
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    else:
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
+    profile = np.count_nonzero(binary, axis=1)
+    inked = profile > max(1, int(min_ink * binary.shape[1]))
+    if not inked.any():
+        return []
+
+    # Start and end rows of every inked run
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], inked.view(np.int8), [0]))))
+    runs = edges.reshape(-1, 2)
+
+    lines = []
+    for top, bottom in runs:
+        if lines and top - lines[-1][1] <= max_gap:
+            lines[-1] = (lines[-1][0], bottom)
+        else:
+            lines.append((top, bottom))
+    return [(int(top), int(bottom)) for top, bottom in lines if bottom - top >= min_height]
+
+def _analyze_page(detector, name, gray, scale):
+    """Extract page and line features of one page (runs on a pipeline worker)"""
+    # One Otsu threshold for the whole page, shared by the lines
+    page, threshold = crop_to_ink(gray)
+    lines = split_lines(page, threshold=threshold)
+    line_rows = []
+    for top, bottom in lines:
+        features = detector.extract_features(page[top:bottom], scale, threshold)
+        line_rows.append([features[feature] for feature in FEATURE_NAMES])
+
+    page_features = detector.extract_features(page, scale, threshold)
+    return {
+        'name': name,
+        'features': page_features,
+        'lines': lines,
+        'line_rows': line_rows
+    }
+
+def screen_document(detector, source, target_dpi=DEFAULT_DPI, max_in_flight=4, n_workers=2,
+                    metadata=None):
+    """
+    Stream dysgraphia screening results for a multi-page document
+    Pages are decoded lazily and analyzed on n_workers threads. At most
+    max_in_flight decoded pages exist at any time, so memory stays bounded
+    however long the document is, and page results are yielded in page
+    order as soon as they are ready.
+    Args:
+        detector: Trained DysgraphiaDetector
+        source: Document path, see iter_pages
+        target_dpi: Resolution pages are normalized to
+        max_in_flight: Pages decoded ahead of the one being yielded
+        n_workers: Threads extracting features (OpenCV releases the GIL)
+        metadata: Optional dict (e.g. user) recorded with the page results
+    Yields:
+        One dict per page (type "page") with the page and per-line scores,
+        or (type "page_error") with the error of a page that could not be
+        read or analyzed, then one aggregated dict (type "document"). When
+        no page could be screened the document dict has an error instead
+        of a score
+    """
+    if not detector.is_trained:
+        raise ValueError("Model needs to be trained before making predictions")
+
+    page_probabilities = []
+    line_probabilities = []
+    failed_pages = []
+    pending = deque()
+
+    def finish(future, number, name):
+        try:
+            analysis = future.result()
+        except Exception as e:
+            failed_pages.append(number)
+            return {'type': 'page_error', 'page': number, 'name': name, 'error': str(e)}
+        record = [dict(metadata or {}, page=number, document=os.path.basename(source))]
+        # The page is recorded, its lines are not
+        page_prediction, page_probability = detector.predict_batch([analysis['features']],
+                                                                   metadata=record)
+        line_predictions, line_scores = detector.predict_batch(analysis['line_rows'], record=False)
+
+        page_probabilities.append(float(page_probability[0]))
+        line_probabilities.extend(float(score) for score in line_scores)
+        return {
+            'type': 'page',
+            'page': number,
+            'name': analysis['name'],
+            'probability': float(page_probability[0]),
+            'prediction': int(page_prediction[0]),
+            'features': analysis['features'],
+            'lines': [{'top': top, 'bottom': bottom, 'probability': float(score),
+                       'prediction': int(prediction)}
+                      for (top, bottom), prediction, score in zip(analysis['lines'], line_predictions,
+                                                                  line_scores)]
+        }
+
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='document-page') as executor:
+        for number, (name, gray, scale) in enumerate(iter_pages(source, target_dpi), start=1):
+            if gray is None:
+                # Unreadable page or file, keep its place in the page order
+                future = Future()
+                future.set_exception(scale)
+            else:
+                future = executor.submit(_analyze_page, detector, name, gray, scale)
+            pending.append((future, number, name))
+            del gray
+            # Block only when the window is full, otherwise hand over
+            # whatever pages are already done
+            while pending and (len(pending) >= max_in_flight or pending[0][0].done()):
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+
+    if not page_probabilities:
+        # No score at all must not read as a clean screening
+        yield {
+            'type': 'document',
+            'source': os.path.basename(source),
+            'pages': 0,
+            'failed_pages': failed_pages,
+            'error': 'No readable pages'
+        }
+        return
+
+    line_array = np.array(line_probabilities)
+    document_probability = float(np.mean(page_probabilities))
+    yield {
+        'type': 'document',
+        'source': os.path.basename(source),
+        'pages': len(page_probabilities),
+        'failed_pages': failed_pages,
+        'lines': len(line_probabilities),
+        'probability': document_probability,
+        'prediction': int(document_probability >= 0.5),
+        'max_page_probability': max(page_probabilities, default=0.0),
+        'mean_line_probability': float(line_array.mean()) if len(line_array) else 0.0,
+        'flagged_line_fraction': float((line_array >= 0.5).mean()) if len(line_array) else 0.0
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Screen a multi-page document, one JSON line per page')
+    parser.add_argument('source', help='PDF, multi-page TIFF, image or folder of worksheets')
+    parser.add_argument('--model', default='dysgraphia_model.joblib')
+    parser.add_argument('--scaler', default='dysgraphia_scaler.joblib')
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    detector = DysgraphiaDetector()
+    detector.load_model(args.model, args.scaler)
+    for result in screen_document(detector, args.source, args.dpi, n_workers=args.workers):
+        print(json.dumps(result), flush=True)
@@ -3,52 +3,158 @@ import pandas as pd
 import cv2
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, roc_auc_score
 import joblib
+import json
 import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from feature_cache import FeatureCache
+from compiled_forest import CompiledForest
+from feature_store import FeatureStore
+from image_preprocessing import DEFAULT_DPI, load_grayscale, crop_to_ink, normalize_image
+from metrics import STAGE_SECONDS, SCORE_SECONDS
+from result_recorder import input_hash
+
+# Bump whenever extract_features changes so cached features are recomputed
+FEATURE_VERSION = 3
+
+# Features measured in pixels, divided by the image scale so that values
+# from reduced-resolution images match full-resolution ones
+PIXEL_FEATURES = ['line_spacing', 'letter_spacing', 'baseline_deviation']
+
+# Column order of the feature matrix used by train and predict
+FEATURE_NAMES = ['line_spacing', 'letter_size_variation', 'writing_pressure',
+                 'letter_spacing', 'slant_angle', 'baseline_deviation']
+
+# The compiled forest walks every row through every tree in NumPy, which
+# beats sklearn's per-call overhead on small batches but loses to its
+# C tree traversal on large ones (crossover around 200 rows)
+COMPILED_MAX_ROWS = 128
+
+# Contour measurements shared by all features, one array entry per contour
+ContourGeometry = namedtuple('ContourGeometry', ['count', 'x', 'y', 'w', 'h', 'areas', 'angles'])
 
 class DysgraphiaDetector:
-    def __init__(self):
+    def __init__(self, recorder=None):
+        """
+        Args:
+            recorder: Optional ResultRecorder every prediction is queued on
+        """
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
         self.scaler = StandardScaler()
+        self.compiled = None
         self.is_trained = False
+        self.recorder = recorder
+        # Identifies the model in recorded results
+        self.model_version = None
+        # Samples and image scales returned by the last load_dataset
+        self.feature_store = None
+        self.sample_scales = []
 
-    def load_dataset(self, csv_path):
+    def load_dataset(self, csv_path, n_jobs=1, chunksize=16, cache_path=None, hash_contents=False,
+                     target_dpi=DEFAULT_DPI):
         """
         Load the dataset from CSV file
         Args:
             csv_path: Path to the CSV file containing image paths and sentences
+            n_jobs: Number of worker processes used to decode images and
+                extract features (-1 uses all cores, 1 runs in-process)
+            chunksize: Number of images sent to a worker at a time
+            cache_path: Optional feature cache file, images whose path, mtime
+                and size are unchanged are not decoded again
+            hash_contents: Also validate cache entries by content hash
+            target_dpi: Decode images at reduced resolution, normalized to
+                this DPI, and crop them to the ink, like predict does (None
+                keeps full resolution). The scale used for each sample is
+                kept in self.sample_scales
         Returns:
-            X: List of feature dictionaries
-            y: List of labels (0 for LPD, 1 for PD)
+            X: Feature matrix (float32, columns ordered like FEATURE_NAMES)
+            y: Array of labels (0 for LPD, 1 for PD)
+            The full FeatureStore, with image paths and scales, is kept in
+            self.feature_store
         """
-        # Read CSV file
-        df = pd.read_csv(csv_path)
-        
-        X = []
-        y = []
-        
-        for _, row in df.iterrows():
-            image_path = row['Image Path']
-            # Extract label from path (LPD = 0, PD = 1)
-            label = 1 if 'PD/' in image_path else 0
-            
-            # Load and preprocess image
-            try:
-                image = cv2.imread(image_path)
-                if image is not None:
-                    features = self.extract_features(image)
-                    X.append(features)
-                    y.append(label)
-            except Exception as e:
-                print(f"Error processing {image_path}: {str(e)}")
-        
-        return X, y
+        # Read only the column we need
+        image_paths = pd.read_csv(csv_path, usecols=['Image Path'])['Image Path'].tolist()
+
+        cache_version = (FEATURE_VERSION, target_dpi)
+        cache = FeatureCache(cache_path, cache_version, hash_contents) if cache_path else None
+
+        # Split into cached results and images that still need processing
+        results = [None] * len(image_paths)
+        pending = []
+        for i, image_path in enumerate(image_paths):
+            cached = cache.get(image_path) if cache else None
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append(i)
+
+        pending_paths = [image_paths[i] for i in pending]
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+
+        extract = partial(_extract_features_from_path, target_dpi=target_dpi)
+        if n_jobs > 1 and len(pending_paths) > chunksize:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                extracted = list(executor.map(extract, pending_paths, chunksize=chunksize))
+        else:
+            extracted = [extract(p, self) for p in pending_paths]
+
+        for i, (features, scale, error) in zip(pending, extracted):
+            if error is not None:
+                print(f"Error processing {image_paths[i]}: {error}")
+            elif features is not None:
+                results[i] = (features, scale)
+                if cache:
+                    cache.put(image_paths[i], (features, scale))
+
+        if cache:
+            cache.save()
+
+        store = FeatureStore(FEATURE_NAMES, capacity=len(image_paths))
+        for image_path, result in zip(image_paths, results):
+            if result is not None:
+                features, scale = result
+                # Extract label from path (LPD = 0, PD = 1)
+                store.append(features, 1 if 'PD/' in image_path else 0, image_path, scale)
+
+        self.feature_store = store
+        self.sample_scales = store.scales
+        return store.X, store.y
 
-    def extract_features(self, handwriting_image):
+    def load_image(self, image_path, target_dpi=DEFAULT_DPI):
+        """
+        Decode a handwriting scan at reduced resolution and crop it to the ink
+        Args:
+            image_path: Path to the image file
+            target_dpi: Resolution the page is normalized to
+        Returns:
+            gray: Cropped grayscale image, or None if it could not be read
+            scale: Size of gray relative to the full-resolution image, to be
+                passed to extract_features
+            threshold: Ink threshold of the page, to be passed to
+                extract_features
+        """
+        with STAGE_SECONDS.labels('decode_reduced').time():
+            gray, scale = load_grayscale(image_path, target_dpi)
+        if gray is None:
+            return None, scale, None
+        with STAGE_SECONDS.labels('crop_to_ink').time():
+            gray, threshold = crop_to_ink(gray)
+        return gray, scale, threshold
+
+    def extract_features(self, handwriting_image, scale=1.0, threshold=None):
         """
         Extract relevant features from handwriting image
         Args:
             handwriting_image: Input image of handwriting
+            scale: Size of the image relative to the original scan, pixel
+                distances are divided by it so features stay comparable
+            threshold: Ink threshold already computed for the page the image
+                was cropped from (see crop_to_ink), None runs Otsu on the image
         Returns:
             features: Dictionary of extracted features
         """
@@ -59,55 +165,106 @@ class DysgraphiaDetector:
             gray = handwriting_image
 
         # Basic image preprocessing
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        with STAGE_SECONDS.labels('threshold').time():
+            if threshold is None:
+                _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+            else:
+                _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY_INV)
 
-        # Extract features
-        features = {
-            'line_spacing': self._calculate_line_spacing(binary),
-            'letter_size_variation': self._calculate_letter_size_variation(binary),
-            'writing_pressure': self._estimate_writing_pressure(binary),
-            'letter_spacing': self._calculate_letter_spacing(binary),
-            'slant_angle': self._calculate_slant_angle(binary),
-            'baseline_deviation': self._calculate_baseline_deviation(binary)
-        }
+        # Find contours once and share the geometry between all features
+        with STAGE_SECONDS.labels('contour_geometry').time():
+            geometry = self._extract_contour_geometry(binary)
+
+        # Extract features, timing each one
+        calculations = [
+            ('line_spacing', self._calculate_line_spacing, geometry),
+            ('letter_size_variation', self._calculate_letter_size_variation, geometry),
+            ('writing_pressure', self._estimate_writing_pressure, binary),
+            ('letter_spacing', self._calculate_letter_spacing, geometry),
+            ('slant_angle', self._calculate_slant_angle, geometry),
+            ('baseline_deviation', self._calculate_baseline_deviation, geometry)
+        ]
+        features = {}
+        for name, calculate, source in calculations:
+            with STAGE_SECONDS.labels(name).time():
+                features[name] = calculate(source)
+
+        if scale != 1.0:
+            for name in PIXEL_FEATURES:
+                features[name] = features[name] / scale
 
         return features
 
-    def _calculate_line_spacing(self, binary_image):
-        """Calculate average spacing between lines"""
-        # Find contours of text lines
+    def _extract_contour_geometry(self, binary_image):
+        """
+        Find the external contours of a binary image once and pack their
+        bounding boxes, areas and minimum-area-rectangle angles into arrays
+        Args:
+            binary_image: Thresholded image (ink is non-zero)
+        Returns:
+            geometry: ContourGeometry with one array entry per contour
+        """
         contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if len(contours) < 2:
+        count = len(contours)
+
+        if count == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return ContourGeometry(0, empty, empty, empty, empty,
+                                   np.empty(0), np.empty(0))
+
+        # Flatten every contour into one point array plus per-contour offsets
+        lengths = np.fromiter((len(c) for c in contours), dtype=np.intp, count=count)
+        starts = np.zeros(count, dtype=np.intp)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        points = np.concatenate(contours).reshape(-1, 2).astype(np.int64)
+        xs = points[:, 0]
+        ys = points[:, 1]
+
+        # Bounding boxes, same convention as cv2.boundingRect
+        x = np.minimum.reduceat(xs, starts)
+        y = np.minimum.reduceat(ys, starts)
+        w = np.maximum.reduceat(xs, starts) - x + 1
+        h = np.maximum.reduceat(ys, starts) - y + 1
+
+        # Shoelace areas, same as cv2.contourArea (exact in integer arithmetic)
+        prev = np.arange(len(points)) - 1
+        prev[starts] = starts + lengths - 1
+        cross = xs[prev] * ys - ys[prev] * xs
+        areas = np.abs(np.add.reduceat(cross, starts) * 0.5)
+
+        # minAreaRect has no vectorized equivalent, and is only needed
+        # when there are enough contours for the features to use it
+        if count < 2:
+            angles = np.empty(0)
+        else:
+            angles = np.fromiter((cv2.minAreaRect(c)[2] for c in contours),
+                                 dtype=np.float64, count=count)
+
+        return ContourGeometry(count, x, y, w, h, areas, angles)
+
+    def _calculate_line_spacing(self, geometry):
+        """Calculate average spacing between lines"""
+        if geometry.count < 2:
             return 0.0
-            
-        # Get bounding boxes of contours
-        boxes = [cv2.boundingRect(c) for c in contours]
-        boxes.sort(key=lambda x: x[1])  # Sort by y-coordinate
-        
+
+        # Sort boxes by y-coordinate
+        order = np.argsort(geometry.y, kind='stable')
+        tops = geometry.y[order]
+        bottoms = tops + geometry.h[order]
+
         # Calculate average spacing between consecutive lines
-        spacings = []
-        for i in range(len(boxes)-1):
-            current_bottom = boxes[i][1] + boxes[i][3]
-            next_top = boxes[i+1][1]
-            spacing = next_top - current_bottom
-            if spacing > 0:
-                spacings.append(spacing)
-                
-        return np.mean(spacings) if spacings else 0.0
-
-    def _calculate_letter_size_variation(self, binary_image):
+        spacings = tops[1:] - bottoms[:-1]
+        spacings = spacings[spacings > 0]
+
+        return np.mean(spacings) if len(spacings) else 0.0
+
+    def _calculate_letter_size_variation(self, geometry):
         """Calculate variation in letter sizes"""
-        # Find contours of individual letters
-        contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if len(contours) < 2:
+        if geometry.count < 2:
             return 0.0
-            
-        # Calculate areas of contours
-        areas = [cv2.contourArea(c) for c in contours]
-        
-        # Calculate coefficient of variation
+
+        # Calculate coefficient of variation of contour areas
+        areas = geometry.areas
         return np.std(areas) / np.mean(areas) if np.mean(areas) > 0 else 0.0
 
     def _estimate_writing_pressure(self, binary_image):
@@ -116,87 +273,153 @@ class DysgraphiaDetector:
         non_zero = binary_image[binary_image > 0]
         return np.mean(non_zero) if len(non_zero) > 0 else 0.0
 
-    def _calculate_letter_spacing(self, binary_image):
+    def _calculate_letter_spacing(self, geometry):
         """Calculate spacing between letters"""
-        # Find contours of individual letters
-        contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if len(contours) < 2:
+        if geometry.count < 2:
             return 0.0
-            
-        # Get bounding boxes of contours
-        boxes = [cv2.boundingRect(c) for c in contours]
-        boxes.sort(key=lambda x: x[0])  # Sort by x-coordinate
-        
+
+        # Sort boxes by x-coordinate
+        order = np.argsort(geometry.x, kind='stable')
+        lefts = geometry.x[order]
+        rights = lefts + geometry.w[order]
+
         # Calculate average spacing between consecutive letters
-        spacings = []
-        for i in range(len(boxes)-1):
-            current_right = boxes[i][0] + boxes[i][2]
-            next_left = boxes[i+1][0]
-            spacing = next_left - current_right
-            if spacing > 0:
-                spacings.append(spacing)
-                
-        return np.mean(spacings) if spacings else 0.0
-
-    def _calculate_slant_angle(self, binary_image):
+        spacings = lefts[1:] - rights[:-1]
+        spacings = spacings[spacings > 0]
+
+        return np.mean(spacings) if len(spacings) else 0.0
+
+    def _calculate_slant_angle(self, geometry):
         """Calculate the slant angle of writing"""
-        # Find contours of text lines
-        contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if len(contours) < 2:
+        if geometry.count < 2:
             return 0.0
-            
-        # Calculate angles of minimum area rectangles
-        angles = []
-        for c in contours:
-            rect = cv2.minAreaRect(c)
-            angle = rect[2]
-            if angle < -45:
-                angle += 90
-            angles.append(abs(angle))
-            
-        return np.mean(angles) if angles else 0.0
-
-    def _calculate_baseline_deviation(self, binary_image):
+
+        # Angles of minimum area rectangles
+        angles = geometry.angles
+        angles = np.abs(np.where(angles < -45, angles + 90, angles))
+
+        return np.mean(angles) if len(angles) else 0.0
+
+    def _calculate_baseline_deviation(self, geometry):
         """Calculate deviation from baseline"""
-        # Find contours of text lines
-        contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        if len(contours) < 2:
+        if geometry.count < 2:
             return 0.0
-            
-        # Get bounding boxes of contours
-        boxes = [cv2.boundingRect(c) for c in contours]
-        
-        # Calculate y-coordinates of bottom points
-        bottom_points = [box[1] + box[3] for box in boxes]
-        
-        # Calculate standard deviation of bottom points
-        return np.std(bottom_points) if bottom_points else 0.0
 
-    def train(self, X, y):
+        # Standard deviation of the bottom y-coordinates of the boxes
+        bottom_points = geometry.y + geometry.h
+        return np.std(bottom_points)
+
+    def train(self, X, y=None):
         """
         Train the model on labeled data
         Args:
-            X: List of feature dictionaries
-            y: List of labels (0 for LPD, 1 for PD)
+            X: FeatureStore, feature matrix with columns ordered like
+                FEATURE_NAMES, or list of feature dictionaries
+            y: Labels (0 for LPD, 1 for PD), taken from the store if X is one
         """
-        # Convert feature dictionaries to numpy array
-        X_array = np.array([list(x.values()) for x in X])
-        
+        if isinstance(X, FeatureStore):
+            if y is None:
+                y = X.y
+            X = X.X
+        X_array = feature_matrix(X)
+
         # Scale features
         X_scaled = self.scaler.fit_transform(X_array)
         
         # Train model
         self.model.fit(X_scaled, y)
         self.is_trained = True
+        self.model_version = time.strftime('trained-%Y%m%dT%H%M%S')
+        self.compile_model(X_array)
+
+    def update(self, X, y=None, n_new_trees=10, max_trees=None, X_holdout=None, y_holdout=None):
+        """
+        Update a trained model with newly labelled samples only
+        The scaler statistics are updated with the new samples and the split
+        thresholds of the existing trees are rescaled to match, so old trees
+        keep making the same decisions. Extra trees are then grown on the new
+        samples with warm start, and the oldest trees are dropped once there
+        are more than max_trees.
+        Args:
+            X: New samples, in any form accepted by train
+            y: Labels of the new samples, taken from the store if X is one
+            n_new_trees: Trees grown on the new samples
+            max_trees: Forest size kept as a rolling window (None keeps all)
+            X_holdout: Optional held-out samples to report metrics on
+            y_holdout: Labels of the held-out samples
+        Returns:
+            report: Dict with the number of new samples, trees, seconds and
+                the held-out metrics before and after the update
+        """
+        if not self.is_trained:
+            raise ValueError("Model needs to be trained before it can be updated")
+
+        if isinstance(X, FeatureStore):
+            if y is None:
+                y = X.y
+            X = X.X
+        X_array = feature_matrix(X)
+        y = np.asarray(y)
+
+        # Every tree votes over the same classes, a batch missing one cannot
+        # grow trees that fit into the forest
+        missing = set(self.model.classes_.tolist()) - set(y.tolist())
+        if missing:
+            raise ValueError(f"New samples are missing classes {sorted(missing)}")
+
+        start = time.perf_counter()
+        before = self.evaluate(X_holdout, y_holdout) if X_holdout is not None else None
+
+        old_mean = self.scaler.mean_.copy()
+        old_scale = self.scaler.scale_.copy()
+        self.scaler.partial_fit(X_array)
+        for estimator in self.model.estimators_:
+            _rescale_thresholds(estimator.tree_, old_mean, old_scale,
+                                self.scaler.mean_, self.scaler.scale_)
+
+        self.model.set_params(warm_start=True,
+                              n_estimators=len(self.model.estimators_) + n_new_trees)
+        self.model.fit(self.scaler.transform(X_array), y)
+        self.model.set_params(warm_start=False)
+
+        if max_trees is not None and len(self.model.estimators_) > max_trees:
+            self.model.estimators_ = self.model.estimators_[-max_trees:]
+            self.model.set_params(n_estimators=max_trees)
+
+        self.model_version = time.strftime('updated-%Y%m%dT%H%M%S')
+        self.compile_model(X_array)
+
+        return {
+            'samples': len(X_array),
+            'trees': len(self.model.estimators_),
+            'seconds': time.perf_counter() - start,
+            'before': before,
+            'after': self.evaluate(X_holdout, y_holdout) if X_holdout is not None else None
+        }
 
-    def predict(self, handwriting_image):
+    def evaluate(self, X, y):
+        """
+        Accuracy and ROC AUC on labelled samples
+        Returns:
+            metrics: Dict with accuracy and roc_auc (None if y has one class)
+        """
+        if isinstance(X, FeatureStore):
+            if y is None:
+                y = X.y
+            X = X.X
+        predictions, probabilities = self._score(feature_matrix(X))
+        y = np.asarray(y)
+        return {
+            'accuracy': float(accuracy_score(y, predictions)),
+            'roc_auc': float(roc_auc_score(y, probabilities)) if len(np.unique(y)) > 1 else None
+        }
+
+    def predict(self, handwriting_image, metadata=None):
         """
         Predict whether the handwriting shows signs of dysgraphia
         Args:
             handwriting_image: Input image of handwriting
+            metadata: Optional dict (e.g. user) stored with the recorded result
         Returns:
             prediction: 0 (LPD) or 1 (PD)
             probability: Probability of dysgraphia
@@ -205,17 +428,133 @@ class DysgraphiaDetector:
             raise ValueError("Model needs to be trained before making predictions")
 
         # Extract features
-        features = self.extract_features(handwriting_image)
+        features = self.image_features(handwriting_image)
         
-        # Convert features to numpy array and scale
-        X = np.array([list(features.values())])
-        X_scaled = self.scaler.transform(X)
+        # Convert features to a matrix row and score
+        X = feature_matrix([features])
+        predictions, probabilities = self._score(X)
+        self._record([handwriting_image], X, predictions, probabilities,
+                     None if metadata is None else [metadata])
         
-        # Make prediction
-        prediction = self.model.predict(X_scaled)[0]
-        probability = self.model.predict_proba(X_scaled)[0][1]
-        
-        return prediction, probability
+        return predictions[0], probabilities[0]
+
+    def predict_batch(self, images, n_jobs=1, metadata=None, record=True):
+        """
+        Predict dysgraphia for many handwriting samples in one call
+        Args:
+            images: List or iterator of images (arrays or file paths) and/or
+                pre-extracted feature rows (feature dictionaries or sequences
+                ordered like FEATURE_NAMES)
+            n_jobs: Number of threads used for feature extraction
+                (-1 uses all cores)
+            metadata: Optional list of dicts, one per item, stored with the
+                recorded results (e.g. user, input_hash of the upload)
+            record: Pass False for intermediate scores that should not be
+                stored (e.g. the lines of a document page), or one flag
+                per item
+        Returns:
+            predictions: Array of 0 (LPD) or 1 (PD)
+            probabilities: Array of probabilities of dysgraphia
+        """
+        if not self.is_trained:
+            raise ValueError("Model needs to be trained before making predictions")
+
+        items = list(images)
+        if not items:
+            return np.empty(0, dtype=int), np.empty(0)
+
+        X = np.empty((len(items), len(FEATURE_NAMES)))
+
+        # Feature rows go straight into the matrix, images are extracted below
+        to_extract = []
+        for i, item in enumerate(items):
+            if isinstance(item, dict):
+                X[i] = [item[name] for name in FEATURE_NAMES]
+            elif isinstance(item, str) or np.ndim(item) >= 2:
+                to_extract.append(i)
+            else:
+                X[i] = item
+
+        if n_jobs == -1:
+            n_jobs = os.cpu_count() or 1
+
+        # OpenCV releases the GIL while decoding and thresholding, so threads
+        # parallelize extraction without pickling images to other processes
+        if n_jobs > 1 and len(to_extract) > 1:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                extracted = list(executor.map(lambda i: self.image_features(items[i]), to_extract))
+        else:
+            extracted = [self.image_features(items[i]) for i in to_extract]
+
+        for i, features in zip(to_extract, extracted):
+            X[i] = [features[name] for name in FEATURE_NAMES]
+
+        predictions, probabilities = self._score(X)
+        if record is True:
+            self._record(items, X, predictions, probabilities, metadata)
+        elif record is not False:
+            keep = [i for i, flag in enumerate(record) if flag]
+            self._record([items[i] for i in keep], X[keep], predictions[keep], probabilities[keep],
+                         None if metadata is None else [metadata[i] for i in keep])
+        return predictions, probabilities
+
+    def _record(self, inputs, X, predictions, probabilities, metadata=None):
+        """Queue results on the recorder, if there is one (never blocks on the database)"""
+        if self.recorder is None:
+            return
+
+        for i, (data, row, prediction, probability) in enumerate(zip(inputs, X, predictions, probabilities)):
+            document = {
+                'model': 'dysgraphia',
+                'model_version': self.model_version,
+                'features': dict(zip(FEATURE_NAMES, row.tolist())),
+                'prediction': int(prediction),
+                'probability': float(probability),
+                'user': None
+            }
+            if metadata is not None:
+                document.update(metadata[i])
+            if 'input_hash' not in document:
+                document['input_hash'] = input_hash(data)
+            self.recorder.record(document)
+
+    def image_features(self, image, target_dpi=DEFAULT_DPI):
+        """
+        Extract features from an image array or image file path, normalized
+        to target_dpi and cropped to the ink like the training images
+        """
+        if isinstance(image, str):
+            path = image
+            image, scale, threshold = self.load_image(path, target_dpi)
+            if image is None:
+                raise ValueError(f"Could not read image {path}")
+        else:
+            with STAGE_SECONDS.labels('normalize').time():
+                image, scale, threshold = normalize_image(np.asarray(image), target_dpi)
+        return self.extract_features(image, scale, threshold)
+
+    def _score(self, X):
+        """
+        Scale a feature matrix and score it with a single predict_proba pass
+        Batches up to COMPILED_MAX_ROWS rows use the compiled forest, larger
+        ones sklearn.
+        Returns:
+            predictions: Array of predicted labels
+            probabilities: Array of probabilities of dysgraphia
+        """
+        if self.compiled is not None and len(X) <= COMPILED_MAX_ROWS:
+            with SCORE_SECONDS.labels('dysgraphia', 'compiled').time():
+                predictions, proba = self.compiled.predict(X)
+            return predictions, proba[:, 1]
+
+        with SCORE_SECONDS.labels('dysgraphia', 'scale').time():
+            X_scaled = self.scaler.transform(X)
+        with SCORE_SECONDS.labels('dysgraphia', 'predict_proba').time():
+            proba = self.model.predict_proba(X_scaled)
+
+        # Same label rule as RandomForestClassifier.predict
+        predictions = self.model.classes_.take(np.argmax(proba, axis=1))
+        return predictions, proba[:, 1]
 
     def save_model(self, model_path, scaler_path):
         """Save the trained model and scaler"""
@@ -227,6 +566,143 @@ class DysgraphiaDetector:
         self.model = joblib.load(model_path)
         self.scaler = joblib.load(scaler_path)
         self.is_trained = True
+        modified = time.strftime('%Y%m%dT%H%M%S', time.localtime(os.path.getmtime(model_path)))
+        self.model_version = f'{os.path.basename(model_path)}@{modified}'
+        self.compile_model()
+
+    def save_version(self, directory, metadata=None):
+        """
+        Save the model and scaler as a new numbered version
+        Args:
+            directory: Root directory holding one subdirectory per version
+            metadata: Optional dict stored in the version's meta.json
+                (e.g. the report returned by update)
+        Returns:
+            version_path: Directory the version was written to
+        """
+        os.makedirs(directory, exist_ok=True)
+        versions = _list_versions(directory)
+        number = versions[-1] + 1 if versions else 1
+        version_path = os.path.join(directory, f'v{number:04d}')
+        os.makedirs(version_path)
+
+        self.save_model(os.path.join(version_path, 'model.joblib'),
+                        os.path.join(version_path, 'scaler.joblib'))
+
+        meta = {
+            'version': number,
+            'parent': versions[-1] if versions else None,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'feature_version': FEATURE_VERSION,
+            'trees': len(getattr(self.model, 'estimators_', [])),
+            'samples_seen': int(getattr(self.scaler, 'n_samples_seen_', 0))
+        }
+        meta.update(metadata or {})
+        with open(os.path.join(version_path, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2, default=str)
+        self.model_version = f'v{number:04d}'
+        return version_path
+
+    def load_version(self, directory, version=None):
+        """
+        Load a version saved with save_version
+        Args:
+            directory: Root directory holding the versions
+            version: Version number, None loads the latest
+        Returns:
+            meta: The version's metadata
+        """
+        if version is None:
+            versions = _list_versions(directory)
+            if not versions:
+                raise FileNotFoundError(f"No model versions in {directory}")
+            version = versions[-1]
+
+        version_path = os.path.join(directory, f'v{version:04d}')
+        self.load_model(os.path.join(version_path, 'model.joblib'),
+                        os.path.join(version_path, 'scaler.joblib'))
+        self.model_version = f'v{version:04d}'
+        with open(os.path.join(version_path, 'meta.json'), 'r') as file:
+            return json.load(file)
+
+    def compile_model(self, X_check=None):
+        """
+        Export the trained forest and scaler into a CompiledForest used for
+        scoring, after checking it against sklearn
+        Args:
+            X_check: Optional unscaled feature rows to validate on, synthetic
+                rows around the scaler statistics are always checked as well
+        """
+        self.compiled = None
+        if not isinstance(self.model, RandomForestClassifier):
+            return
+
+        rng = np.random.default_rng(0)
+        X_validate = rng.normal(self.scaler.mean_, 2 * self.scaler.scale_,
+                                size=(256, len(self.scaler.mean_)))
+        if X_check is not None:
+            X_validate = np.vstack([X_validate, X_check])
+
+        compiled = CompiledForest.from_sklearn(self.model, self.scaler)
+        compiled.validate(self.model, self.scaler, X_validate)
+        self.compiled = compiled
+
+def feature_matrix(X):
+    """
+    Feature matrix for train and scoring
+    Args:
+        X: Matrix with columns ordered like FEATURE_NAMES, or list of
+            feature dictionaries (columns are looked up by name)
+    Returns:
+        X_array: 2D float64 array
+    """
+    if len(X) and isinstance(X[0], dict):
+        return np.array([[features[name] for name in FEATURE_NAMES] for features in X])
+    return np.asarray(X, dtype=np.float64)
+
+def _rescale_thresholds(tree, old_mean, old_scale, new_mean, new_scale):
+    """
+    Move a fitted tree's split thresholds from one standardization to another,
+    so the tree splits the unscaled features at the same values
+    tree.threshold is a writable view of the tree's nodes, updated in place
+    """
+    split = tree.feature >= 0
+    features = tree.feature[split]
+    thresholds = tree.threshold
+    raw = thresholds[split] * old_scale[features] + old_mean[features]
+    thresholds[split] = (raw - new_mean[features]) / new_scale[features]
+
+def _list_versions(directory):
+    """Sorted version numbers saved under directory"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(directory)
+                  if name.startswith('v') and name[1:].isdigit())
+
+_worker_detector = None
+
+def _extract_features_from_path(image_path, detector=None, target_dpi=DEFAULT_DPI):
+    """
+    Decode one image and extract its features, used by the ingestion workers
+    Returns:
+        (features, scale, error): features is None if the image could not be read
+    """
+    global _worker_detector
+    if detector is None:
+        if _worker_detector is None:
+            _worker_detector = DysgraphiaDetector()
+        detector = _worker_detector
+
+    try:
+        if target_dpi is None:
+            image, scale, threshold = cv2.imread(image_path), 1.0, None
+        else:
+            image, scale, threshold = detector.load_image(image_path, target_dpi)
+        if image is None:
+            return None, scale, None
+        return detector.extract_features(image, scale, threshold), scale, None
+    except Exception as e:
+        return None, 1.0, str(e)
 
 # Example usage
 if __name__ == "__main__":
@@ -234,8 +710,11 @@ if __name__ == "__main__":
     detector = DysgraphiaDetector()
     
     # Load and preprocess dataset
-    X, y = detector.load_dataset('image_sentences.csv')
+    X, y = detector.load_dataset('image_sentences.csv', n_jobs=-1,
+                                 cache_path='dysgraphia_features.cache')
     
+    detector.feature_store.save('dysgraphia_features.store')
+
     # Train the model
     detector.train(X, y)
     
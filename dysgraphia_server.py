@@ -0,0 +1,456 @@
+import base64
+import json
+import os
+import queue
+import secrets
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from flask import Flask, Response, request, jsonify, stream_with_context
+
+from auth_sessions import bearer_email
+from document_pipeline import IMAGE_EXTENSIONS, TIFF_EXTENSIONS, screen_document
+from image_preprocessing import DEFAULT_DPI
+from dysgraphia_detector import DysgraphiaDetector, FEATURE_NAMES
+from result_recorder import ResultRecorder, input_hash
+from stroke_session import StrokeSession
+from ttl_cache import TTLCache
+from metrics import Gauge, Histogram, STAGE_SECONDS, install_profiler_toggle, instrument_flask
+
+app = Flask(__name__)
+instrument_flask(app, 'dysgraphia')
+
+# Warm detector, batcher and result recorder, set up once by start()
+detector = None
+batcher = None
+recorder = None
+
+# Live canvas sessions by id, dropped after 30 idle minutes. Each keeps a
+# one byte per pixel canvas, so sizes are capped near tester.html's 800x400
+# and the default cap keeps all sessions under about 256 MB
+MAX_CANVAS_SIDE = 2048
+MAX_CANVAS_PIXELS = 2048 * 1024
+sessions = TTLCache(max_size=int(os.environ.get('DYSGRAPHIA_MAX_SESSIONS', 128)),
+                    ttl=float(os.environ.get('DYSGRAPHIA_SESSION_TTL', 1800)))
+Gauge('dysgraphia_live_sessions', 'Live canvas sessions', lambda: sessions.stats()['size'])
+
+# Documents screened at once, each keeps a few decoded pages in memory
+document_slots = threading.BoundedSemaphore(int(os.environ.get('DYSGRAPHIA_MAX_DOCUMENTS', 2)))
+DOCUMENT_EXTENSIONS = IMAGE_EXTENSIONS + TIFF_EXTENSIONS + ('.pdf',)
+
+BATCH_SIZE = Histogram('dysgraphia_batch_size', 'Images scored per micro-batch',
+                       buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+BATCH_WAIT_SECONDS = Histogram('dysgraphia_batch_wait_seconds',
+                               'Time a request waited in the micro-batch queue')
+Gauge('dysgraphia_batch_queue_depth', 'Requests waiting for a micro-batch',
+      lambda: batcher.queue_depth() if batcher is not None else 0)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests into micro-batches
+    Features are extracted in the submitting request threads, so concurrent
+    requests threshold and contour their images in parallel (OpenCV releases
+    the GIL). A single background thread waits for the first queued feature
+    row, keeps collecting until the batch is full or max_wait_ms has passed,
+    and scores the whole batch with one predict_batch call.
+    """
+
+    def __init__(self, detector, max_batch_size=32, max_wait_ms=10, max_queue=1024, n_jobs=1):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.n_jobs = n_jobs
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='dysgraphia-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, image, timeout=None, metadata=None, record=True):
+        """
+        Extract the features of an image and queue them for scoring
+        Args:
+            image: Decoded image array or feature row
+            timeout: Seconds to wait for room in the queue
+            metadata: Optional dict stored with the recorded result
+            record: Pass False for scores that should not be stored
+        Returns:
+            future: Resolves to (prediction, probability)
+        Raises:
+            ValueError: If the image cannot be analyzed or the row has the
+                wrong length
+        """
+        row, metadata = self._prepare(image, metadata)
+        return self._enqueue(row, metadata, timeout, record)
+
+    def submit_many(self, images, timeout=None, metadata=None):
+        """
+        Submit the images of one request, extracting them on n_jobs threads
+        Returns:
+            futures: One future per image, see submit
+        """
+        if self.n_jobs > 1 and len(images) > 1:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+                prepared = list(executor.map(lambda image: self._prepare(image, metadata), images))
+        else:
+            prepared = [self._prepare(image, metadata) for image in images]
+        return [self._enqueue(row, item_metadata, timeout) for row, item_metadata in prepared]
+
+    def _prepare(self, image, metadata):
+        """Feature row of an image, with the image hash added to the metadata"""
+        metadata = dict(metadata or {})
+        if np.ndim(image) >= 2:
+            metadata.setdefault('input_hash', input_hash(image))
+            try:
+                features = self.detector.image_features(image)
+            except cv2.error as e:
+                raise ValueError(f"Could not analyze image: {e.msg}")
+            image = [features[name] for name in FEATURE_NAMES]
+
+        row = np.asarray(image, dtype=np.float64)
+        if row.shape != (len(FEATURE_NAMES),):
+            raise ValueError(f"Expected {len(FEATURE_NAMES)} features, got shape {row.shape}")
+        return row, metadata
+
+    def _enqueue(self, row, metadata, timeout, record=True):
+        if self._closed:
+            raise RuntimeError("Batcher is closed")
+        future = Future()
+        self._queue.put((row, future, time.perf_counter(), metadata, record), timeout=timeout)
+        return future
+
+    def queue_depth(self):
+        """Requests waiting to be batched"""
+        return self._queue.qsize()
+
+    def close(self):
+        """Stop accepting work and finish the queued requests"""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._score(batch)
+            if stop:
+                return
+
+    def _score(self, batch):
+        now = time.perf_counter()
+        BATCH_SIZE.observe(len(batch))
+        for _, _, queued, _, _ in batch:
+            BATCH_WAIT_SECONDS.observe(now - queued)
+
+        rows = [row for row, _, _, _, _ in batch]
+        metadata = [item_metadata for _, _, _, item_metadata, _ in batch]
+        record = [item_record for _, _, _, _, item_record in batch]
+        try:
+            predictions, probabilities = self.detector.predict_batch(rows, metadata=metadata,
+                                                                     record=record)
+        except Exception:
+            # Score the rows one by one so a failure only reaches its own request
+            for row, future, _, item_metadata, item_record in batch:
+                try:
+                    prediction, probability = self.detector.predict_batch(
+                        [row], metadata=[item_metadata], record=[item_record])
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result((int(prediction[0]), float(probability[0])))
+            return
+
+        for (_, future, _, _, _), prediction, probability in zip(batch, predictions, probabilities):
+            future.set_result((int(prediction), float(probability)))
+
+
+def decode_image(data):
+    """
+    Decode an uploaded PNG/JPEG into a BGR image
+    Args:
+        data: Raw image bytes, a base64 string or a canvas data URL
+    Returns:
+        image: Decoded image with transparency flattened onto white
+    Raises:
+        ValueError: If the payload is empty or not an image
+    """
+    if isinstance(data, str):
+        # Canvas data URLs look like "data:image/png;base64,...."
+        if data.startswith('data:'):
+            data = data.split(',', 1)[-1]
+        data = base64.b64decode(data)
+    if not data:
+        raise ValueError("Empty image")
+
+    with STAGE_SECONDS.labels('decode_upload').time():
+        try:
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+        except cv2.error as e:
+            raise ValueError(f"Could not decode image: {e.msg}")
+    if image is None:
+        raise ValueError("Could not decode image")
+
+    # Canvas exports are transparent where nothing was drawn
+    if image.ndim == 3 and image.shape[2] == 4:
+        alpha = image[:, :, 3:].astype(np.float32) / 255.0
+        image = (image[:, :, :3] * alpha + 255.0 * (1.0 - alpha)).astype(np.uint8)
+
+    return image
+
+
+def _request_images():
+    """Collect every image sent with the request"""
+    if request.files:
+        return [decode_image(f.read()) for f in request.files.values()]
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object with 'image' or 'images'")
+        if 'images' in data:
+            if not isinstance(data['images'], list):
+                raise ValueError("'images' must be a list")
+            return [decode_image(item) for item in data['images']]
+        return [decode_image(data['image'])]
+
+    return [decode_image(request.get_data())]
+
+
+def _request_metadata():
+    """Who asked, stored with every recorded result"""
+    return {'user': bearer_email(request.headers.get('Authorization')), 'route': request.path}
+
+
+def _result(prediction, probability):
+    return {
+        'prediction': prediction,
+        'label': 'Potential Dysgraphia' if prediction == 1 else 'Low Potential Dysgraphia',
+        'probability': probability
+    }
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    if batcher is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+
+    try:
+        future = batcher.submit(_request_images()[0], metadata=_request_metadata())
+    except (KeyError, TypeError, ValueError, IndexError) as e:
+        return jsonify({'error': f'Invalid image: {str(e)}'}), 400
+
+    prediction, probability = future.result()
+    return jsonify(_result(prediction, probability))
+
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    if batcher is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+
+    # Submit everything first so the images share micro-batches
+    try:
+        futures = batcher.submit_many(_request_images(), metadata=_request_metadata())
+    except (KeyError, TypeError, ValueError, IndexError) as e:
+        return jsonify({'error': f'Invalid image: {str(e)}'}), 400
+
+    return jsonify({'results': [_result(*future.result()) for future in futures]})
+
+
+@app.route('/screen_document', methods=['POST'])
+def screen_document_endpoint():
+    """
+    Screen a multi-page PDF, TIFF or image upload
+    The upload is spooled to a temporary file and results are streamed as
+    newline-delimited JSON: one line per page as soon as it is scored, then
+    the aggregated document line.
+    """
+    if detector is None:
+        return jsonify({'error': 'Model not loaded'}), 503
+
+    upload = next(iter(request.files.values()), None)
+    filename = upload.filename if upload is not None else request.args.get('filename', '')
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in DOCUMENT_EXTENSIONS:
+        return jsonify({'error': f'Unsupported document type, expected one of {list(DOCUMENT_EXTENSIONS)}'}), 400
+    if not document_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many documents in progress'}), 503
+
+    try:
+        with tempfile.NamedTemporaryFile(suffix=extension, delete=False) as file:
+            if upload is not None:
+                upload.save(file)
+            else:
+                for chunk in iter(lambda: request.stream.read(1 << 20), b''):
+                    file.write(chunk)
+    except Exception:
+        document_slots.release()
+        raise
+
+    dpi = request.args.get('dpi', DEFAULT_DPI, type=int)
+    metadata = _request_metadata()
+
+    def generate():
+        try:
+            for result in screen_document(detector, file.name, target_dpi=dpi, metadata=metadata):
+                if result['type'] == 'document':
+                    result['source'] = filename
+                yield json.dumps(result) + '\n'
+        except (ImportError, ValueError) as e:
+            # Headers are already sent, report the error in the stream
+            message = str(e).replace(file.name, filename).replace(os.path.basename(file.name), filename)
+            yield json.dumps({'type': 'error', 'error': message}) + '\n'
+        except Exception:
+            # Anything else still ends the stream with a record, not a cut-off body
+            app.logger.exception('Screening %s failed', filename)
+            yield json.dumps({'type': 'error', 'error': 'Could not screen document'}) + '\n'
+
+    def cleanup():
+        # Runs even when the client goes away before the stream starts
+        os.remove(file.name)
+        document_slots.release()
+
+    response = Response(stream_with_context(generate()), content_type='application/x-ndjson')
+    response.call_on_close(cleanup)
+    return response
+
+
+@app.route('/session', methods=['POST'])
+def create_session():
+    """Start a live canvas session, strokes are then sent to /session/<id>/strokes"""
+    data = request.get_json(silent=True) or {}
+    try:
+        width = int(data.get('width', 800))
+        height = int(data.get('height', 400))
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'error': 'Invalid canvas size'}), 400
+    if not (0 < width <= MAX_CANVAS_SIDE and 0 < height <= MAX_CANVAS_SIDE
+            and width * height <= MAX_CANVAS_PIXELS):
+        return jsonify({'error': f'Canvas must be at most {MAX_CANVAS_SIDE} pixels on a side '
+                                 f'and {MAX_CANVAS_PIXELS} pixels in total'}), 400
+
+    session_id = secrets.token_urlsafe(16)
+    sessions.set(session_id, StrokeSession(width, height))
+    return jsonify({'session_id': session_id, 'width': width, 'height': height})
+
+
+def _session_snapshot(session, features):
+    """Features, stats and feature row of a session, call with session.lock held"""
+    row = [features[name] for name in FEATURE_NAMES] if session.contours else None
+    return features, session.stats(), row
+
+
+def _session_response(session_id, snapshot, final=False):
+    """
+    Score a session snapshot, outside the session lock
+    Only the final submission of a canvas is recorded, the live scores of
+    every stroke batch before it are not.
+    """
+    features, stats, row = snapshot
+    response = {'session_id': session_id, 'features': features, 'stats': stats}
+    if batcher is not None and row is not None:
+        # Feature rows skip image decoding and share micro-batches with images
+        metadata = dict(_request_metadata(), session_id=session_id, strokes=stats['strokes'])
+        prediction, probability = batcher.submit(row, metadata=metadata, record=final).result()
+        response.update(_result(prediction, probability))
+    return response
+
+
+@app.route('/session/<session_id>/strokes', methods=['POST'])
+def add_strokes(session_id):
+    """
+    Add a batch of strokes ({"strokes": [[{"x", "y"}, ...], ...]}) and return
+    live features. With "final": true the canvas is finished: its result is
+    recorded and the session is closed.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+
+    data = request.get_json(silent=True) or {}
+    final = data.get('final') is True
+    try:
+        with session.lock:
+            # A concurrent final submission may have closed it meanwhile
+            if sessions.get(session_id) is not session:
+                return jsonify({'error': 'Unknown or expired session'}), 404
+            snapshot = _session_snapshot(session, session.add_strokes(data.get('strokes', [])))
+            if final:
+                sessions.invalidate(session_id)
+            else:
+                # Touch the entry so active sessions do not expire
+                sessions.set(session_id, session)
+    except (KeyError, TypeError, ValueError, IndexError) as e:
+        return jsonify({'error': f'Invalid strokes: {str(e)}'}), 400
+
+    response = _session_response(session_id, snapshot, final)
+    if final:
+        response['closed'] = True
+    return jsonify(response)
+
+
+@app.route('/session/<session_id>', methods=['GET', 'DELETE'])
+def session_state(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+
+    if request.method == 'DELETE':
+        sessions.invalidate(session_id)
+        return jsonify({'session_id': session_id, 'closed': True})
+
+    with session.lock:
+        snapshot = _session_snapshot(session, session.features())
+    return jsonify(_session_response(session_id, snapshot))
+
+
+@app.after_request
+def add_cors_headers(response):
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, DELETE, OPTIONS'
+    return response
+
+
+def start(model_path, scaler_path, max_batch_size=32, max_wait_ms=10, n_jobs=1, record_results=True):
+    """Load the model once and start the micro-batcher (and result recorder)"""
+    global detector, batcher, recorder
+    recorder = ResultRecorder() if record_results else None
+    detector = DysgraphiaDetector(recorder=recorder)
+    detector.load_model(model_path, scaler_path)
+    batcher = MicroBatcher(detector, max_batch_size=max_batch_size,
+                           max_wait_ms=max_wait_ms, n_jobs=n_jobs)
+
+
+if __name__ == '__main__':
+    start(os.environ.get('DYSGRAPHIA_MODEL_PATH', 'dysgraphia_model.joblib'),
+          os.environ.get('DYSGRAPHIA_SCALER_PATH', 'dysgraphia_scaler.joblib'),
+          max_batch_size=int(os.environ.get('DYSGRAPHIA_MAX_BATCH', 32)),
+          max_wait_ms=float(os.environ.get('DYSGRAPHIA_MAX_WAIT_MS', 10)),
+          n_jobs=int(os.environ.get('DYSGRAPHIA_JOBS', 1)),
+          record_results=os.environ.get('RECORD_RESULTS', '1') != '0')
+    install_profiler_toggle()
+    app.run(port=int(os.environ.get('DYSGRAPHIA_PORT', 5001)), threaded=True)
@@ -1,24 +1,152 @@
+import os
+import time
 from flask import Flask, request, jsonify
 import numpy as np
+import joblib
+from dyslexia_features import build_feature_matrix
+from assessment_analytics import COHORT_FIELDS, cohort_stats
+from metrics import SCORE_SECONDS, install_profiler_toggle, instrument_flask
+from auth_sessions import bearer_email
+from result_recorder import ResultRecorder, input_hash
 
 app = Flask(__name__)
+instrument_flask(app, 'dyslexia')
+
+# Write-behind recording of every prediction, RECORD_RESULTS=0 turns it off
+recorder = ResultRecorder() if os.environ.get('RECORD_RESULTS', '1') != '0' else None
+
+ARTIFACT_PATH = os.environ.get('DYSLEXIA_MODEL_PATH', 'dyslexia_model.joblib')
+
+# Loaded once at startup by load_artifact
+model = None
+model_version = None
+encodings = {}
+n_game_stat_metrics = 1
+
+def load_artifact(path):
+    """
+    Load the consolidated dyslexia artifact
+    The artifact is a single joblib file holding the forest compiled
+    together with its scaler (see compiled_forest.py) and the category lookup
+    dicts. It only contains NumPy arrays, so loading it does not import
+    sklearn, and it is memory-mapped so worker processes share its pages.
+    Args:
+        path: Path to the joblib artifact
+    """
+    global model, model_version, encodings, n_game_stat_metrics
+    artifact = joblib.load(path, mmap_mode='r')
+    model = artifact['forest']
+    modified = time.strftime('%Y%m%dT%H%M%S', time.localtime(os.path.getmtime(path)))
+    model_version = f'{os.path.basename(path)}@{modified}'
+    # Plain dict lookups replace LabelEncoder.transform on every request
+    encodings = {column: dict(mapping) for column, mapping in artifact['encodings'].items()}
+    n_game_stat_metrics = len(artifact['game_stat_metrics'])
+
+def encode(column, value):
+    """Look up the integer code of a categorical value"""
+    try:
+        return encodings[column][value]
+    except KeyError:
+        raise ValueError(f"Unknown {column}: {value}")
+
+def build_features(players):
+    """
+    Build the model input matrix for a list of players
+    Args:
+        players: List of dicts with Age, Gender, Nativelang and GameStats
+    Returns:
+        X: Feature matrix, one row per player
+    """
+    return build_feature_matrix(
+        np.array([player["Age"] for player in players], dtype=np.float64),
+        np.array([encode("Gender", player["Gender"]) for player in players], dtype=np.float64),
+        np.array([encode("Nativelang", player["Nativelang"]) for player in players], dtype=np.float64),
+        np.array([player["GameStats"] for player in players], dtype=np.float64),
+        n_game_stat_metrics
+    )
+
+def predict_players(players, user=None):
+    """Score many players with one vectorized model call, and record the results"""
+    with SCORE_SECONDS.labels('dyslexia', 'features').time():
+        X = build_features(players)
+    with SCORE_SECONDS.labels('dyslexia', 'compiled').time():
+        predictions, probabilities = model.predict(X)
+
+    if recorder is not None:
+        for player, row, prediction, probability in zip(players, X, predictions, probabilities[:, 1]):
+            recorder.record({
+                'model': 'dyslexia',
+                'model_version': model_version,
+                'input_hash': input_hash(player),
+                'features': row.tolist(),
+                'prediction': int(prediction),
+                'probability': float(probability),
+                'user': user
+            })
+
+    return ["Dyslexia Detected" if prediction == 1 else "No Dyslexia Detected"
+            for prediction in predictions]
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    data = request.json
-    age = data["Age"]
-    gender = label_encoders["Gender"].transform([data["Gender"]])[0]
-    nativelang = label_encoders["Nativelang"].transform([data["Nativelang"]])[0]
-    game_stats = np.array(data["GameStats"]).reshape(1, -1)
+    if model is None:
+        return jsonify({"error": "Model not loaded"}), 503
 
-    # Normalize input
-    game_stats_scaled = scaler.transform(game_stats)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid input: expected a JSON object"}), 400
 
-    # Predict
-    prediction = model.predict(game_stats_scaled)[0]
-    result = "Dyslexia Detected" if prediction == 1 else "No Dyslexia Detected"
+    try:
+        result = predict_players([data], bearer_email(request.headers.get('Authorization')))[0]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
 
     return jsonify({"prediction": result})
 
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    if model is None:
+        return jsonify({"error": "Model not loaded"}), 503
+
+    data = request.get_json(silent=True)
+    players = data.get("players", []) if isinstance(data, dict) else None
+    if not isinstance(players, list) or not all(isinstance(player, dict) for player in players):
+        return jsonify({"error": "Invalid input: expected {\"players\": [objects]}"}), 400
+    if not players:
+        return jsonify({"predictions": []})
+
+    try:
+        results = predict_players(players, bearer_email(request.headers.get('Authorization')))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid input: {str(e)}"}), 400
+
+    return jsonify({"predictions": results})
+
+@app.route('/analytics/cohorts', methods=['GET'])
+def analytics_cohorts():
+    """
+    Cohort dashboard data, e.g. /analytics/cohorts?group_by=Age,Gender&Nativelang=Yes
+    Answered from the precomputed assessment_summary collection
+    """
+    source = request.args.get('source', 'assessments')
+    group_by = [field for field in request.args.get('group_by', 'Gender').split(',') if field]
+    if source not in ('assessments', 'assessment_data') or \
+            any(field not in COHORT_FIELDS for field in group_by):
+        return jsonify({"error": f"group_by must be among {COHORT_FIELDS}"}), 400
+
+    filters = {}
+    for field in COHORT_FIELDS:
+        value = request.args.get(field)
+        if value is not None:
+            filters[field] = int(value) if value.isdigit() else value
+
+    return jsonify({"cohorts": cohort_stats(source, group_by, filters)})
+
+if os.path.exists(ARTIFACT_PATH):
+    load_artifact(ARTIFACT_PATH)
+else:
+    print(f"Dyslexia model artifact not found at {ARTIFACT_PATH}")
+
 if __name__ == '__main__':
+    install_profiler_toggle()
     app.run(debug=True)
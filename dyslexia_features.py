@@ -0,0 +1,54 @@
+import numpy as np
+
+# Per-round metrics recorded in Dyt-desktop.csv, in column order
+METRICS = ['Clicks', 'Hits', 'Misses', 'Score', 'Accuracy', 'Missrate']
+N_ROUNDS = 32
+
+def round_columns(metrics):
+    """
+    Column names of the per-round values for the given metrics
+    Columns are round-major (Accuracy1, Missrate1, Accuracy2, ...) like the CSV
+    """
+    return [f'{metric}{round_number}'
+            for round_number in range(1, N_ROUNDS + 1)
+            for metric in metrics]
+
+def game_stats_features(game_stats, n_metrics):
+    """
+    Raw per-round values plus aggregates over the rounds
+    Args:
+        game_stats: Array (players, N_ROUNDS * n_metrics), round-major
+        n_metrics: Number of metrics recorded per round
+    Returns:
+        features: Array (players, N_ROUNDS * n_metrics + 5 * n_metrics)
+    """
+    game_stats = np.asarray(game_stats, dtype=np.float64)
+    rounds = game_stats.reshape(len(game_stats), N_ROUNDS, n_metrics)
+
+    # Improvement between the first and second half of the game
+    half = N_ROUNDS // 2
+    trend = rounds[:, half:].mean(axis=1) - rounds[:, :half].mean(axis=1)
+
+    return np.hstack([
+        game_stats,
+        rounds.mean(axis=1),
+        rounds.std(axis=1),
+        rounds.min(axis=1),
+        rounds.max(axis=1),
+        trend
+    ])
+
+def build_feature_matrix(age, gender, nativelang, game_stats, n_metrics):
+    """
+    Model input matrix shared by training and the Flask service
+    Args:
+        age: Array of ages
+        gender: Array of encoded genders
+        nativelang: Array of encoded native-language flags
+        game_stats: Array (players, N_ROUNDS * n_metrics) of per-round values
+        n_metrics: Number of metrics recorded per round
+    Returns:
+        X: Feature matrix, one row per player
+    """
+    demographics = np.column_stack([age, gender, nativelang]).astype(np.float64)
+    return np.hstack([demographics, game_stats_features(game_stats, n_metrics)])
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import joblib
+
+
+class FeatureCache:
+    """
+    On-disk cache of extracted handwriting features
+    Entries are keyed by image path and validated against the file's mtime and
+    size (optionally its content hash) and the feature extractor version, so
+    unchanged images never have to be decoded again.
+    """
+
+    def __init__(self, cache_path, version, hash_contents=False):
+        """
+        Args:
+            cache_path: File the cache is persisted to
+            version: Feature extractor version, a mismatch invalidates all entries
+            hash_contents: Also accept entries whose content hash still matches
+                when the mtime or size changed (e.g. after copying the dataset)
+        """
+        self.cache_path = cache_path
+        self.version = version
+        self.hash_contents = hash_contents
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+
+        if os.path.exists(cache_path):
+            try:
+                stored = joblib.load(cache_path)
+                if stored.get('version') == version:
+                    self.entries = stored['entries']
+            except Exception as e:
+                print(f"Ignoring unreadable feature cache {cache_path}: {str(e)}")
+
+    @staticmethod
+    def _content_hash(image_path):
+        """SHA-1 of the file contents"""
+        digest = hashlib.sha1()
+        with open(image_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def get(self, image_path):
+        """
+        Look up the cached value for an image
+        Args:
+            image_path: Path to the image file
+        Returns:
+            value: Cached value, or None if missing or stale
+        """
+        key = os.path.abspath(image_path)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            self.hits += 1
+            return entry['value']
+
+        if self.hash_contents and entry['sha1'] == self._content_hash(image_path):
+            # Same contents under a new mtime, refresh the stat fields only
+            entry['mtime_ns'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            self._dirty = True
+            self.hits += 1
+            return entry['value']
+
+        self.misses += 1
+        return None
+
+    def put(self, image_path, value):
+        """Store the value computed for an image"""
+        stat = os.stat(image_path)
+        self.entries[os.path.abspath(image_path)] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha1': self._content_hash(image_path) if self.hash_contents else None,
+            'value': value
+        }
+        self._dirty = True
+
+    def save(self):
+        """Persist the cache if anything changed"""
+        if not self._dirty:
+            return
+
+        # Write to a temporary file first so an interrupted save never
+        # leaves a truncated cache behind
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        joblib.dump({'version': self.version, 'entries': self.entries}, tmp_path)
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
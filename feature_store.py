@@ -0,0 +1,159 @@
+import json
+import os
+import numpy as np
+
+SCHEMA_FILE = 'schema.json'
+SCHEMA_VERSION = 1
+
+
+class FeatureStore:
+    """
+    Columnar store of extracted handwriting features
+    Features are kept in a fixed-schema float32 matrix with one named column
+    per feature, next to label, image path and image scale arrays. Rows are
+    appended into preallocated arrays that grow geometrically, and the store
+    is persisted as a directory of .npy files that load memory-mapped.
+    """
+
+    def __init__(self, feature_names, capacity=1024):
+        """
+        Args:
+            feature_names: Column names, in matrix column order
+            capacity: Rows allocated up front
+        """
+        self.feature_names = list(feature_names)
+        self._length = 0
+        self._features = np.empty((capacity, len(self.feature_names)), dtype=np.float32)
+        self._labels = np.empty(capacity, dtype=np.int8)
+        self._scales = np.empty(capacity, dtype=np.float32)
+        self._paths = [None] * capacity
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def X(self):
+        """Feature matrix, one row per sample and one column per feature"""
+        return self._features[:self._length]
+
+    @property
+    def y(self):
+        """Labels (0 for LPD, 1 for PD)"""
+        return self._labels[:self._length]
+
+    @property
+    def scales(self):
+        """Image scale each sample was extracted at"""
+        return self._scales[:self._length]
+
+    @property
+    def paths(self):
+        """Image path of each sample"""
+        return self._paths[:self._length]
+
+    def column(self, name):
+        """One feature column by name"""
+        return self.X[:, self.feature_names.index(name)]
+
+    def _reserve(self, rows):
+        """Grow the arrays (doubling) so that rows more samples fit"""
+        needed = self._length + rows
+        capacity = len(self._labels)
+        if needed <= capacity:
+            return
+
+        capacity = max(needed, 2 * capacity, 16)
+        features = np.empty((capacity, len(self.feature_names)), dtype=np.float32)
+        features[:self._length] = self.X
+        labels = np.empty(capacity, dtype=np.int8)
+        labels[:self._length] = self.y
+        scales = np.empty(capacity, dtype=np.float32)
+        scales[:self._length] = self.scales
+
+        self._features, self._labels, self._scales = features, labels, scales
+        self._paths = self.paths + [None] * (capacity - self._length)
+
+    def append(self, features, label, path=None, scale=1.0):
+        """
+        Add one sample
+        Args:
+            features: Feature dictionary, or a sequence ordered like feature_names
+            label: 0 (LPD) or 1 (PD)
+            path: Image path the features were extracted from
+            scale: Image scale passed to extract_features
+        """
+        self._reserve(1)
+        row = self._length
+        if isinstance(features, dict):
+            self._features[row] = [features[name] for name in self.feature_names]
+        else:
+            self._features[row] = features
+        self._labels[row] = label
+        self._scales[row] = scale
+        self._paths[row] = path
+        self._length += 1
+
+    def extend(self, other):
+        """Append every sample of another store with the same schema"""
+        if other.feature_names != self.feature_names:
+            raise ValueError("Feature stores have different columns")
+
+        self._reserve(len(other))
+        rows = slice(self._length, self._length + len(other))
+        self._features[rows] = other.X
+        self._labels[rows] = other.y
+        self._scales[rows] = other.scales
+        self._paths[rows] = other.paths
+        self._length += len(other)
+
+    def rows(self):
+        """Iterate over samples as feature dictionaries"""
+        for row in self.X:
+            yield dict(zip(self.feature_names, row.tolist()))
+
+    def save(self, directory):
+        """
+        Persist the store to a directory of .npy files
+        The schema is written last, so an interrupted save is never loaded.
+        """
+        os.makedirs(directory, exist_ok=True)
+        schema_path = os.path.join(directory, SCHEMA_FILE)
+        if os.path.exists(schema_path):
+            os.remove(schema_path)
+
+        np.save(os.path.join(directory, 'features.npy'), self.X)
+        np.save(os.path.join(directory, 'labels.npy'), self.y)
+        np.save(os.path.join(directory, 'scales.npy'), self.scales)
+        np.save(os.path.join(directory, 'paths.npy'),
+                np.array([(path or '').encode('utf-8') for path in self.paths], dtype=bytes))
+
+        with open(schema_path + '.tmp', 'w') as file:
+            json.dump({'version': SCHEMA_VERSION, 'feature_names': self.feature_names,
+                       'rows': len(self)}, file)
+        os.replace(schema_path + '.tmp', schema_path)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+        Load a store saved with save
+        Args:
+            directory: Directory written by save
+            mmap: Memory-map the feature matrix instead of reading it, rows
+                appended later are copied into memory
+        Returns:
+            store: FeatureStore
+        """
+        with open(os.path.join(directory, SCHEMA_FILE), 'r') as file:
+            schema = json.load(file)
+        if schema.get('version') != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported feature store version {schema.get('version')}")
+
+        store = cls(schema['feature_names'], capacity=0)
+        mmap_mode = 'r' if mmap else None
+        store._features = np.load(os.path.join(directory, 'features.npy'), mmap_mode=mmap_mode)
+        store._labels = np.load(os.path.join(directory, 'labels.npy'))
+        store._scales = np.load(os.path.join(directory, 'scales.npy'))
+        store._paths = [path.decode('utf-8') or None
+                        for path in np.load(os.path.join(directory, 'paths.npy')).tolist()]
+        store._length = schema['rows']
+        return store
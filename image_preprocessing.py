@@ -0,0 +1,138 @@
+import struct
+import cv2
+
+# Long side of an A4/Letter page in inches, used to turn a target DPI into
+# a target image size when the scan resolution is unknown
+PAGE_LONG_SIDE_INCHES = 11.69
+
+# Resolution images are normalized to for training and inference
+DEFAULT_DPI = 150
+
+# Reduced decoding flags by reduction factor, largest first
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+]
+
+# JPEG start-of-frame markers that carry the image size
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                     0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def read_image_size(image_path):
+    """
+    Read the width and height of a PNG or JPEG from its header
+    Returns:
+        (width, height), or None for other formats or unreadable headers
+    """
+    try:
+        with open(image_path, 'rb') as file:
+            header = file.read(24)
+            if header.startswith(b'\x89PNG\r\n\x1a\n') and header[12:16] == b'IHDR':
+                return struct.unpack('>II', header[16:24])
+
+            if not header.startswith(b'\xff\xd8'):
+                return None
+
+            # Walk the JPEG segments until the frame header
+            file.seek(2)
+            while True:
+                marker = file.read(2)
+                if len(marker) < 2 or marker[0] != 0xFF:
+                    return None
+                if marker[1] in (0xD8, 0x01) or 0xD0 <= marker[1] <= 0xD7:
+                    continue
+                length = struct.unpack('>H', file.read(2))[0]
+                if marker[1] in _JPEG_SOF_MARKERS:
+                    height, width = struct.unpack('>xHH', file.read(5))
+                    return width, height
+                file.seek(length - 2, 1)
+    except (OSError, struct.error):
+        return None
+
+def target_long_side(target_dpi):
+    """Image long side in pixels for a page scanned at target_dpi"""
+    return int(round(target_dpi * PAGE_LONG_SIDE_INCHES))
+
+def load_grayscale(image_path, target_dpi=DEFAULT_DPI):
+    """
+    Decode an image as grayscale at roughly target_dpi
+    Uses OpenCV's reduced-resolution decoding (JPEG DCT scaling) only when
+    the header shows the image is at least twice as large as needed, with
+    the largest reduction that does not go below the target, then
+    downsamples the rest of the way with area interpolation.
+    Args:
+        image_path: Path to the image file
+        target_dpi: Resolution the page is normalized to
+    Returns:
+        gray: Grayscale image, or None if it could not be read
+        scale: Size of gray relative to the full-resolution image
+    """
+    target = target_long_side(target_dpi)
+    size = read_image_size(image_path)
+
+    flag = cv2.IMREAD_GRAYSCALE
+    reduction = max(size) / target if size is not None else 1.0
+    if reduction >= 2:
+        flag = next(reduced_flag for factor, reduced_flag in _REDUCED_FLAGS if factor <= reduction)
+
+    gray = cv2.imread(image_path, flag)
+    if gray is None:
+        return None, 1.0
+
+    decoded_long = max(gray.shape[:2])
+    original_long = max(size) if size is not None else decoded_long
+    if decoded_long > target:
+        resize = target / decoded_long
+        gray = cv2.resize(gray, None, fx=resize, fy=resize, interpolation=cv2.INTER_AREA)
+
+    return gray, max(gray.shape[:2]) / original_long
+
+def downsample(gray, target_dpi=DEFAULT_DPI):
+    """Downsample a decoded page to target_dpi, returns (gray, scale)"""
+    target = target_long_side(target_dpi)
+    long_side = max(gray.shape[:2])
+    if long_side <= target:
+        return gray, 1.0
+    scale = target / long_side
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+def normalize_image(image, target_dpi=DEFAULT_DPI):
+    """
+    Bring an already decoded image to the form load_grayscale and crop_to_ink
+    give a file: grayscale, at most target_dpi, cropped to the ink
+    Args:
+        image: BGR or grayscale image array
+        target_dpi: Resolution the page is normalized to
+    Returns:
+        gray: Cropped grayscale image
+        scale: Size of gray relative to image
+        threshold: Ink threshold of the page (see crop_to_ink)
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray, scale = downsample(image, target_dpi)
+    cropped, threshold = crop_to_ink(gray)
+    return cropped, scale, threshold
+
+def crop_to_ink(gray, margin=0.02):
+    """
+    Crop a grayscale page to the bounding box of its ink
+    Args:
+        gray: Grayscale image, dark ink on a light background
+        margin: Padding around the ink as a fraction of the long side
+    Returns:
+        cropped: View of gray around the ink (gray itself if there is none)
+        threshold: Otsu threshold of the whole page, pass it on to
+            extract_features so the crop is not thresholded again
+    """
+    threshold, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(binary)
+    if points is None:
+        return gray, threshold
+
+    x, y, w, h = cv2.boundingRect(points)
+    pad = int(round(margin * max(gray.shape[:2])))
+    top = max(y - pad, 0)
+    left = max(x - pad, 0)
+    return gray[top:y + h + pad, left:x + w + pad], threshold
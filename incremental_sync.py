@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from bulk_loader import iter_typed_batches
+
+# Fields added to every synced document
+SOURCE_FIELD = '_source'
+HASH_FIELD = '_hash'
+
+def content_hash(document):
+    """Stable SHA-1 of a document's fields"""
+    payload = json.dumps(document, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def _file_fingerprint(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def default_checkpoint_path(collection):
+    """Progress file of a collection's sync, kept in the temp directory"""
+    return os.path.join(tempfile.gettempdir(), f'{collection.full_name}.sync.json')
+
+def _load_checkpoint(checkpoint_path, fingerprint):
+    """
+    Progress of an interrupted run over the same file
+    Returns:
+        rows_done: Rows already committed
+        changed: track_fields tuples of the rows those runs upserted
+    """
+    try:
+        with open(checkpoint_path, 'r') as file:
+            checkpoint = json.load(file)
+    except (OSError, ValueError):
+        return 0, set()
+    if checkpoint.get('fingerprint') != fingerprint:
+        return 0, set()
+    return checkpoint['rows_done'], {tuple(values) for values in checkpoint.get('changed', [])}
+
+def _save_checkpoint(checkpoint_path, fingerprint, rows_done, changed):
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump({'fingerprint': fingerprint, 'rows_done': rows_done,
+                   'changed': sorted(changed, key=repr)}, file, default=str)
+    os.replace(tmp_path, checkpoint_path)
+
+def _is_mongomock(collection):
+    return type(collection.database.client).__module__.startswith('mongomock')
+
+def _write_batch(collection, documents):
+    """
+    Upsert a batch of synced documents by _id, so readers always see either
+    the old or the new version of a row. mongomock cannot run ReplaceOne
+    bulk requests under pymongo 4.11+, there every document is replaced on
+    its own.
+    Returns:
+        written: Documents upserted
+        errors: Messages of the documents that were not
+    """
+    if _is_mongomock(collection):
+        written = 0
+        errors = []
+        for document in documents:
+            try:
+                collection.replace_one({'_id': document['_id']}, document, upsert=True)
+                written += 1
+            except PyMongoError as e:
+                errors.append(str(e))
+        return written, errors
+
+    requests = [ReplaceOne({'_id': document['_id']}, document, upsert=True) for document in documents]
+    try:
+        result = collection.bulk_write(requests, ordered=False)
+        return result.matched_count + result.upserted_count, []
+    except BulkWriteError as e:
+        # Unordered writes still apply every valid request
+        write_errors = e.details.get('writeErrors', [])
+        written = e.details.get('nMatched', 0) + e.details.get('nUpserted', 0)
+        return written, [error.get('errmsg', '') for error in write_errors]
+
+def sync_csv(collection, csv_path, delimiter=',', key_fields=None, batch_size=1000,
+             checkpoint_path=None, infer_types=True, track_fields=None):
+    """
+    Incrementally bring a collection in line with a CSV file
+    Each row gets a stable _id: a hash of key_fields when given, otherwise a
+    hash of the whole row (plus its occurrence number for duplicate rows).
+    Only new or changed rows are upserted and rows that disappeared from the
+    file are deleted. Documents not loaded from this file (e.g. users created
+    through signup) are never touched.
+    Args:
+        collection: Target MongoDB collection
+        csv_path: Path to the CSV file
+        delimiter: Field separator
+        key_fields: Fields identifying a row, None to key rows by content
+        batch_size: Rows per bulk upsert
+        checkpoint_path: Progress file used to resume an interrupted run,
+            see default_checkpoint_path
+        infer_types: Convert numeric columns (see bulk_loader)
+        track_fields: Fields whose values are collected for every upserted,
+            replaced or deleted row, e.g. to refresh summaries of the affected
+            groups (kept across interrupted runs)
+    Returns:
+        stats: Dict with upserted, unchanged, deleted, rows, seconds,
+            rows_per_sec, errors and changed (set of track_fields tuples)
+    """
+    start = time.time()
+    source = os.path.basename(csv_path)
+    fingerprint = _file_fingerprint(csv_path)
+    if checkpoint_path is None:
+        checkpoint_path = default_checkpoint_path(collection)
+    resume_from, changed = _load_checkpoint(checkpoint_path, fingerprint)
+
+    # _id -> content hash of everything this file loaded before
+    existing = {document['_id']: document.get(HASH_FIELD)
+                for document in collection.find({SOURCE_FIELD: source}, {HASH_FIELD: 1})}
+
+    seen = set()
+    occurrences = {}
+    rows = 0
+    upserted = 0
+    errors = []
+    for batch in iter_typed_batches(csv_path, delimiter, batch_size, infer_types=infer_types):
+        documents = []
+        for document in batch:
+            row_hash = content_hash(document)
+            if key_fields:
+                key = content_hash({field: document.get(field) for field in key_fields})
+            else:
+                occurrence = occurrences.get(row_hash, 0)
+                occurrences[row_hash] = occurrence + 1
+                key = row_hash if occurrence == 0 else f'{row_hash}:{occurrence}'
+            seen.add(key)
+
+            # Rows committed before an interruption or unchanged since the last run
+            skip = rows < resume_from or existing.get(key) == row_hash
+            rows += 1
+            if skip:
+                continue
+
+            document['_id'] = key
+            document[SOURCE_FIELD] = source
+            document[HASH_FIELD] = row_hash
+            if track_fields:
+                changed.add(tuple(document.get(field) for field in track_fields))
+            documents.append(document)
+
+        if documents:
+            replaced = [document['_id'] for document in documents if document['_id'] in existing]
+            if replaced and track_fields:
+                # The old version of a changed row may belong to another group
+                for document in collection.find({'_id': {'$in': replaced}},
+                                                {field: 1 for field in track_fields}):
+                    changed.add(tuple(document.get(field) for field in track_fields))
+            if track_fields:
+                # Keep the batch's groups even if the run stops halfway
+                # through it, a resumed run skips the rows already written
+                _save_checkpoint(checkpoint_path, fingerprint,
+                                 max(rows - len(batch), resume_from), changed)
+            written, batch_errors = _write_batch(collection, documents)
+            upserted += written
+            errors.extend(batch_errors)
+        if rows > resume_from:
+            _save_checkpoint(checkpoint_path, fingerprint, rows, changed)
+
+    # Remove rows that are no longer in the file
+    stale = [key for key in existing if key not in seen]
+    deleted = 0
+    for i in range(0, len(stale), batch_size):
+        chunk = stale[i:i + batch_size]
+        if track_fields:
+            for document in collection.find({'_id': {'$in': chunk}}, {field: 1 for field in track_fields}):
+                changed.add(tuple(document.get(field) for field in track_fields))
+        deleted += collection.delete_many({'_id': {'$in': chunk}}).deleted_count
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    seconds = time.time() - start
+    return {
+        'upserted': upserted,
+        'unchanged': rows - upserted,
+        'deleted': deleted,
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_sec': rows / seconds if seconds > 0 else 0.0,
+        'errors': errors,
+        'changed': changed
+    }
+
+def print_sync_stats(name, stats):
+    """Print the summary of a sync_csv run"""
+    print(f"Synced {stats['rows']} {name}: {stats['upserted']} upserted, "
+          f"{stats['unchanged']} unchanged, {stats['deleted']} deleted "
+          f"({stats['rows_per_sec']:.0f} rows/sec)")
+    for error in stats['errors']:
+        print(f"Error syncing {name}: {error}")
@@ -0,0 +1,387 @@
+# Lightweight in-process instrumentation shared by all Python services
+# Timers feed fixed-bucket histograms that are rendered in the Prometheus
+# text format, so any server can expose them on /metrics without extra
+# dependencies. Recording a sample costs a perf_counter call and a lock.
+# The sampling profiler is opt-in (METRICS_PROFILER=1, or toggled at
+# runtime with set_profiler_enabled or SIGUSR2) and only runs while a
+# /debug/profile request asks for it.
+import bisect
+import math
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as _StackCounter
+
+# Seconds, from sub-millisecond feature stages to slow database calls
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Limits of the /debug/profile query parameters
+MAX_PROFILE_SECONDS = 60.0
+MIN_PROFILE_INTERVAL = 0.001
+MAX_PROFILE_INTERVAL = 1.0
+
+# None follows METRICS_PROFILER, True/False once toggled at runtime
+_profiler_override = None
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Timer:
+    """Context manager observing its elapsed seconds into a histogram"""
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    """Bucket counts for one label combination"""
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _CounterChild:
+    """Monotonic count for one label combination"""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def snapshot(self):
+        with self._lock:
+            return self._value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def labels(self, *values):
+        """The series for one combination of label values"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._render_samples())
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, typically durations in seconds"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        """Time a block: with histogram.labels('x').time(): ..."""
+        return self.labels().time()
+
+    def _render_samples(self):
+        for values, child in self._series():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = ('le', _format_value(bound))
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}'
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_samples(self):
+        for values, child in self._series():
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.snapshot())}'
+
+
+class Gauge(_Metric):
+    """Current value read from a callback when the metrics are rendered"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        """
+        Args:
+            callback: Returns a number, or a dict of label value tuples to
+                numbers when labelnames are given
+        """
+        self.callback = callback
+        super().__init__(name, documentation, labelnames)
+
+    def labels(self, *values):
+        raise TypeError(f"{self.name} is read from its callback, "
+                        "return a dict keyed by label values instead")
+
+    def _render_samples(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return
+        if not isinstance(value, dict):
+            value = {(): value}
+        for values, number in sorted(value.items()):
+            yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(number)}'
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Shared series, the services label them by stage, route or command
+STAGE_SECONDS = Histogram('dysgraphia_stage_seconds',
+                          'Time spent in each image decoding and feature extraction stage',
+                          ['stage'])
+SCORE_SECONDS = Histogram('model_score_seconds',
+                          'Time spent scaling and scoring a feature matrix',
+                          ['model', 'step'])
+HTTP_SECONDS = Histogram('http_request_seconds', 'HTTP request handling time',
+                         ['service', 'method', 'route', 'status'])
+MONGO_SECONDS = Histogram('mongo_command_seconds', 'MongoDB command round-trip time',
+                          ['command'])
+MONGO_FAILURES = Counter('mongo_command_failures_total', 'Failed MongoDB commands', ['command'])
+
+def mongo_command_listener():
+    """
+    A pymongo CommandListener recording every command's duration
+    pymongo reports the duration itself, so no per-request state is kept.
+    """
+    from pymongo import monitoring
+
+    class MongoCommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            MONGO_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+        def failed(self, event):
+            MONGO_SECONDS.labels(event.command_name).observe(event.duration_micros / 1e6)
+            MONGO_FAILURES.labels(event.command_name).inc()
+
+    return MongoCommandTimer()
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling every thread's stack at a fixed interval
+    Stacks are aggregated in the folded format used by flame graph tools
+    ("outer;inner;leaf count").
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and return the folded stacks"""
+        self._stop.set()
+        self._thread.join()
+        return self.folded()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = ';'.join(f'{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})'
+                                 for entry in traceback.extract_stack(frame))
+                self._stacks[stack] += 1
+            self.samples += 1
+
+    def folded(self, limit=None):
+        return '\n'.join(f'{stack} {count}' for stack, count in self._stacks.most_common(limit)) + '\n'
+
+_profile_lock = threading.Lock()
+
+def profiler_enabled():
+    """Whether /debug/profile may run, checked on every request"""
+    if _profiler_override is not None:
+        return _profiler_override
+    return os.environ.get('METRICS_PROFILER', '') == '1'
+
+def set_profiler_enabled(enabled):
+    """Turn the profiler on or off at runtime, None goes back to METRICS_PROFILER"""
+    global _profiler_override
+    _profiler_override = enabled
+
+def install_profiler_toggle(signum=getattr(signal, 'SIGUSR2', None)):
+    """Flip the profiler on each signum (SIGUSR2), call from the main thread"""
+    if signum is None:
+        return
+    signal.signal(signum, lambda *_: set_profiler_enabled(not profiler_enabled()))
+
+def profile_params(seconds=5.0, interval=0.005):
+    """
+    Validate /debug/profile query parameters
+    Args:
+        seconds: Requested duration, clamped to MAX_PROFILE_SECONDS
+        interval: Requested sampling interval, clamped between
+            MIN_PROFILE_INTERVAL and MAX_PROFILE_INTERVAL
+    Returns:
+        (seconds, interval) as floats
+    Raises:
+        ValueError: If a value is not a finite number
+    """
+    seconds = float(seconds)
+    interval = float(interval)
+    if not math.isfinite(seconds) or not math.isfinite(interval):
+        raise ValueError("seconds and interval must be finite numbers")
+    return (min(max(seconds, 0.0), MAX_PROFILE_SECONDS),
+            min(max(interval, MIN_PROFILE_INTERVAL), MAX_PROFILE_INTERVAL))
+
+def profile(seconds, interval=0.005):
+    """
+    Sample all threads for a while, one profile at a time
+    Returns:
+        folded: Folded stacks, or None if another profile is running
+    """
+    if not _profile_lock.acquire(blocking=False):
+        return None
+    try:
+        profiler = SamplingProfiler(interval)
+        profiler.start()
+        time.sleep(seconds)
+        return profiler.stop()
+    finally:
+        _profile_lock.release()
+
+def instrument_flask(app, service):
+    """
+    Time every request of a Flask app and add /metrics and /debug/profile
+    Args:
+        app: Flask application
+        service: Value of the service label
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_SECONDS.labels(service, request.method, route, response.status_code).observe(
+                time.perf_counter() - start)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    @app.route('/debug/profile', methods=['GET'])
+    def profile_endpoint():
+        if not profiler_enabled():
+            return Response('Profiler disabled, set METRICS_PROFILER=1\n', status=404,
+                            content_type='text/plain')
+        try:
+            seconds, interval = profile_params(request.args.get('seconds', 5),
+                                               request.args.get('interval', 0.005))
+        except ValueError:
+            return Response('Invalid seconds or interval\n', status=400, content_type='text/plain')
+        folded = profile(seconds, interval)
+        if folded is None:
+            return Response('A profile is already running\n', status=409, content_type='text/plain')
+        return Response(folded, content_type='text/plain')
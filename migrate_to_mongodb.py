@@ -1,14 +1,23 @@
+import argparse
 import csv
-from pymongo import MongoClient
+from db import get_db, ensure_indexes
 import os
+from bulk_loader import load_csv
+from incremental_sync import sync_csv, print_sync_stats
+from assessment_analytics import COHORT_FIELDS, refresh_summary
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['user_auth_db']  # Your main database
-
-def migrate_users():
-    users_collection = db['users']
+def migrate_users(incremental=True):
+    users_collection = get_db()['users']
     
+    if incremental:
+        # Keep passwords and names as strings, and key users by email
+        try:
+            stats = sync_csv(users_collection, 'users.csv', key_fields=['email'], infer_types=False)
+            print_sync_stats('users', stats)
+        except Exception as e:
+            print(f"Error migrating users: {str(e)}")
+        return
+
     # Read users.csv and insert into MongoDB
     with open('users.csv', 'r') as file:
         csv_reader = csv.DictReader(file)
@@ -21,47 +30,51 @@ def migrate_users():
             except Exception as e:
                 print(f"Error migrating users: {str(e)}")
 
-def migrate_assessment_data():
-    assessment_collection = db['assessments']
+def migrate_assessment_data(batch_size=1000, workers=4, incremental=True):
+    assessment_collection = get_db()['assessments']
     
-    # Read Dyt-desktop.csv and insert into MongoDB
-    with open('Dyt-desktop.csv', 'r') as file:
-        # The CSV appears to be semicolon-separated
-        csv_reader = csv.reader(file, delimiter=';')
-        
-        # Get headers (first row)
-        headers = next(csv_reader)
-        
-        # Convert data to list of dictionaries
-        assessments = []
-        for row in csv_reader:
-            assessment = {}
-            for i, value in enumerate(row):
-                # Convert string numbers to float where possible
-                try:
-                    if '.' in value:
-                        assessment[headers[i]] = float(value)
-                    else:
-                        assessment[headers[i]] = int(value)
-                except ValueError:
-                    assessment[headers[i]] = value
-            assessments.append(assessment)
-        
-        if assessments:  # Only insert if there is data
-            try:
-                assessment_collection.insert_many(assessments)
-                print(f"Successfully migrated {len(assessments)} assessment records to MongoDB")
-            except Exception as e:
-                print(f"Error migrating assessments: {str(e)}")
+    if incremental:
+        # Upsert new or changed rows and delete removed ones
+        try:
+            stats = sync_csv(assessment_collection, 'Dyt-desktop.csv', delimiter=';',
+                             batch_size=batch_size, track_fields=COHORT_FIELDS)
+            print_sync_stats('assessment records', stats)
+            # Only the cohorts touched by the sync need new summaries
+            refreshed = refresh_summary('assessments', stats['changed'])
+            print(f"Refreshed {refreshed} cohort summaries")
+        except Exception as e:
+            print(f"Error migrating assessments: {str(e)}")
+        return
+
+    # Stream Dyt-desktop.csv (semicolon-separated) into MongoDB in batches
+    try:
+        stats = load_csv(assessment_collection, 'Dyt-desktop.csv', delimiter=';',
+                         batch_size=batch_size, workers=workers)
+        print(f"Successfully migrated {stats['rows']} assessment records to MongoDB "
+              f"({stats['rows_per_sec']:.0f} rows/sec)")
+        for error in stats['errors']:
+            print(f"Error migrating assessments: {error}")
+        refreshed = refresh_summary('assessments')
+        print(f"Refreshed {refreshed} cohort summaries")
+    except Exception as e:
+        print(f"Error migrating assessments: {str(e)}")
 
 if __name__ == "__main__":
-    # Drop existing collections to avoid duplicates
-    db.users.drop()
-    db.assessments.drop()
+    db = get_db()
+    parser = argparse.ArgumentParser(description='Migrate CSV data into MongoDB')
+    parser.add_argument('--full', action='store_true',
+                        help='Drop the collections and reload everything')
+    args = parser.parse_args()
+
+    if args.full:
+        # Drop existing collections to avoid duplicates
+        db.users.drop()
+        db.assessments.drop()
     
     print("Starting migration...")
-    migrate_users()
-    migrate_assessment_data()
+    ensure_indexes()
+    migrate_users(incremental=not args.full)
+    migrate_assessment_data(incremental=not args.full)
     print("Migration completed!")
     
     # Print summary
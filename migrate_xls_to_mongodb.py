@@ -1,65 +1,63 @@
-import pandas as pd
-from pymongo import MongoClient
-import csv
-from datetime import datetime
+from db import get_db, ensure_indexes
+import argparse
+from bulk_loader import iter_typed_batches, load_csv
+from incremental_sync import sync_csv, print_sync_stats
+from assessment_analytics import COHORT_FIELDS, refresh_summary
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['user_auth_db']
+XLS_PATH = 'dyslexia/Dyt-desktop.xls'
 
-def read_assessment_data():
-    # Read the file as CSV with semicolon separator
-    try:
-        with open('dyslexia/Dyt-desktop.xls', 'r') as file:
-            # Read the first line to get headers
-            headers = next(csv.reader([file.readline()], delimiter=';'))
-            
-            # Read the rest of the file
-            reader = csv.DictReader(file, fieldnames=headers, delimiter=';')
-            records = []
-            
-            for row in reader:
-                # Convert string numbers to float or int where possible
-                cleaned_row = {}
-                for key, value in row.items():
-                    try:
-                        if '.' in value:
-                            cleaned_row[key] = float(value)
-                        else:
-                            cleaned_row[key] = int(value)
-                    except (ValueError, TypeError):
-                        cleaned_row[key] = value
-                records.append(cleaned_row)
-            
-            return records
-    except Exception as e:
-        print(f"Error reading file: {str(e)}")
-        return None
+def read_assessment_data(batch_size=1000):
+    """Stream the semicolon-separated file as batches of typed records"""
+    return iter_typed_batches(XLS_PATH, delimiter=';', batch_size=batch_size)
 
-def migrate_xls():
+def migrate_xls(batch_size=1000, workers=4, incremental=True):
     # Create or get the collection
-    xls_collection = db['assessment_data']
+    xls_collection = get_db()['assessment_data']
     
-    # Drop existing collection to avoid duplicates
+    if incremental:
+        # Upsert new or changed rows and delete removed ones
+        try:
+            stats = sync_csv(xls_collection, XLS_PATH, delimiter=';', batch_size=batch_size,
+                             track_fields=COHORT_FIELDS)
+            print_sync_stats('records', stats)
+            # Only the cohorts touched by the sync need new summaries
+            refreshed = refresh_summary('assessment_data', stats['changed'])
+            print(f"Refreshed {refreshed} cohort summaries")
+        except Exception as e:
+            print(f"Error inserting records: {str(e)}")
+        return
+
+    # Drop existing collection to avoid duplicates, and recreate its indexes
     xls_collection.drop()
+    ensure_indexes()
 
     try:
-        # Get the records from the CSV
-        records = read_assessment_data()
+        # Stream the records into the collection
+        stats = load_csv(xls_collection, XLS_PATH, delimiter=';',
+                         batch_size=batch_size, workers=workers)
         
-        if records:
-            # Insert the records
-            result = xls_collection.insert_many(records)
-            print(f"Successfully migrated {len(result.inserted_ids)} records to MongoDB")
+        if stats['rows']:
+            print(f"Successfully migrated {stats['rows']} records to MongoDB "
+                  f"({stats['rows_per_sec']:.0f} rows/sec)")
         else:
             print("No records found to migrate")
+        for error in stats['errors']:
+            print(f"Error inserting records: {error}")
+        refreshed = refresh_summary('assessment_data')
+        print(f"Refreshed {refreshed} cohort summaries")
     except Exception as e:
         print(f"Error inserting records: {str(e)}")
 
 if __name__ == "__main__":
+    db = get_db()
+    parser = argparse.ArgumentParser(description='Migrate the XLS assessment data into MongoDB')
+    parser.add_argument('--full', action='store_true',
+                        help='Drop the collection and reload everything')
+    args = parser.parse_args()
+
     print("Starting XLS migration...")
-    migrate_xls()
+    migrate_xls(incremental=not args.full)
     
     # Print summary
     print("\nDatabase Summary:")
-    print(f"XLS data collection count: {db.xls_data.count_documents({})}")
+    print(f"XLS data collection count: {db.assessment_data.count_documents({})}")
@@ -0,0 +1,212 @@
+import atexit
+import datetime
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import weakref
+import numpy as np
+from db import get_collection
+from metrics import Counter, Gauge, Histogram
+
+RESULTS_COLLECTION = os.environ.get('RESULTS_COLLECTION', 'screening_results')
+
+RECORDED = Counter('screening_results_total', 'Screening results by recorder outcome', ['outcome'])
+FLUSH_SECONDS = Histogram('screening_results_flush_seconds', 'insert_many time per flushed batch')
+
+_recorders = weakref.WeakSet()
+Gauge('screening_results_queue_depth', 'Results waiting to be written',
+      lambda: sum(recorder.queue_depth() for recorder in list(_recorders)))
+
+def input_hash(data):
+    """
+    SHA-1 identifying a model input
+    Args:
+        data: Bytes, a NumPy array (image or feature row), a string (e.g. an
+            image path) or anything JSON-serializable (e.g. a player dict)
+    """
+    digest = hashlib.sha1()
+    if isinstance(data, np.ndarray):
+        digest.update(str((data.shape, data.dtype.str)).encode('ascii'))
+        digest.update(np.ascontiguousarray(data).data)
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        digest.update(data)
+    elif isinstance(data, str):
+        digest.update(data.encode('utf-8'))
+    else:
+        digest.update(json.dumps(data, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ResultRecorder:
+    """
+    Write-behind recorder of screening results
+    record() only puts the document on a bounded in-memory queue. A background
+    thread flushes it with insert_many once batch_size documents are waiting
+    or flush_interval has passed since the first one. The documents a flush
+    could not write are retried with backoff (a duplicate key never is) while
+    new results keep queueing, and when the queue
+    is full record() waits at most put_timeout before dropping the result, so
+    inference never waits on the database for longer than that.
+    """
+
+    def __init__(self, collection_name=RESULTS_COLLECTION, batch_size=100, flush_interval=1.0,
+                 max_queue=10000, put_timeout=0.05, max_retries=5, retry_delay=0.5):
+        """
+        Args:
+            collection_name: Collection the results are inserted into
+            batch_size: Documents per insert_many
+            flush_interval: Seconds a partial batch may wait before it is written
+            max_queue: Documents buffered before record() applies backpressure
+            put_timeout: Seconds record() blocks on a full queue before the
+                result is dropped (None blocks until there is room)
+            max_retries: Attempts to write a batch before it is dropped
+            retry_delay: Seconds before the first retry, doubled up to 5s
+        """
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.errors = []
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        _recorders.add(self)
+
+    def _ensure_started(self):
+        # The worker starts with the first result, so importing a service
+        # that never records anything does not start a thread
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='result-recorder',
+                                                    daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def record(self, document):
+        """
+        Queue one result document
+        Returns:
+            queued: False if the queue stayed full for put_timeout (or the
+                recorder is closed) and the result was dropped
+        """
+        if self._closed:
+            return False
+        self._ensure_started()
+
+        document.setdefault('created_at', datetime.datetime.now(datetime.timezone.utc))
+        try:
+            self._queue.put(document, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            RECORDED.labels('dropped').inc()
+            return False
+        return True
+
+    def _run(self):
+        stop = False
+        while not stop:
+            document = self._queue.get()
+            if document is None:
+                return
+
+            batch = [document]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    document = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if document is None:
+                    stop = True
+                    break
+                batch.append(document)
+
+            self._flush(batch)
+
+    @staticmethod
+    def _unwritten(documents, error):
+        """
+        The documents a failed insert_many should be retried with
+        Returns:
+            retry: Documents listed in the write errors, without duplicate
+                keys, or all of them when the error has no write details
+            inserted: Documents the unordered insert wrote anyway
+        """
+        details = getattr(error, 'details', None) or {}
+        write_errors = details.get('writeErrors')
+        if not write_errors:
+            return documents, details.get('nInserted', 0)
+        failed = {write_error['index']: write_error.get('code') for write_error in write_errors}
+        retry = [documents[index] for index, code in sorted(failed.items()) if code != 11000]
+        return retry, details.get('nInserted', len(documents) - len(failed))
+
+    def _flush(self, batch):
+        pending = batch
+        written = 0
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                result = get_collection(self.collection_name).insert_many(pending, ordered=False)
+                written += len(result.inserted_ids)
+                FLUSH_SECONDS.observe(time.perf_counter() - start)
+                break
+            except Exception as e:
+                # Unordered inserts still write every valid document, only
+                # the failed ones go round again
+                pending, inserted = self._unwritten(pending, e)
+                written += inserted
+                with self._lock:
+                    self.errors = (self.errors + [str(e)])[-20:]
+                if not pending or attempt == self.max_retries or self._closed:
+                    break
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+        with self._lock:
+            self.written += written
+            self.failed += len(batch) - written
+        RECORDED.labels('written').inc(written)
+        if len(batch) > written:
+            RECORDED.labels('failed').inc(len(batch) - written)
+
+    def close(self, timeout=10.0):
+        """Stop accepting results and write the queued ones"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        """Counters and current queue depth"""
+        with self._lock:
+            return {
+                'queued': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'errors': list(self.errors)
+            }
@@ -0,0 +1,265 @@
+import fnmatch
+import glob
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote, urlsplit
+from metrics import Counter
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files the auth server may serve, relative to its root. Anything else
+# (datasets such as users.csv and Dyt-desktop.csv, notebooks with their
+# outputs, .env, Python sources, server.js) is answered with a 404.
+DEFAULT_ALLOWLIST = [
+    '*.html', '*.css', '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.ico',
+    'image/*', 'assets/*',
+    'Dysgraphia/*.html', 'Dysgraphia/*.css', 'Dysgraphia/*.js'
+]
+
+# Types worth compressing, images are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+STATIC_REQUESTS = Counter('static_requests_total', 'Static file requests by outcome', ['result'])
+
+
+class StaticEntry:
+    """One servable file: metadata, validators and cached variants"""
+
+    def __init__(self, relative_path, full_path, stat, inline_limit, compress_limit):
+        self.relative_path = relative_path
+        self.full_path = full_path
+        self.size = stat.st_size
+        self.mtime_ns = stat.st_mtime_ns
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.content_type = mimetypes.guess_type(relative_path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/'):
+            self.content_type += '; charset=utf-8'
+
+        # identity body (None means send it from disk), and encoded variants
+        self.body = None
+        self.variants = {}
+
+        compressible = self.content_type.startswith(COMPRESSIBLE_TYPES)
+        if self.size > inline_limit and (not compressible or self.size > compress_limit):
+            # Streamed from disk with sendfile, validated by size and mtime
+            self.etag = f'"{self.size:x}-{self.mtime_ns:x}"'
+            return
+
+        with open(full_path, 'rb') as file:
+            content = file.read()
+        self.etag = f'"{hashlib.sha1(content).hexdigest()[:20]}"'
+        if self.size <= inline_limit:
+            self.body = content
+
+        if compressible and self.size > 1024:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < self.size:
+                self.variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(content)
+                if len(compressed) < self.size:
+                    self.variants['br'] = compressed
+
+    def is_current(self, stat):
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+
+class StaticCache:
+    """
+    In-memory cache of the allowlisted static files of the auth server
+    Small files are kept in memory and compressible ones get gzip (and brotli,
+    when installed) variants built once when they are loaded. Larger files are
+    sent with os.sendfile, and only a few of those transfers may run at once
+    so downloads cannot tie up every request worker. Every response carries
+    an ETag and Last-Modified, and conditional requests get a 304.
+    """
+
+    def __init__(self, root, allowlist=None, inline_limit=256 * 1024,
+                 compress_limit=8 * 1024 * 1024, max_large_transfers=4, max_age=300):
+        """
+        Args:
+            root: Directory the URL paths are relative to
+            allowlist: Glob patterns of servable paths ('*' does not cross '/')
+            inline_limit: Files up to this size are kept in memory
+            compress_limit: Compressible files up to this size get encoded
+                variants kept in memory
+            max_large_transfers: Concurrent sendfile transfers, more get a 503
+            max_age: Cache-Control max-age in seconds, clients revalidate after
+        """
+        self.root = os.path.abspath(root)
+        self.allowlist = list(allowlist or DEFAULT_ALLOWLIST)
+        self.inline_limit = inline_limit
+        self.compress_limit = compress_limit
+        self.max_age = max_age
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._large_transfers = threading.BoundedSemaphore(max_large_transfers)
+
+    def is_allowed(self, relative_path):
+        depth = relative_path.count('/')
+        return any(pattern.count('/') == depth and fnmatch.fnmatchcase(relative_path, pattern)
+                   for pattern in self.allowlist)
+
+    def preload(self):
+        """Load and compress every allowlisted file, returns the number cached"""
+        for pattern in self.allowlist:
+            for relative_path in glob.glob(pattern, root_dir=self.root):
+                relative_path = relative_path.replace(os.sep, '/')
+                if os.path.isfile(os.path.join(self.root, relative_path)):
+                    self.lookup(relative_path)
+        return len(self._entries)
+
+    def _relative_path(self, url):
+        """Map a request URL to a normalized relative path, None if it escapes the root"""
+        path = unquote(urlsplit(url).path)
+        if '\x00' in path:
+            return None
+        relative_path = posixpath.normpath(path).lstrip('/')
+        if relative_path in ('', '.'):
+            relative_path = 'index.html'
+        parts = relative_path.split('/')
+        if any(part in ('', '..') or part.startswith('.') for part in parts):
+            return None
+        return relative_path
+
+    def lookup(self, relative_path):
+        """
+        The cache entry of an allowlisted file, reloaded when it changed on disk
+        Returns:
+            entry: StaticEntry, or None if the file is not servable
+        """
+        if not self.is_allowed(relative_path):
+            return None
+
+        full_path = os.path.join(self.root, *relative_path.split('/'))
+        try:
+            stat = os.stat(full_path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(relative_path, None)
+            return None
+        if not os.path.isfile(full_path):
+            return None
+
+        entry = self._entries.get(relative_path)
+        if entry is None or not entry.is_current(stat):
+            entry = StaticEntry(relative_path, full_path, stat, self.inline_limit, self.compress_limit)
+            with self._lock:
+                self._entries[relative_path] = entry
+        return entry
+
+    @staticmethod
+    def _select_encoding(entry, accept_encoding):
+        accepted = set()
+        for value in accept_encoding.split(','):
+            name, _, params = value.partition(';')
+            if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                accepted.add(name.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in entry.variants and encoding in accepted:
+                return encoding
+        return None
+
+    @staticmethod
+    def _not_modified(entry, etag, headers):
+        if_none_match = headers.get('If-None-Match')
+        if if_none_match is not None:
+            # Any encoding of the current content is still valid
+            variant_prefix = entry.etag[:-1] + '-'
+            for tag in if_none_match.split(','):
+                tag = tag.strip().removeprefix('W/')
+                if tag in ('*', etag, entry.etag) or (tag.startswith(variant_prefix) and tag.endswith('"')):
+                    return True
+            return False
+
+        if_modified_since = headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(entry.mtime_ns // 1_000_000_000) <= since
+        return False
+
+    def serve(self, handler, head=False):
+        """
+        Answer a GET/HEAD request from the cache
+        Args:
+            handler: BaseHTTPRequestHandler of the request
+            head: Send headers only
+        Returns:
+            served: False if the path is not servable (the caller sends the 404)
+        """
+        relative_path = self._relative_path(handler.path)
+        entry = self.lookup(relative_path) if relative_path else None
+        if entry is None:
+            STATIC_REQUESTS.labels('not_found').inc()
+            return False
+
+        encoding = self._select_encoding(entry, handler.headers.get('Accept-Encoding', ''))
+        etag = entry.etag if encoding is None else f'{entry.etag[:-1]}-{encoding}"'
+
+        if self._not_modified(entry, etag, handler.headers):
+            STATIC_REQUESTS.labels('not_modified').inc()
+            handler.send_response(304)
+            self._send_validators(handler, entry, etag)
+            handler.end_headers()
+            return True
+
+        body = entry.variants[encoding] if encoding else entry.body
+        large = body is None and not head
+        if large and not self._large_transfers.acquire(blocking=False):
+            STATIC_REQUESTS.labels('busy').inc()
+            handler.send_response(503)
+            handler.send_header('Retry-After', '1')
+            handler.send_header('Content-Length', '0')
+            handler.end_headers()
+            return True
+
+        try:
+            handler.send_response(200)
+            handler.send_header('Content-Type', entry.content_type)
+            handler.send_header('Content-Length', str(len(body) if body is not None else entry.size))
+            if encoding:
+                handler.send_header('Content-Encoding', encoding)
+            self._send_validators(handler, entry, etag)
+            handler.end_headers()
+            if head:
+                STATIC_REQUESTS.labels('head').inc()
+            elif body is not None:
+                STATIC_REQUESTS.labels('memory').inc()
+                handler.wfile.write(body)
+            else:
+                STATIC_REQUESTS.labels('sendfile').inc()
+                self._send_file(handler, entry)
+        finally:
+            if large:
+                self._large_transfers.release()
+        return True
+
+    def _send_validators(self, handler, entry, etag):
+        handler.send_header('ETag', etag)
+        handler.send_header('Last-Modified', entry.last_modified)
+        handler.send_header('Cache-Control', f'public, max-age={self.max_age}')
+        handler.send_header('Vary', 'Accept-Encoding')
+        handler.send_header('Access-Control-Allow-Origin', '*')
+
+    @staticmethod
+    def _send_file(handler, entry):
+        """
+        Copy the file to the socket in the kernel
+        socket.sendfile waits for the socket when its buffer is full (the
+        handler's timeout makes it non-blocking) and falls back to send()
+        where os.sendfile is unavailable.
+        """
+        handler.wfile.flush()
+        with open(entry.full_path, 'rb') as file:
+            handler.connection.sendfile(file, 0, entry.size)
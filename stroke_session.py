@@ -0,0 +1,278 @@
+import bisect
+import itertools
+import math
+import threading
+from collections import defaultdict
+import numpy as np
+import cv2
+from dysgraphia_detector import FEATURE_NAMES
+from metrics import STAGE_SECONDS
+
+# tester.html draws on an 800x400 canvas with lineWidth 2
+CANVAS_WIDTH = 800
+CANVAS_HEIGHT = 400
+LINE_WIDTH = 2
+
+# Side in pixels of the grid cells contour boxes are indexed by
+GRID_CELL = 32
+
+
+class _RunningMoments:
+    """Count, mean and standard deviation of values that come and go"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+
+    def remove(self, value):
+        self.count -= 1
+        self.total -= value
+        self.total_sq -= value * value
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def std(self):
+        if not self.count:
+            return 0.0
+        mean = self.total / self.count
+        return math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+
+
+class _SortedGaps:
+    """
+    Intervals kept sorted by (start, key), with the sum and count of the
+    positive gaps between consecutive intervals (next start minus previous
+    end)
+    Inserting or removing an interval only touches the gaps next to it.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._ends = []
+        self.gap_total = 0
+        self.gap_count = 0
+
+    def _gap(self, left, right):
+        if left < 0 or right >= len(self._keys):
+            return
+        gap = self._keys[right][0] - self._ends[left]
+        if gap > 0:
+            yield gap
+
+    def _adjust(self, left, right, sign):
+        for gap in self._gap(left, right):
+            self.gap_total += sign * gap
+            self.gap_count += sign
+
+    def insert(self, start, end, key):
+        index = bisect.bisect_left(self._keys, (start, key))
+        self._adjust(index - 1, index, -1)
+        self._keys.insert(index, (start, key))
+        self._ends.insert(index, end)
+        self._adjust(index - 1, index, 1)
+        self._adjust(index, index + 1, 1)
+
+    def remove(self, start, key):
+        index = bisect.bisect_left(self._keys, (start, key))
+        self._adjust(index - 1, index, -1)
+        self._adjust(index, index + 1, -1)
+        del self._keys[index]
+        del self._ends[index]
+        self._adjust(index - 1, index, 1)
+
+    def mean_gap(self):
+        return self.gap_total / self.gap_count if self.gap_count else 0.0
+
+
+class StrokeSession:
+    """
+    Live handwriting analysis of one canvas, fed stroke batch by stroke batch
+    New strokes are drawn into a binary canvas and only the region they touch
+    is re-contoured: the dirty rectangle grows to cover every known contour
+    whose box overlaps it until nothing changes, so ink that merges with or
+    encloses earlier letters is handled exactly like a full-page
+    RETR_EXTERNAL pass. Contour boxes are indexed by a grid of GRID_CELL
+    buckets, so finding the ones near the dirty region does not scan every
+    contour. Features are kept as running statistics that are updated with
+    the contours that were removed and added.
+    """
+
+    def __init__(self, width=CANVAS_WIDTH, height=CANVAS_HEIGHT, line_width=LINE_WIDTH):
+        self.width = width
+        self.height = height
+        self.line_width = line_width
+        self.canvas = np.zeros((height, width), dtype=np.uint8)
+        self.stroke_count = 0
+        self.lock = threading.Lock()
+        # contour id -> (x, y, w, h, area, angle, start_x), start_x is the
+        # column of the contour's first point (its top-left-most pixel)
+        self.contours = {}
+        # (column, row) grid cell -> ids of the contours whose box (with a
+        # one pixel margin) touches it
+        self._grid = defaultdict(set)
+        self._ids = itertools.count()
+        self._areas = _RunningMoments()
+        self._angles = _RunningMoments()
+        self._bottoms = _RunningMoments()
+        self._rows = _SortedGaps()
+        self._columns = _SortedGaps()
+        self.last_dirty_pixels = 0
+
+    def add_strokes(self, strokes):
+        """
+        Draw a batch of strokes and update the features
+        Args:
+            strokes: List of strokes, each a list of points given as
+                {'x': .., 'y': ..} dicts (as recorded by tester.html) or
+                (x, y) pairs
+        Returns:
+            features: Feature dictionary, see features()
+        """
+        dirty = None
+        with STAGE_SECONDS.labels('session_draw').time():
+            for stroke in strokes:
+                points = np.array([(point['x'], point['y']) if isinstance(point, dict) else point[:2]
+                                   for point in stroke], dtype=np.float64)
+                if not len(points):
+                    continue
+                points = np.round(points).astype(np.int32)
+                if len(points) == 1:
+                    cv2.circle(self.canvas, tuple(points[0]), max(self.line_width // 2, 1), 255, -1)
+                else:
+                    cv2.polylines(self.canvas, [points.reshape(-1, 1, 2)], False, 255, self.line_width)
+                self.stroke_count += 1
+
+                pad = self.line_width
+                box = (points[:, 0].min() - pad, points[:, 1].min() - pad,
+                       points[:, 0].max() + pad + 1, points[:, 1].max() + pad + 1)
+                dirty = box if dirty is None else _union(dirty, box)
+
+        if dirty is not None:
+            with STAGE_SECONDS.labels('session_recontour').time():
+                self._recontour(self._clip(dirty))
+        return self.features()
+
+    def _clip(self, box):
+        x0, y0, x1, y1 = box
+        return (max(int(x0), 0), max(int(y0), 0), min(int(x1), self.width), min(int(y1), self.height))
+
+    def _recontour(self, dirty):
+        # Grow the region over every contour whose box touches it (one pixel
+        # margin for 8-connectivity) until it stops growing
+        region = dirty
+        affected = set()
+        while True:
+            grown = region
+            nearby = set()
+            for cell in _cells(region):
+                nearby.update(self._grid.get(cell, ()))
+            for contour_id in nearby - affected:
+                x, y, w, h = self.contours[contour_id][:4]
+                if _overlaps(region, (x - 1, y - 1, x + w + 1, y + h + 1)):
+                    affected.add(contour_id)
+                    grown = _union(grown, (x, y, x + w, y + h))
+            if grown == region:
+                break
+            region = self._clip(grown)
+
+        for contour_id in affected:
+            self._remove(contour_id)
+
+        x0, y0, x1, y1 = region
+        self.last_dirty_pixels = (x1 - x0) * (y1 - y0)
+        contours, _ = cv2.findContours(self.canvas[y0:y1, x0:x1], cv2.RETR_EXTERNAL,
+                                       cv2.CHAIN_APPROX_SIMPLE, offset=(x0, y0))
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            self._add(next(self._ids), (x, y, w, h, cv2.contourArea(contour),
+                                        cv2.minAreaRect(contour)[2], int(contour[0][0][0])))
+
+    def _add(self, contour_id, contour):
+        x, y, w, h, area, angle, start_x = contour
+        self.contours[contour_id] = contour
+        self._areas.add(area)
+        self._angles.add(abs(angle + 90 if angle < -45 else angle))
+        self._bottoms.add(y + h)
+        # extract_features stable-sorts boxes in findContours order, which
+        # is reverse raster order of the contours' first points: boxes with
+        # the same top come right to left, with the same left bottom to top
+        self._rows.insert(y, y + h, (-start_x,))
+        self._columns.insert(x, x + w, (-y, -start_x))
+        for cell in _cells((x - 1, y - 1, x + w + 1, y + h + 1)):
+            self._grid[cell].add(contour_id)
+
+    def _remove(self, contour_id):
+        x, y, w, h, area, angle, start_x = self.contours.pop(contour_id)
+        self._areas.remove(area)
+        self._angles.remove(abs(angle + 90 if angle < -45 else angle))
+        self._bottoms.remove(y + h)
+        self._rows.remove(y, (-start_x,))
+        self._columns.remove(x, (-y, -start_x))
+        for cell in _cells((x - 1, y - 1, x + w + 1, y + h + 1)):
+            ids = self._grid[cell]
+            ids.discard(contour_id)
+            if not ids:
+                del self._grid[cell]
+
+    def features(self):
+        """
+        Current features, same as DysgraphiaDetector.extract_features on the
+        rendered canvas
+        """
+        if len(self.contours) < 2:
+            return {
+                'line_spacing': 0.0,
+                'letter_size_variation': 0.0,
+                'writing_pressure': 255.0 if self.contours else 0.0,
+                'letter_spacing': 0.0,
+                'slant_angle': 0.0,
+                'baseline_deviation': 0.0
+            }
+
+        mean_area = self._areas.mean()
+        return {
+            'line_spacing': float(self._rows.mean_gap()),
+            'letter_size_variation': self._areas.std() / mean_area if mean_area > 0 else 0.0,
+            # The canvas is binary, every ink pixel has full intensity
+            'writing_pressure': 255.0,
+            'letter_spacing': float(self._columns.mean_gap()),
+            'slant_angle': self._angles.mean(),
+            'baseline_deviation': self._bottoms.std()
+        }
+
+    def feature_row(self):
+        """Features ordered like FEATURE_NAMES"""
+        features = self.features()
+        return [features[name] for name in FEATURE_NAMES]
+
+    def render(self):
+        """The canvas as a BGR image (dark ink on white) for full extraction"""
+        return cv2.cvtColor(255 - self.canvas, cv2.COLOR_GRAY2BGR)
+
+    def stats(self):
+        return {
+            'strokes': self.stroke_count,
+            'contours': len(self.contours),
+            'last_dirty_pixels': self.last_dirty_pixels,
+            'canvas_pixels': self.width * self.height
+        }
+
+
+def _union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+def _cells(box):
+    """Grid cells covered by an (x0, y0, x1, y1) box"""
+    x0, y0, x1, y1 = box
+    return itertools.product(range(x0 // GRID_CELL, (x1 - 1) // GRID_CELL + 1),
+                             range(y0 // GRID_CELL, (y1 - 1) // GRID_CELL + 1))
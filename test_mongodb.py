@@ -1,9 +1,7 @@
-from pymongo import MongoClient
+from db import get_collection
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017/')
-db = client['user_auth_db']
-users_collection = db['users']
+# Connect to MongoDB (set MONGODB_URI=mongomock:// to run in memory)
+users_collection = get_collection('users')
 
 # Create a test user
 test_user = {
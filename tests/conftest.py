@@ -0,0 +1,50 @@
+import os
+import sys
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MONGODB_URI', 'mongomock://')
+
+import mongomock
+import numpy as np
+import pytest
+import db
+
+
+@pytest.fixture
+def mock_db():
+    """A fresh in-memory database for the test"""
+    db.set_client(mongomock.MongoClient())
+    yield db.get_db()
+    db.set_client(None)
+
+
+class ListRecorder:
+    """Stands in for ResultRecorder, keeping the documents in memory"""
+
+    def __init__(self):
+        self.documents = []
+
+    def record(self, document):
+        self.documents.append(document)
+
+
+@pytest.fixture(scope='session')
+def detector():
+    """A small DysgraphiaDetector trained on random feature rows"""
+    from dysgraphia_detector import DysgraphiaDetector, FEATURE_NAMES
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(50.0, 20.0, size=(100, len(FEATURE_NAMES)))
+    detector = DysgraphiaDetector()
+    detector.model.set_params(n_estimators=5)
+    detector.train(X, (X[:, 0] > 50).astype(int))
+    return detector
+
+
+@pytest.fixture
+def recorder(detector, monkeypatch):
+    """A ListRecorder the trained detector records to during the test"""
+    recorder = ListRecorder()
+    monkeypatch.setattr(detector, 'recorder', recorder)
+    return recorder
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from assessment_analytics import SUMMARY_COLLECTION, cohort_stats, refresh_summary
+from dyslexia_features import N_ROUNDS
+
+
+def raw_stats(collection, group_by, filters=None):
+    """The same answer aggregated straight from the raw rows"""
+    group = {'_id': {field: f'${field}' for field in group_by},
+             'count': {'$sum': 1},
+             'dyslexia_rate': {'$avg': {'$cond': [{'$eq': ['$Dyslexia', 'Yes']}, 1, 0]}}}
+    for round_number in range(1, N_ROUNDS + 1):
+        group[f'mean_accuracy_{round_number}'] = {'$avg': f'$Accuracy{round_number}'}
+    pipeline = [{'$match': filters or {}}, {'$group': group}]
+
+    result = {}
+    for row in collection.aggregate(pipeline):
+        key = tuple(row['_id'][field] for field in group_by)
+        result[key] = (row['count'], row['dyslexia_rate'],
+                       [row[f'mean_accuracy_{round_number}'] for round_number in range(1, N_ROUNDS + 1)])
+    return result
+
+
+def insert_rows(collection, count, seed):
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(count):
+        row = {'Age': int(rng.integers(7, 12)), 'Gender': str(rng.choice(['Male', 'Female'])),
+               'Nativelang': str(rng.choice(['Yes', 'No'])),
+               'Dyslexia': str(rng.choice(['Yes', 'No'], p=[0.2, 0.8]))}
+        for round_number in range(1, N_ROUNDS + 1):
+            row[f'Accuracy{round_number}'] = float(rng.uniform(0, 1))
+        rows.append(row)
+    collection.insert_many(rows)
+    return rows
+
+
+def assert_matches_raw(collection, group_by, filters=None):
+    stats = cohort_stats('assessments', group_by, filters)
+    expected = raw_stats(collection, group_by, filters)
+    assert [tuple(row[field] for field in group_by) for row in stats] == sorted(expected)
+    for row in stats:
+        count, dyslexia_rate, mean_accuracy = expected[tuple(row[field] for field in group_by)]
+        assert row['count'] == count
+        assert row['dyslexia_rate'] == pytest.approx(dyslexia_rate, rel=1e-12)
+        assert row['mean_accuracy'] == pytest.approx(mean_accuracy, rel=1e-12)
+
+
+@pytest.mark.parametrize('group_by, filters', [
+    (['Gender'], None),
+    (['Age', 'Gender'], None),
+    (['Age', 'Gender', 'Nativelang'], None),
+    (['Age'], {'Nativelang': 'Yes'}),
+    (['Nativelang'], {'Gender': 'Female', 'Age': 9})
+])
+def test_roll_up_matches_the_raw_aggregate(mock_db, group_by, filters):
+    collection = mock_db['assessments']
+    insert_rows(collection, 300, seed=0)
+    refresh_summary('assessments')
+    assert_matches_raw(collection, group_by, filters)
+
+
+def test_refreshing_touched_cohorts_keeps_the_roll_up_exact(mock_db):
+    collection = mock_db['assessments']
+    insert_rows(collection, 200, seed=1)
+    refresh_summary('assessments')
+
+    emptied = {'Age': 7, 'Gender': 'Male', 'Nativelang': 'No'}
+    assert mock_db[SUMMARY_COLLECTION].count_documents(emptied) == 1
+
+    # New rows in some cohorts, and one cohort emptied
+    added = insert_rows(collection, 20, seed=2)
+    collection.delete_many(emptied)
+    touched = {(row['Age'], row['Gender'], row['Nativelang']) for row in added}
+    touched.add((7, 'Male', 'No'))
+    refresh_summary('assessments', touched)
+
+    assert mock_db[SUMMARY_COLLECTION].count_documents(emptied) == 0
+    assert_matches_raw(collection, ['Age', 'Gender', 'Nativelang'])
+    assert_matches_raw(collection, ['Gender'])
@@ -0,0 +1,22 @@
+import pytest
+from auth_sessions import bearer_email, issue_token, verify_token
+
+
+def test_issued_token_round_trips():
+    claims = verify_token(issue_token('teacher@example.com'))
+    assert claims['email'] == 'teacher@example.com'
+    assert bearer_email('Bearer ' + issue_token('teacher@example.com')) == 'teacher@example.com'
+
+
+def test_expired_and_tampered_tokens_are_rejected():
+    assert verify_token(issue_token('teacher@example.com', ttl=-1)) is None
+    payload, signature = issue_token('teacher@example.com').split('.')
+    forged = issue_token('admin@example.com').split('.')[0]
+    assert verify_token(f'{forged}.{signature}') is None
+
+
+@pytest.mark.parametrize('token', ['abc.é', 'é.abc', 'a.b.c', 'abc', '', None, 42, b'abc.def'])
+def test_malformed_tokens_return_none(token):
+    assert verify_token(token) is None
+    if isinstance(token, str):
+        assert bearer_email(f'Bearer {token}') is None
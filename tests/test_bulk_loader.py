@@ -0,0 +1,64 @@
+from pymongo.errors import AutoReconnect, OperationFailure
+import pytest
+from bulk_loader import iter_typed_batches, load_csv
+
+
+class FailingCollection:
+    """insert_many always raises the given error"""
+
+    def __init__(self, error):
+        self.error = error
+
+    def insert_many(self, batch, ordered=False):
+        raise self.error
+
+
+def write_csv(path, rows):
+    path.write_text('\n'.join(';'.join(row) for row in rows) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('error', [AutoReconnect('connection closed'),
+                                   OperationFailure('failed', details=None)])
+def test_connection_errors_do_not_stall_the_writers(tmp_path, error):
+    csv_path = write_csv(tmp_path / 'rows.csv', [['a', 'b']] + [[str(i), 'x'] for i in range(500)])
+    stats = load_csv(FailingCollection(error), csv_path, delimiter=';', batch_size=10,
+                     workers=2, max_pending=2)
+    assert stats['rows'] == 0
+    assert len(stats['errors']) == 50
+
+
+def test_unexpected_errors_are_raised_by_close(tmp_path):
+    csv_path = write_csv(tmp_path / 'rows.csv', [['a']] + [[str(i)] for i in range(100)])
+    with pytest.raises(RuntimeError):
+        load_csv(FailingCollection(RuntimeError('bug')), csv_path, delimiter=';', batch_size=10,
+                 workers=2, max_pending=1)
+
+
+def test_column_types_cover_the_sample(tmp_path):
+    # The late values would have promoted the columns after the first batches
+    rows = [['count', 'score', 'name']] + [[str(i), str(i), 'n'] for i in range(300)]
+    rows += [['1.5', 'high', 'n']]
+    csv_path = write_csv(tmp_path / 'rows.csv', rows)
+
+    documents = [document for batch in iter_typed_batches(csv_path, ';', batch_size=50)
+                 for document in batch]
+    assert {type(document['count']) for document in documents} == {float}
+    assert {type(document['score']) for document in documents} == {str}
+    assert documents[0] == {'count': 0.0, 'score': '0', 'name': 'n'}
+
+
+def test_values_after_the_sample_promote_their_column(tmp_path, monkeypatch):
+    rows = [['count', 'name']] + [[str(i), 'n'] for i in range(200)] + [['1.5', 'n'], ['7', 'n']]
+    csv_path = write_csv(tmp_path / 'rows.csv', rows)
+    opened = []
+    real_open = open
+    monkeypatch.setattr('builtins.open', lambda *args, **kwargs: opened.append(args[0]) or
+                        real_open(*args, **kwargs))
+
+    documents = [document for batch in iter_typed_batches(csv_path, ';', batch_size=50, sample_rows=100)
+                 for document in batch]
+    assert opened == [csv_path]
+    assert len(documents) == 202
+    assert type(documents[199]['count']) is int
+    assert documents[200]['count'] == 1.5 and documents[201]['count'] == 7.0
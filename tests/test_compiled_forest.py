@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from compiled_forest import CompiledForest
+from dysgraphia_detector import COMPILED_MAX_ROWS, DysgraphiaDetector, FEATURE_NAMES
+
+
+@pytest.fixture(scope='module')
+def fitted():
+    rng = np.random.default_rng(0)
+    X = rng.normal(5.0, 3.0, size=(400, len(FEATURE_NAMES)))
+    y = (X[:, 0] + X[:, 3] + rng.normal(size=len(X)) > 10).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=25, random_state=42).fit(scaler.transform(X), y)
+    return model, scaler
+
+
+@pytest.mark.parametrize('n_rows', [1, 7, COMPILED_MAX_ROWS, 1000])
+def test_predict_proba_matches_sklearn(fitted, n_rows):
+    model, scaler = fitted
+    compiled = CompiledForest.from_sklearn(model, scaler)
+    X = np.random.default_rng(n_rows).normal(5.0, 6.0, size=(n_rows, len(FEATURE_NAMES)))
+
+    labels, proba = compiled.predict(X)
+    expected = model.predict_proba(scaler.transform(X))
+    np.testing.assert_allclose(proba, expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(labels, model.predict(scaler.transform(X)))
+
+
+def test_single_row_input(fitted):
+    model, scaler = fitted
+    compiled = CompiledForest.from_sklearn(model, scaler)
+    row = np.full(len(FEATURE_NAMES), 5.0)
+    np.testing.assert_allclose(compiled.predict_proba(row),
+                               model.predict_proba(scaler.transform(row[np.newaxis, :])), atol=1e-12)
+
+
+def test_detector_scores_agree_across_cutoff(fitted):
+    model, scaler = fitted
+    detector = DysgraphiaDetector()
+    detector.model, detector.scaler, detector.is_trained = model, scaler, True
+    detector.compile_model()
+
+    X = np.random.default_rng(1).normal(5.0, 3.0, size=(COMPILED_MAX_ROWS + 1, len(FEATURE_NAMES)))
+    _, small = detector.predict_batch(X[:COMPILED_MAX_ROWS], record=False)
+    _, large = detector.predict_batch(X, record=False)
+    np.testing.assert_allclose(small, large[:COMPILED_MAX_ROWS], atol=1e-12)
@@ -0,0 +1,71 @@
+import cv2
+import numpy as np
+import pytest
+from document_pipeline import screen_document
+
+
+def write_page(path, lines, width=1000):
+    page = np.full((120 * lines + 120, width), 255, dtype=np.uint8)
+    for line in range(lines):
+        cv2.putText(page, 'handwriting sample', (40, 120 * line + 100), cv2.FONT_HERSHEY_SIMPLEX,
+                    1.5, 0, 3)
+    cv2.imwrite(str(path), page)
+
+
+def test_pages_and_lines_come_out_in_order(tmp_path, detector):
+    # Larger pages take longer, so workers finish out of page order
+    line_counts = [6, 1, 4, 2, 5, 3]
+    for index, lines in enumerate(line_counts):
+        write_page(tmp_path / f'page{index}.png', lines)
+
+    results = list(screen_document(detector, str(tmp_path), max_in_flight=3, n_workers=3))
+    pages = results[:-1]
+    assert [page['page'] for page in pages] == [1, 2, 3, 4, 5, 6]
+    assert [page['name'] for page in pages] == [f'page{index}.png' for index in range(6)]
+    assert [len(page['lines']) for page in pages] == line_counts
+    for page in pages:
+        tops = [line['top'] for line in page['lines']]
+        assert tops == sorted(tops)
+
+    document = results[-1]
+    assert document['type'] == 'document'
+    assert document['pages'] == 6 and document['lines'] == sum(line_counts)
+    assert document['failed_pages'] == []
+
+
+def test_unreadable_file_yields_an_error_record_and_continues(tmp_path, detector, recorder):
+    write_page(tmp_path / 'a.png', 2)
+    (tmp_path / 'b.png').write_bytes(b'not an image')
+    write_page(tmp_path / 'c.png', 3)
+    results = list(screen_document(detector, str(tmp_path)))
+
+    assert [result['type'] for result in results] == ['page', 'page_error', 'page', 'document']
+    assert results[1]['page'] == 2 and results[1]['name'] == 'b.png'
+    assert 'b.png' in results[1]['error']
+    assert results[-1]['pages'] == 2 and results[-1]['failed_pages'] == [2]
+    # Pages are recorded, their lines and the failed page are not
+    assert sorted(document['page'] for document in recorder.documents) == [1, 3]
+
+
+def test_corrupt_tiff_in_a_folder_is_reported(tmp_path, detector):
+    (tmp_path / 'a.tif').write_bytes(b'II*\x00garbage')
+    write_page(tmp_path / 'b.png', 2)
+
+    results = list(screen_document(detector, str(tmp_path)))
+    assert [result['type'] for result in results] == ['page_error', 'page', 'document']
+    assert results[0]['name'] == 'a.tif'
+    assert results[-1]['pages'] == 1 and results[-1]['failed_pages'] == [1]
+
+
+def test_document_without_readable_pages_has_no_score(tmp_path, detector):
+    (tmp_path / 'a.tif').write_bytes(b'not a tiff')
+    (tmp_path / 'b.png').write_bytes(b'not a png')
+
+    document = list(screen_document(detector, str(tmp_path)))[-1]
+    assert document['type'] == 'document'
+    assert document['pages'] == 0 and document['failed_pages'] == [1, 2]
+    assert 'error' in document
+    assert 'prediction' not in document and 'probability' not in document
+
+    with pytest.raises(ValueError):
+        list(screen_document(detector, str(tmp_path / 'a.tif')))
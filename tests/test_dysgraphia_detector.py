@@ -0,0 +1,108 @@
+import cv2
+import numpy as np
+import pytest
+from dysgraphia_detector import COMPILED_MAX_ROWS, DysgraphiaDetector, FEATURE_NAMES
+
+
+def baseline_features(gray):
+    """The per-feature loops extract_features replaced, one findContours each"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    features = dict.fromkeys(FEATURE_NAMES, 0.0)
+    non_zero = binary[binary > 0]
+    features['writing_pressure'] = np.mean(non_zero) if len(non_zero) > 0 else 0.0
+    if len(contours) < 2:
+        return features
+
+    boxes = [cv2.boundingRect(c) for c in contours]
+    for name, axis in (('line_spacing', 1), ('letter_spacing', 0)):
+        ordered = sorted(boxes, key=lambda box: box[axis])
+        spacings = []
+        for i in range(len(ordered) - 1):
+            spacing = ordered[i + 1][axis] - (ordered[i][axis] + ordered[i][axis + 2])
+            if spacing > 0:
+                spacings.append(spacing)
+        features[name] = np.mean(spacings) if spacings else 0.0
+
+    areas = [cv2.contourArea(c) for c in contours]
+    features['letter_size_variation'] = np.std(areas) / np.mean(areas) if np.mean(areas) > 0 else 0.0
+
+    angles = []
+    for c in contours:
+        angle = cv2.minAreaRect(c)[2]
+        if angle < -45:
+            angle += 90
+        angles.append(abs(angle))
+    features['slant_angle'] = np.mean(angles)
+
+    features['baseline_deviation'] = np.std([box[1] + box[3] for box in boxes])
+    return features
+
+
+def handwriting_page(seed):
+    rng = np.random.default_rng(seed)
+    page = np.full((400, 900), 255, dtype=np.uint8)
+    for line in range(int(rng.integers(1, 5))):
+        words = ''.join(rng.choice(list('abcdefghij klmnop'), size=int(rng.integers(4, 20))))
+        origin = (int(rng.integers(5, 60)), 80 * line + int(rng.integers(50, 80)))
+        cv2.putText(page, words, origin, cv2.FONT_HERSHEY_SCRIPT_SIMPLEX,
+                    float(rng.uniform(0.8, 1.6)), int(rng.integers(0, 80)), int(rng.integers(1, 4)))
+    # Stray marks, some of them sharing an edge with the letters
+    for _ in range(int(rng.integers(0, 15))):
+        x, y = int(rng.integers(0, 880)), int(rng.integers(0, 380))
+        cv2.rectangle(page, (x, y), (x + int(rng.integers(1, 20)), y + int(rng.integers(1, 20))), 0, -1)
+    return page
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_features_match_the_baseline_loops_exactly(seed):
+    page = handwriting_page(seed)
+    expected = baseline_features(page)
+    features = DysgraphiaDetector().extract_features(page)
+    for name in FEATURE_NAMES:
+        assert features[name] == expected[name], name
+
+
+@pytest.mark.parametrize('page', [np.full((50, 50), 255, dtype=np.uint8),
+                                  cv2.circle(np.full((50, 50), 255, dtype=np.uint8), (25, 25), 10, 0, -1)])
+def test_blank_and_single_contour_pages_match_the_baseline(page):
+    assert DysgraphiaDetector().extract_features(page) == baseline_features(page)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 3])
+def test_predict_batch_matches_repeated_predict(tmp_path, detector, recorder, n_jobs):
+    images = [handwriting_page(seed) for seed in range(6)]
+    path = str(tmp_path / 'page.png')
+    cv2.imwrite(path, images[0])
+    items = images + [path]
+
+    single = [detector.predict(item) for item in items]
+    single_documents = list(recorder.documents)
+    recorder.documents.clear()
+    predictions, probabilities = detector.predict_batch(items, n_jobs=n_jobs)
+
+    assert predictions.tolist() == [prediction for prediction, _ in single]
+    assert probabilities.tolist() == [probability for _, probability in single]
+    assert recorder.documents == single_documents
+
+
+def test_predict_batch_scores_feature_rows_like_their_images(detector):
+    images = [handwriting_page(seed) for seed in range(4)]
+    rows = [detector.image_features(image) for image in images]
+    rows[1] = [rows[1][name] for name in FEATURE_NAMES]
+
+    predictions, probabilities = detector.predict_batch(rows)
+    single = [detector.predict(image) for image in images]
+    assert predictions.tolist() == [prediction for prediction, _ in single]
+    assert probabilities.tolist() == [probability for _, probability in single]
+
+
+def test_large_batches_score_like_single_predictions(detector):
+    rng = np.random.default_rng(1)
+    rows = rng.normal(50.0, 20.0, size=(COMPILED_MAX_ROWS + 50, len(FEATURE_NAMES)))
+
+    predictions, probabilities = detector.predict_batch(rows, record=False)
+    single = [detector.predict_batch([row], record=False) for row in rows]
+    assert predictions.tolist() == [prediction[0] for prediction, _ in single]
+    np.testing.assert_allclose(probabilities, [probability[0] for _, probability in single],
+                               rtol=0, atol=1e-12)
@@ -0,0 +1,96 @@
+import json
+import pytest
+import dysgraphia_server
+
+
+@pytest.fixture
+def server(monkeypatch, detector, recorder):
+    batcher = dysgraphia_server.MicroBatcher(detector, max_wait_ms=1)
+    monkeypatch.setattr(dysgraphia_server, 'batcher', batcher)
+    yield dysgraphia_server.app.test_client(), recorder
+    batcher.close()
+
+
+def test_only_final_session_submission_is_recorded(server):
+    client, recorder = server
+    session_id = client.post('/session', json={}).get_json()['session_id']
+    url = f'/session/{session_id}/strokes'
+
+    for x in (100, 200, 300):
+        response = client.post(url, json={'strokes': [[[x, 50], [x, 120]]]})
+        assert 'probability' in response.get_json()
+    assert client.get(f'/session/{session_id}').status_code == 200
+    assert recorder.documents == []
+
+    final = client.post(url, json={'strokes': [[[400, 50], [400, 90]]], 'final': True}).get_json()
+    assert final['closed'] is True
+    assert len(recorder.documents) == 1
+    assert recorder.documents[0]['session_id'] == session_id
+    assert recorder.documents[0]['strokes'] == 4
+    assert recorder.documents[0]['probability'] == final['probability']
+
+    assert client.post(url, json={'strokes': [], 'final': True}).status_code == 404
+    assert len(recorder.documents) == 1
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'data': b''},
+    {'data': b'garbage, not an image'},
+    {'json': {'image': ''}},
+    {'json': {'image': 'data:image/png;base64,'}},
+    {'json': {'image': 'not base64!'}},
+    {'json': {'image': 42}},
+    {'json': {'images': ['', 'data:image/png;base64,']}},
+    {'json': ['not', 'an', 'object']}
+])
+@pytest.mark.parametrize('route', ['/predict', '/predict_batch'])
+def test_empty_or_garbage_images_are_rejected(server, route, kwargs):
+    client, recorder = server
+    response = client.post(route, **kwargs)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    assert recorder.documents == []
+
+
+def _stream(response):
+    try:
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    finally:
+        response.close()
+
+
+def test_corrupt_document_upload_ends_with_an_error_record(server, monkeypatch):
+    client, _ = server
+    monkeypatch.setattr(dysgraphia_server, 'detector', dysgraphia_server.batcher.detector)
+    response = client.post('/screen_document?filename=scan.tif', data=b'II*\x00garbage')
+    assert response.status_code == 200
+    assert _stream(response) == [{'type': 'error', 'error': 'Could not read TIFF scan.tif'}]
+
+
+def test_unexpected_screening_error_ends_the_stream_cleanly(server, monkeypatch):
+    client, _ = server
+    monkeypatch.setattr(dysgraphia_server, 'detector', dysgraphia_server.batcher.detector)
+
+    def failing_screen(*args, **kwargs):
+        yield {'type': 'page', 'page': 1}
+        raise RuntimeError('decoder crashed')
+
+    monkeypatch.setattr(dysgraphia_server, 'screen_document', failing_screen)
+    results = _stream(client.post('/screen_document?filename=scan.png', data=b'x'))
+    assert results == [{'type': 'page', 'page': 1},
+                       {'type': 'error', 'error': 'Could not screen document'}]
+
+
+@pytest.mark.parametrize('size', [{'width': 4096, 'height': 400}, {'width': 2048, 'height': 2048},
+                                  {'width': 0, 'height': 400}, {'width': -5, 'height': 10},
+                                  {'width': 'wide', 'height': 400}])
+def test_oversized_or_invalid_canvas_is_rejected(server, size):
+    client, _ = server
+    assert client.post('/session', json=size).status_code == 400
+
+
+def test_canvas_up_to_the_cap_is_accepted(server):
+    client, _ = server
+    response = client.post('/session', json={'width': 2048, 'height': 1024})
+    assert response.status_code == 200
+    assert response.get_json()['width'] == 2048
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+import dyslexia_detection
+from compiled_forest import CompiledForest
+from dyslexia_features import N_ROUNDS
+
+
+def player(**overrides):
+    return dict({'Age': 9, 'Gender': 'Male', 'Nativelang': 'Yes', 'GameStats': [0.5] * N_ROUNDS},
+                **overrides)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(dyslexia_detection, 'encodings', {'Gender': {'Male': 0, 'Female': 1},
+                                                          'Nativelang': {'No': 0, 'Yes': 1}})
+    monkeypatch.setattr(dyslexia_detection, 'n_game_stat_metrics', 1)
+    monkeypatch.setattr(dyslexia_detection, 'recorder', None)
+
+    rng = np.random.default_rng(0)
+    players = [player(Age=int(rng.integers(7, 18)), GameStats=rng.uniform(size=N_ROUNDS).tolist())
+               for _ in range(60)]
+    X = dyslexia_detection.build_features(players)
+    y = (X[:, 0] > 12).astype(int)
+    scaler = StandardScaler().fit(X)
+    forest = RandomForestClassifier(n_estimators=5, random_state=0).fit(scaler.transform(X), y)
+    monkeypatch.setattr(dyslexia_detection, 'model', CompiledForest.from_sklearn(forest, scaler))
+    return dyslexia_detection.app.test_client()
+
+
+def test_valid_players_are_scored(client):
+    assert client.post('/predict', json=player()).status_code == 200
+    response = client.post('/predict_batch', json={'players': [player(), player(Gender='Female')]})
+    assert len(response.get_json()['predictions']) == 2
+
+
+@pytest.mark.parametrize('bad', [{'Gender': ['Male']}, {'Gender': {'a': 1}}, {'Nativelang': []},
+                                 {'Age': {}}, {'Age': 'nine'}, {'GameStats': {'a': 1}},
+                                 {'GameStats': [1, 2]}, {'Gender': 'Other'}])
+def test_malformed_players_are_rejected(client, bad):
+    assert client.post('/predict', json=player(**bad)).status_code == 400
+    assert client.post('/predict_batch', json={'players': [player(), player(**bad)]}).status_code == 400
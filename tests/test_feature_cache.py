@@ -0,0 +1,93 @@
+import os
+import cv2
+import numpy as np
+import pandas as pd
+import dysgraphia_detector
+from dysgraphia_detector import DysgraphiaDetector
+from feature_cache import FeatureCache
+
+
+def write_image(path, content=b'image bytes'):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_entries_survive_a_reload(tmp_path):
+    cache_path = str(tmp_path / 'features.joblib')
+    image = write_image(tmp_path / 'a.png')
+    cache = FeatureCache(cache_path, version=1)
+    assert cache.get(image) is None
+    cache.put(image, {'slant_angle': 3.0})
+    cache.save()
+
+    reloaded = FeatureCache(cache_path, version=1)
+    assert reloaded.get(image) == {'slant_angle': 3.0}
+    assert reloaded.get(write_image(tmp_path / 'b.png')) is None
+    assert (reloaded.hits, reloaded.misses) == (1, 1)
+
+
+def test_changed_file_or_version_invalidates_the_entry(tmp_path):
+    cache_path = str(tmp_path / 'features.joblib')
+    image = write_image(tmp_path / 'a.png')
+    cache = FeatureCache(cache_path, version=1)
+    cache.put(image, 'value')
+    cache.save()
+
+    assert FeatureCache(cache_path, version=2).get(image) is None
+
+    write_image(tmp_path / 'a.png', b'a longer image')
+    assert FeatureCache(cache_path, version=1).get(image) is None
+
+
+def test_hash_contents_accepts_a_touched_file(tmp_path):
+    cache_path = str(tmp_path / 'features.joblib')
+    image = write_image(tmp_path / 'a.png')
+    cache = FeatureCache(cache_path, version=1, hash_contents=True)
+    cache.put(image, 'value')
+    cache.save()
+    stat = os.stat(image)
+    os.utime(image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert FeatureCache(cache_path, version=1).get(image) is None
+    cache = FeatureCache(cache_path, version=1, hash_contents=True)
+    assert cache.get(image) == 'value'
+    # The refreshed mtime is saved, so the next run needs no hash
+    cache.save()
+    assert FeatureCache(cache_path, version=1).get(image) == 'value'
+
+
+def test_load_dataset_only_extracts_new_or_changed_images(tmp_path, monkeypatch):
+    paths = []
+    for name in ('LPD/a.png', 'PD/b.png', 'PD/c.png'):
+        path = tmp_path / name
+        path.parent.mkdir(exist_ok=True)
+        page = np.full((100, 200), 255, dtype=np.uint8)
+        cv2.putText(page, name[-5], (60, 70), cv2.FONT_HERSHEY_SIMPLEX, 2, 0, 3)
+        cv2.imwrite(str(path), page)
+        paths.append(str(path))
+    csv_path = str(tmp_path / 'dataset.csv')
+    pd.DataFrame({'Image Path': paths}).to_csv(csv_path, index=False)
+    cache_path = str(tmp_path / 'features.joblib')
+
+    extracted = []
+    extract = dysgraphia_detector._extract_features_from_path
+
+    def counting_extract(image_path, *args, **kwargs):
+        extracted.append(os.path.basename(image_path))
+        return extract(image_path, *args, **kwargs)
+
+    monkeypatch.setattr(dysgraphia_detector, '_extract_features_from_path', counting_extract)
+    X, y = DysgraphiaDetector().load_dataset(csv_path, cache_path=cache_path)
+    assert extracted == ['a.png', 'b.png', 'c.png']
+
+    extracted.clear()
+    cached_X, cached_y = DysgraphiaDetector().load_dataset(csv_path, cache_path=cache_path)
+    assert extracted == []
+    np.testing.assert_array_equal(cached_X, X)
+    np.testing.assert_array_equal(cached_y, y)
+
+    page = np.full((100, 200), 255, dtype=np.uint8)
+    cv2.putText(page, 'bb', (40, 70), cv2.FONT_HERSHEY_SIMPLEX, 2, 0, 3)
+    cv2.imwrite(paths[1], page)
+    DysgraphiaDetector().load_dataset(csv_path, cache_path=cache_path)
+    assert extracted == ['b.png']
@@ -0,0 +1,90 @@
+import json
+import os
+import numpy as np
+import pytest
+from feature_store import SCHEMA_FILE, FeatureStore
+
+NAMES = ['a', 'b', 'c']
+
+
+def filled_store(rows, capacity=1):
+    rng = np.random.default_rng(0)
+    store = FeatureStore(NAMES, capacity=capacity)
+    for i in range(rows):
+        values = rng.normal(size=3)
+        features = dict(zip(NAMES, values)) if i % 2 else values
+        store.append(features, i % 2, f'img/{i}.png' if i % 3 else None, scale=1.0 / (i + 1))
+    return store
+
+
+def assert_same(store, other):
+    assert store.feature_names == other.feature_names
+    assert len(store) == len(other)
+    np.testing.assert_array_equal(store.X, other.X)
+    np.testing.assert_array_equal(store.y, other.y)
+    np.testing.assert_array_equal(store.scales, other.scales)
+    assert store.paths == other.paths
+
+
+def test_appends_grow_the_arrays_without_losing_rows():
+    store = filled_store(100)
+    expected = filled_store(100, capacity=100)
+    assert_same(store, expected)
+    assert store.X.dtype == np.float32 and store.y.dtype == np.int8
+    assert store.paths[:4] == [None, 'img/1.png', 'img/2.png', None]
+    np.testing.assert_array_equal(store.column('b'), store.X[:, 1])
+    assert next(store.rows()) == dict(zip(NAMES, store.X[0].tolist()))
+
+    store.extend(filled_store(30))
+    assert len(store) == 130
+    np.testing.assert_array_equal(store.X[100:], filled_store(30).X)
+    with pytest.raises(ValueError):
+        store.extend(FeatureStore(['a', 'b']))
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_and_load_round_trip(tmp_path, mmap):
+    store = filled_store(40)
+    store.save(str(tmp_path / 'store'))
+    loaded = FeatureStore.load(str(tmp_path / 'store'), mmap=mmap)
+    assert_same(loaded, store)
+    assert isinstance(loaded.X, np.memmap) is mmap
+
+
+def test_appending_to_a_mapped_store_leaves_the_files_untouched(tmp_path):
+    directory = str(tmp_path / 'store')
+    store = filled_store(10)
+    store.save(directory)
+
+    loaded = FeatureStore.load(directory)
+    loaded.append([1.0, 2.0, 3.0], 1, 'img/new.png')
+    assert len(loaded) == 11
+    np.testing.assert_array_equal(loaded.X[:10], store.X)
+    assert loaded.paths[-1] == 'img/new.png'
+
+    assert_same(FeatureStore.load(directory), store)
+
+
+def test_empty_store_round_trips(tmp_path):
+    FeatureStore(NAMES).save(str(tmp_path / 'store'))
+    loaded = FeatureStore.load(str(tmp_path / 'store'))
+    assert len(loaded) == 0 and loaded.X.shape == (0, 3)
+    loaded.append([1.0, 2.0, 3.0], 0)
+    assert len(loaded) == 1
+
+
+def test_incomplete_or_foreign_saves_are_not_loaded(tmp_path):
+    directory = str(tmp_path / 'store')
+    filled_store(5).save(directory)
+    schema_path = os.path.join(directory, SCHEMA_FILE)
+    with open(schema_path) as file:
+        schema = json.load(file)
+
+    with open(schema_path, 'w') as file:
+        json.dump(dict(schema, version=99), file)
+    with pytest.raises(ValueError):
+        FeatureStore.load(directory)
+
+    os.remove(schema_path)
+    with pytest.raises(FileNotFoundError):
+        FeatureStore.load(directory)
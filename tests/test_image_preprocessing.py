@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+import pytest
+import image_preprocessing
+from dysgraphia_detector import DysgraphiaDetector
+from image_preprocessing import DEFAULT_DPI, crop_to_ink, load_grayscale, target_long_side
+
+
+@pytest.mark.parametrize('reduction, flag', [
+    (1.0, cv2.IMREAD_GRAYSCALE),
+    (1.9, cv2.IMREAD_GRAYSCALE),
+    (2.0, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    (4.5, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (9.0, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+])
+def test_reduced_decoding_needs_a_reduction_of_at_least_two(tmp_path, monkeypatch, reduction, flag):
+    path = str(tmp_path / 'page.png')
+    width = int(round(target_long_side(DEFAULT_DPI) * reduction))
+    cv2.imwrite(path, np.full((20, width), 255, dtype=np.uint8))
+
+    flags = []
+    imread = cv2.imread
+    monkeypatch.setattr(image_preprocessing.cv2, 'imread',
+                        lambda path, flag: flags.append(flag) or imread(path, flag))
+    gray, scale = load_grayscale(path)
+    assert flags == [flag]
+    assert max(gray.shape) == min(width, target_long_side(DEFAULT_DPI))
+    assert scale == pytest.approx(max(gray.shape) / width)
+
+
+def test_cropped_page_is_thresholded_once(tmp_path, monkeypatch):
+    page = np.full((600, 900), 255, dtype=np.uint8)
+    cv2.putText(page, 'handwriting', (300, 300), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 40, 3)
+    path = str(tmp_path / 'page.png')
+    cv2.imwrite(path, page)
+
+    otsu_calls = []
+    threshold = cv2.threshold
+
+    def counting_threshold(image, thresh, maxval, kind):
+        if kind & cv2.THRESH_OTSU:
+            otsu_calls.append(image.shape)
+        return threshold(image, thresh, maxval, kind)
+
+    monkeypatch.setattr(cv2, 'threshold', counting_threshold)
+    detector = DysgraphiaDetector()
+    features = detector.image_features(path)
+    assert otsu_calls == [page.shape]
+
+    # The crop is measured with the page's threshold
+    crop, page_threshold = crop_to_ink(page)
+    assert page_threshold == threshold(page, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[0]
+    assert features == detector.extract_features(crop, 1.0, page_threshold)
@@ -0,0 +1,138 @@
+import pytest
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+from incremental_sync import SOURCE_FIELD, _write_batch, sync_csv
+
+HEADER = ['email', 'Age', 'Gender']
+
+
+def write_csv(path, rows):
+    path.write_text('\n'.join(';'.join(map(str, row)) for row in [HEADER] + rows) + '\n')
+    return str(path)
+
+
+def sync(collection, csv_path, tmp_path, **kwargs):
+    return sync_csv(collection, csv_path, delimiter=';', batch_size=2,
+                    checkpoint_path=str(tmp_path / 'sync.json'), track_fields=['Age', 'Gender'],
+                    **kwargs)
+
+
+class InterruptedCollection:
+    """Collection whose n-th document write (replace_one on mongomock) is interrupted"""
+
+    def __init__(self, collection, fail_on):
+        self.collection = collection
+        self.fail_on = fail_on
+        self.calls = 0
+
+    def replace_one(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise KeyboardInterrupt
+        return self.collection.replace_one(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_only_changed_rows_are_written(mock_db, tmp_path):
+    collection = mock_db['assessments']
+    rows = [[f'user{i}@example.com', 8 + i % 3, 'Male'] for i in range(5)]
+    csv_path = write_csv(tmp_path / 'data.csv', rows)
+
+    first = sync(collection, csv_path, tmp_path)
+    assert (first['upserted'], first['deleted']) == (5, 0)
+    assert first['changed'] == {(8, 'Male'), (9, 'Male'), (10, 'Male')}
+
+    again = sync(collection, csv_path, tmp_path)
+    assert (again['upserted'], again['unchanged'], again['deleted']) == (0, 5, 0)
+    assert again['changed'] == set()
+
+    # One row edited, one removed
+    rows[1] = ['user1@example.com', 12, 'Female']
+    del rows[4]
+    write_csv(tmp_path / 'data.csv', rows)
+    update = sync(collection, csv_path, tmp_path)
+    assert (update['upserted'], update['deleted']) == (1, 2)
+    assert update['changed'] == {(12, 'Female'), (9, 'Male')}
+    assert collection.count_documents({}) == 4
+
+
+def test_key_fields_replace_rows_in_place(mock_db, tmp_path):
+    collection = mock_db['users']
+    collection.insert_one({'email': 'signup@example.com', 'Age': 30, 'Gender': 'Female'})
+    rows = [['a@example.com', 9, 'Male'], ['b@example.com', 10, 'Male']]
+    csv_path = write_csv(tmp_path / 'users.csv', rows)
+    sync(collection, csv_path, tmp_path, key_fields=['email'])
+
+    rows[0] = ['a@example.com', 11, 'Male']
+    write_csv(tmp_path / 'users.csv', rows)
+    stats = sync(collection, csv_path, tmp_path, key_fields=['email'])
+
+    assert (stats['upserted'], stats['deleted']) == (1, 0)
+    # Both the old and the new cohort of the edited row need a refresh
+    assert stats['changed'] == {(9, 'Male'), (11, 'Male')}
+    assert collection.find_one({'email': 'a@example.com'})['Age'] == 11
+    # Documents that did not come from the file are left alone
+    assert collection.count_documents({SOURCE_FIELD: {'$exists': False}}) == 1
+
+
+def test_interrupted_sync_resumes_with_pending_cohorts(mock_db, tmp_path):
+    collection = mock_db['assessments']
+    rows = [[f'user{i}@example.com', 8 + i, 'Male'] for i in range(6)]
+    csv_path = write_csv(tmp_path / 'data.csv', rows)
+
+    interrupted = InterruptedCollection(collection, fail_on=4)
+    with pytest.raises(KeyboardInterrupt):
+        sync(interrupted, csv_path, tmp_path)
+    # The first batch was committed, the second one half written
+    assert collection.count_documents({}) == 3
+    assert (tmp_path / 'sync.json').exists()
+
+    stats = sync(collection, csv_path, tmp_path)
+    assert collection.count_documents({}) == 6
+    # The row written before the interruption is already up to date
+    assert stats['upserted'] == 3
+    # Cohorts of the rows written before the interruption are still reported
+    assert stats['changed'] == {(8 + i, 'Male') for i in range(6)}
+    assert not (tmp_path / 'sync.json').exists()
+
+
+def test_checkpoint_of_another_file_version_is_ignored(mock_db, tmp_path):
+    collection = mock_db['assessments']
+    csv_path = write_csv(tmp_path / 'data.csv', [['a@example.com', 9, 'Male']] * 3)
+    with pytest.raises(KeyboardInterrupt):
+        sync(InterruptedCollection(collection, fail_on=3), csv_path, tmp_path)
+
+    # The file changes before the next run, so it starts over
+    write_csv(tmp_path / 'data.csv', [['b@example.com', 10, 'Male']] * 4)
+    stats = sync(collection, csv_path, tmp_path)
+    assert (stats['rows'], stats['upserted'], stats['deleted']) == (4, 4, 2)
+    assert collection.count_documents({}) == 4
+
+
+class BulkCollection:
+    """Stand-in for a real pymongo collection, records bulk_write requests"""
+
+    def __init__(self, error=None):
+        self.database = type('Database', (), {'client': object()})()
+        self.requests = []
+        self.error = error
+
+    def bulk_write(self, requests, ordered=True):
+        self.requests.extend(requests)
+        if self.error is not None:
+            raise self.error
+        return type('Result', (), {'matched_count': 1, 'upserted_count': len(requests) - 1})()
+
+
+def test_server_path_upserts_with_replace_one():
+    collection = BulkCollection()
+    documents = [{'_id': 'a', 'Age': 9}, {'_id': 'b', 'Age': 10}]
+    assert _write_batch(collection, documents) == (2, [])
+    assert [request._filter for request in collection.requests] == [{'_id': 'a'}, {'_id': 'b'}]
+    assert all(isinstance(request, ReplaceOne) and request._upsert for request in collection.requests)
+
+    error = BulkWriteError({'nMatched': 1, 'nUpserted': 0,
+                            'writeErrors': [{'index': 1, 'errmsg': 'too large'}]})
+    assert _write_batch(BulkCollection(error), documents) == (1, ['too large'])
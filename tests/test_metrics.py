@@ -0,0 +1,41 @@
+import pytest
+from flask import Flask
+import metrics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.delenv('METRICS_PROFILER', raising=False)
+    app = Flask(__name__)
+    metrics.instrument_flask(app, 'test')
+    yield app.test_client()
+    metrics.set_profiler_enabled(None)
+
+
+def test_profiler_toggles_at_runtime(client, monkeypatch):
+    assert client.get('/debug/profile?seconds=0').status_code == 404
+
+    monkeypatch.setenv('METRICS_PROFILER', '1')
+    assert client.get('/debug/profile?seconds=0').status_code == 200
+
+    metrics.set_profiler_enabled(False)
+    assert client.get('/debug/profile?seconds=0').status_code == 404
+
+
+@pytest.mark.parametrize('query', ['seconds=0&interval=abc', 'seconds=abc',
+                                   'seconds=0&interval=nan', 'seconds=inf'])
+def test_profile_rejects_invalid_parameters(client, query):
+    metrics.set_profiler_enabled(True)
+    assert client.get(f'/debug/profile?{query}').status_code == 400
+
+
+def test_profile_params_are_clamped():
+    assert metrics.profile_params(600, 0) == (metrics.MAX_PROFILE_SECONDS, metrics.MIN_PROFILE_INTERVAL)
+    assert metrics.profile_params(-1, 30) == (0.0, metrics.MAX_PROFILE_INTERVAL)
+
+
+def test_callback_gauge_has_no_label_children():
+    gauge = metrics.Gauge('test_queue_depth', 'Queued items', lambda: {('a',): 2}, ['queue'])
+    with pytest.raises(TypeError):
+        gauge.labels('a')
+    assert 'test_queue_depth{queue="a"} 2' in gauge.render()
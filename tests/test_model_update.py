@@ -0,0 +1,22 @@
+import numpy as np
+from dysgraphia_detector import DysgraphiaDetector, FEATURE_NAMES
+
+
+def test_update_keeps_old_tree_decisions():
+    rng = np.random.default_rng(0)
+    X = rng.normal(5.0, 3.0, size=(300, len(FEATURE_NAMES)))
+    y = (X[:, 0] > 5).astype(int)
+    detector = DysgraphiaDetector()
+    detector.model.set_params(n_estimators=20)
+    detector.train(X, y)
+
+    old_trees = list(detector.model.estimators_)
+    before = [tree.predict(detector.scaler.transform(X)) for tree in old_trees]
+
+    # New samples shifted enough to move the scaler statistics
+    X_new = rng.normal(9.0, 5.0, size=(100, len(FEATURE_NAMES)))
+    detector.update(X_new, (X_new[:, 0] > 5).astype(int), n_new_trees=5)
+
+    assert not np.allclose(detector.scaler.mean_, X.mean(axis=0))
+    for tree, expected in zip(old_trees, before):
+        np.testing.assert_array_equal(tree.predict(detector.scaler.transform(X)), expected)
@@ -0,0 +1,93 @@
+import threading
+import time
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+from pymongo.results import InsertManyResult
+import result_recorder
+from result_recorder import ResultRecorder
+
+
+class FakeCollection:
+    """Records every insert_many and fails the calls queued in failures"""
+
+    def __init__(self, failures=()):
+        self.batches = []
+        self.failures = list(failures)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def insert_many(self, documents, ordered=True):
+        self.started.set()
+        self.release.wait()
+        self.batches.append([document['n'] for document in documents])
+        if self.failures:
+            raise self.failures.pop(0)
+        return InsertManyResult(list(range(len(documents))), True)
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(result_recorder, 'get_collection', lambda name: collection)
+    return collection
+
+
+def test_results_are_written_in_batches(collection):
+    recorder = ResultRecorder(batch_size=3, flush_interval=10.0)
+    for n in range(7):
+        assert recorder.record({'n': n})
+    recorder.close()
+    assert collection.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert recorder.stats()['written'] == 7
+
+
+def test_close_drains_the_queue(collection):
+    recorder = ResultRecorder(batch_size=100, flush_interval=60.0)
+    for n in range(5):
+        recorder.record({'n': n})
+    recorder.close()
+    assert collection.batches == [[0, 1, 2, 3, 4]]
+    assert recorder.stats()['written'] == 5 and recorder.stats()['queued'] == 0
+    assert recorder.record({'n': 5}) is False
+
+
+def test_full_queue_drops_the_result(collection):
+    collection.release.clear()
+    recorder = ResultRecorder(batch_size=1, max_queue=1, put_timeout=0.01)
+    assert recorder.record({'n': 0})
+    # The worker holds the first result in a stalled insert
+    assert collection.started.wait(5)
+    assert recorder.record({'n': 1})
+    assert recorder.record({'n': 2}) is False
+    assert recorder.stats()['dropped'] == 1
+
+    collection.release.set()
+    recorder.close()
+    assert collection.batches == [[0], [1]]
+
+
+def _bulk_error(inserted, write_errors):
+    return BulkWriteError({'nInserted': inserted, 'writeErrors': write_errors})
+
+
+def test_only_failed_documents_are_retried(collection):
+    collection.failures = [
+        _bulk_error(3, [{'index': 1, 'code': 91, 'errmsg': 'shutting down'},
+                        {'index': 3, 'code': 11000, 'errmsg': 'duplicate key'}]),
+        AutoReconnect('connection reset')
+    ]
+    recorder = ResultRecorder(batch_size=5, flush_interval=10.0, retry_delay=0.01)
+    for n in range(5):
+        recorder.record({'n': n})
+    # close() stops retrying, so let the worker get through them first
+    deadline = time.monotonic() + 5
+    while len(collection.batches) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    recorder.close()
+
+    # The duplicate key is never retried, the connection error retries the rest
+    assert collection.batches == [[0, 1, 2, 3, 4], [1], [1]]
+    stats = recorder.stats()
+    assert stats['written'] == 4 and stats['failed'] == 1
+    assert len(stats['errors']) == 2
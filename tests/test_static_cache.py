@@ -0,0 +1,17 @@
+import pytest
+from static_cache import StaticCache
+
+
+@pytest.mark.parametrize('path, allowed', [
+    ('login.html', True),
+    ('image/logo.png', True),
+    ('Dysgraphia/index.html', True),
+    ('Dyt-desktop.csv', False),
+    ('users.csv', False),
+    ('Dysgraphia_Analysis.ipynb', False),
+    ('Dysgraphia/analysis.ipynb', False),
+    ('.env', False),
+    ('user_auth.py', False)
+])
+def test_default_allowlist_serves_pages_not_data(tmp_path, path, allowed):
+    assert StaticCache(str(tmp_path)).is_allowed(path) is allowed
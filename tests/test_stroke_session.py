@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from dysgraphia_detector import DysgraphiaDetector, FEATURE_NAMES
+from stroke_session import StrokeSession
+
+
+def assert_matches_full_extraction(session):
+    expected = DysgraphiaDetector().extract_features(session.render())
+    features = session.features()
+    for name in FEATURE_NAMES:
+        assert features[name] == pytest.approx(float(expected[name]), rel=1e-9, abs=1e-9), name
+
+
+def random_strokes(rng, count, width=800, height=400):
+    strokes = []
+    for _ in range(count):
+        start = rng.uniform([10, 10], [width - 60, height - 40])
+        steps = rng.normal(0, 6, size=(rng.integers(1, 12), 2))
+        points = np.clip(start + np.cumsum(steps, axis=0), 0, [width - 1, height - 1])
+        strokes.append([{'x': float(x), 'y': float(y)} for x, y in points])
+    return strokes
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_features_match_full_extraction(seed):
+    rng = np.random.default_rng(seed)
+    session = StrokeSession()
+    for _ in range(8):
+        session.add_strokes(random_strokes(rng, int(rng.integers(1, 10))))
+        assert_matches_full_extraction(session)
+
+
+def test_boxes_sharing_an_edge_match_full_extraction():
+    session = StrokeSession()
+    # Boxes with the same top (and the same left) edge but different
+    # extents, a later box starts inside the taller one only
+    for stroke in ([(300, 50), (300, 120)], [(100, 50), (100, 70)], [(500, 100), (500, 110)],
+                   [(400, 200), (460, 200)], [(400, 260), (420, 260)], [(440, 300), (440, 340)]):
+        session.add_strokes([stroke])
+        assert_matches_full_extraction(session)
+
+
+def test_stroke_joining_letters_recontours_them():
+    session = StrokeSession()
+    session.add_strokes([[(100, 100), (100, 140)], [(150, 100), (150, 140)], [(600, 100), (600, 140)]])
+    assert session.stats()['contours'] == 3
+
+    # A bar across the first two letters merges them, the far one is untouched
+    session.add_strokes([[(90, 120), (160, 120)]])
+    assert session.stats()['contours'] == 2
+    assert session.last_dirty_pixels < session.width * session.height / 4
+    assert_matches_full_extraction(session)
@@ -0,0 +1,129 @@
+import argparse
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold, cross_validate
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+from compiled_forest import CompiledForest
+from dyslexia_features import METRICS, N_ROUNDS, round_columns, build_feature_matrix
+
+ARTIFACT_VERSION = 1
+
+# Explicit dtypes so the whole file is parsed in a single typed pass
+CATEGORICAL_COLUMNS = ['Gender', 'Nativelang', 'Otherlang', 'Dyslexia']
+INTEGER_METRICS = ['Clicks', 'Hits', 'Misses', 'Score']
+
+def csv_dtypes():
+    """Column dtypes of Dyt-desktop.csv"""
+    dtypes = {column: 'category' for column in CATEGORICAL_COLUMNS}
+    dtypes['Age'] = np.int16
+    for round_number in range(1, N_ROUNDS + 1):
+        for metric in METRICS:
+            dtypes[f'{metric}{round_number}'] = np.int32 if metric in INTEGER_METRICS else np.float64
+    return dtypes
+
+def load_dyt_csv(csv_path):
+    """Read Dyt-desktop.csv into typed columns"""
+    return pd.read_csv(csv_path, sep=';', dtype=csv_dtypes(), engine='c')
+
+def round_array(df):
+    """
+    Per-round metrics as a (players x rounds x metrics) array
+    The CSV stores them round-major, so a single reshape is enough.
+    """
+    values = df[round_columns(METRICS)].to_numpy(dtype=np.float64)
+    return values.reshape(len(df), N_ROUNDS, len(METRICS))
+
+def category_encodings(df, columns):
+    """Integer codes for categorical columns, sorted like LabelEncoder"""
+    return {column: {value: code for code, value in enumerate(sorted(df[column].unique()))}
+            for column in columns}
+
+def build_dataset(df, metrics, encodings):
+    """
+    Build the model input matrix and labels
+    Args:
+        df: Frame returned by load_dyt_csv
+        metrics: Metrics sent as GameStats, one value per round each
+        encodings: Category lookup dicts
+    Returns:
+        X: Feature matrix
+        y: Labels (1 for dyslexia)
+    """
+    rounds = round_array(df)
+    metric_index = [METRICS.index(metric) for metric in metrics]
+    game_stats = rounds[:, :, metric_index].reshape(len(df), -1)
+
+    X = build_feature_matrix(
+        df['Age'].to_numpy(),
+        df['Gender'].map(encodings['Gender']).to_numpy(dtype=np.float64),
+        df['Nativelang'].map(encodings['Nativelang']).to_numpy(dtype=np.float64),
+        game_stats,
+        len(metrics)
+    )
+    y = (df['Dyslexia'] == 'Yes').to_numpy(dtype=np.int64)
+    return X, y
+
+def train(csv_path, artifact_path, metrics=('Accuracy',), folds=5, n_jobs=-1):
+    """
+    Train the dyslexia model and write the artifact the Flask service loads
+    Args:
+        csv_path: Path to Dyt-desktop.csv
+        artifact_path: Output joblib artifact
+        metrics: Metrics the service receives as GameStats
+        folds: Number of cross-validation folds
+        n_jobs: Parallel jobs for cross-validation and the forest
+    Returns:
+        scores: Mean cross-validation scores
+    """
+    start = time.time()
+    metrics = list(metrics)
+    df = load_dyt_csv(csv_path)
+    encodings = category_encodings(df, ['Gender', 'Nativelang'])
+    X, y = build_dataset(df, metrics, encodings)
+    print(f"Loaded {X.shape[0]} players with {X.shape[1]} features in {time.time() - start:.2f}s")
+
+    # Folds run in parallel, so the forests inside them stay single-threaded
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    pipeline = make_pipeline(StandardScaler(),
+                             RandomForestClassifier(n_estimators=100, random_state=42))
+    results = cross_validate(pipeline, X, y, cv=cv, n_jobs=n_jobs,
+                             scoring=['accuracy', 'roc_auc', 'f1'])
+    scores = {name[len('test_'):]: float(np.mean(values))
+              for name, values in results.items() if name.startswith('test_')}
+    print("Cross-validation: " + ", ".join(f"{name}={value:.3f}" for name, value in scores.items()))
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    model.fit(X_scaled, y)
+
+    forest = CompiledForest.from_sklearn(model, scaler)
+    forest.validate(model, scaler, X)
+
+    joblib.dump({
+        'version': ARTIFACT_VERSION,
+        'forest': forest,
+        'encodings': encodings,
+        'game_stat_metrics': metrics,
+        'cv_scores': scores
+    }, artifact_path)
+    print(f"Saved {artifact_path} in {time.time() - start:.2f}s total")
+    return scores
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the dyslexia model from Dyt-desktop.csv')
+    parser.add_argument('--csv', default='Dyt-desktop.csv')
+    parser.add_argument('--out', default='dyslexia_model.joblib')
+    parser.add_argument('--metrics', nargs='+', default=['Accuracy'], choices=METRICS,
+                        help='Per-round metrics sent by the client as GameStats')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=-1)
+    args = parser.parse_args()
+
+    train(args.csv, args.out, args.metrics, args.folds, args.jobs)
@@ -1,48 +1,146 @@
 import sys
+import os
+import time
+import signal
+import threading
+import atexit
+import queue
+import selectors
+import socket
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 import json
 import traceback
-from pymongo import MongoClient
+from db import get_collection, ensure_indexes
+from ttl_cache import TTLCache
+from auth_sessions import issue_token, verify_token, hash_password, verify_password, is_hashed
+from urllib.parse import urlsplit, parse_qs
+from metrics import (CONTENT_TYPE, HTTP_SECONDS, Gauge, install_profiler_toggle, profile,
+                     profile_params, profiler_enabled, render)
+from static_cache import StaticCache
 
 # Configure error logging
+# Request threads only put records on a queue, a single listener thread
+# formats and writes them so slow stdout never blocks a request
 import logging
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    handlers=[logging.StreamHandler(sys.stdout)])
-
-# MongoDB setup
-try:
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client['user_auth_db']
-    users_collection = db['users']
-    # Create a unique index on email
-    users_collection.create_index('email', unique=True)
-    logging.info('Connected to MongoDB successfully')
-except Exception as e:
-    logging.error(f'Error connecting to MongoDB: {str(e)}')
-    raise
+import logging.handlers
+_log_queue = queue.Queue(-1)
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.DEBUG, handlers=[_queue_handler])
+
+def users_collection():
+    """The users collection on the shared, lazily created client"""
+    return get_collection('users')
+
+# email -> {'name', 'password_changed_at'} for session validation, so repeat
+# page loads do not need a database round-trip
+session_cache = TTLCache(max_size=int(os.environ.get('SESSION_CACHE_SIZE', 10000)),
+                         ttl=float(os.environ.get('SESSION_CACHE_TTL', 300)))
+Gauge('auth_session_cache', 'Session cache size and counters',
+      lambda: {(stat,): value for stat, value in session_cache.stats().items()}, ['stat'])
+
+# Allowlisted HTML/CSS/images/datasets served from the working directory,
+# created by serve() or on the first static request
+_static_files = None
+_static_lock = threading.Lock()
+
+def static_files():
+    global _static_files
+    if _static_files is None:
+        with _static_lock:
+            if _static_files is None:
+                _static_files = StaticCache(
+                    os.getcwd(),
+                    max_large_transfers=int(os.environ.get('STATIC_MAX_LARGE_TRANSFERS', 4)))
+    return _static_files
+
+# Paths reported individually in the request metrics, any other path is
+# labelled "static" to keep the number of series bounded
+METRIC_ROUTES = {'/signup', '/login', '/session', '/change_password', '/session_stats',
+                 '/metrics', '/debug/profile'}
+
+def _redact(data):
+    """Copy of a request payload that is safe to log"""
+    if not isinstance(data, dict):
+        return data
+    return {key: '***' if 'password' in key or key == 'token' else value
+            for key, value in data.items()}
 
 class AuthHandler(SimpleHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive between requests, every response
+    # must therefore carry a Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Seconds a worker waits for the rest of a request that has started to
+    # arrive, idle keep-alive connections wait in the server's selector
+    timeout = 5
+    # Headers and body are separate writes, with Nagle's algorithm the body
+    # of every keep-alive response would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        """Answer one request, the server parks the connection until the next one"""
+        self.close_connection = True
+        self.handle_one_request()
+
+    def finish(self):
+        # A kept-alive connection keeps its streams for the next request
+        if self.close_connection:
+            super().finish()
+
+    def log_message(self, format, *args):
+        # Access log lines go through the logging queue too
+        logging.info(f'{self.address_string()} - {format % args}')
+
+    def handle_one_request(self):
+        # The timer starts once a request line has arrived (parse_request),
+        # so idle keep-alive time is not counted
+        self._request_start = None
+        self._status = None
+        super().handle_one_request()
+        if self._request_start is not None:
+            route = urlsplit(self.path).path
+            if route not in METRIC_ROUTES:
+                route = 'static'
+            HTTP_SECONDS.labels('auth', self.command, route, self._status).observe(
+                time.perf_counter() - self._request_start)
+
+    def parse_request(self):
+        self._request_start = time.perf_counter()
+        return super().parse_request()
+
+    def log_request(self, code='-', size='-'):
+        self._status = int(code) if isinstance(code, int) else code
+        super().log_request(code, size)
+
     def do_POST(self):
         try:
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
-            logging.info(f'Received {self.path} request with data: {data}')
+            logging.info(f'Received {self.path} request with data: {_redact(data)}')
             
             response_data = {}
             if self.path == '/signup':
                 # handle_signup returns True/False directly
                 signup_success = self.handle_signup(data)
                 response_data = {'success': signup_success}
+                if signup_success:
+                    # New users are logged in right away
+                    response_data['token'] = issue_token(data['email'])
             elif self.path == '/login':
-                # handle_login returns a dictionary {'success': True/False, 'name': 'userName' (optional)}
+                # handle_login returns a dictionary {'success': True/False, 'name': 'userName' (optional), 'token': ...}
                 response_data = self.handle_login(data)
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
+            elif self.path == '/session':
+                response_data = self.handle_session(data)
+            elif self.path == '/change_password':
+                response_data = self.handle_change_password(data)
             
             # Ensure response_data is a dictionary before dumping to JSON
             if not isinstance(response_data, dict):
@@ -55,19 +153,73 @@ class AuthHandler(SimpleHTTPRequestHandler):
                 else: # Default error for unexpected type
                     response_data = {'success': False, 'error': 'Invalid server response_data structure'}
 
-            json_response = json.dumps(response_data)
-            self.wfile.write(json_response.encode())
-            logging.info(f'Sent response: {json_response}')
+            self.send_json(response_data)
+            logging.info(f'Sent response: {_redact(response_data)}')
             
         except Exception as e:
             logging.error(f'Error in do_POST: {str(e)}\n{traceback.format_exc()}')
             self.send_error(500, str(e))
 
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/session_stats':
+            self.send_json(session_cache.stats())
+            return
+        if url.path == '/metrics':
+            self.send_text(render(), CONTENT_TYPE)
+            return
+        if url.path == '/debug/profile':
+            self.handle_profile(parse_qs(url.query))
+            return
+        if not static_files().serve(self):
+            self.send_error(404)
+
+    def do_HEAD(self):
+        if not static_files().serve(self, head=True):
+            self.send_error(404)
+
+    def handle_profile(self, query):
+        """Run the sampling profiler for ?seconds=&interval= and return folded stacks"""
+        if not profiler_enabled():
+            self.send_error(404, 'Profiler disabled, set METRICS_PROFILER=1')
+            return
+        try:
+            seconds, interval = profile_params(query.get('seconds', ['5'])[0],
+                                               query.get('interval', ['0.005'])[0])
+        except ValueError:
+            self.send_error(400, 'Invalid seconds or interval')
+            return
+        folded = profile(seconds, interval)
+        if folded is None:
+            self.send_error(409, 'A profile is already running')
+            return
+        self.send_text(folded, 'text/plain; charset=utf-8')
+
+    def send_text(self, text, content_type):
+        """Send a 200 plain-text response"""
+        body = text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data):
+        """Send a 200 JSON response with CORS and keep-alive headers"""
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_OPTIONS(self):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def handle_signup(self, data):
@@ -79,11 +231,12 @@ class AuthHandler(SimpleHTTPRequestHandler):
 
             # Try to insert new user
             try:
-                users_collection.insert_one({
+                users_collection().insert_one({
                     'name': data['name'],
                     'email': data['email'],
-                    'password': data['password']  # In production, you should hash this
+                    'password': hash_password(data['password'])
                 })
+                session_cache.invalidate(data['email'])
                 logging.info(f'Added new user: {data["email"]}')
                 return True
             except Exception as e:
@@ -96,16 +249,33 @@ class AuthHandler(SimpleHTTPRequestHandler):
             logging.error(f'Error in handle_signup: {str(e)}\n{traceback.format_exc()}')
             raise
 
+    def _authenticate(self, email, password):
+        """
+        Look up a user by email and check the password
+        Returns:
+            user: The user document, or None if the credentials are wrong
+        """
+        user = users_collection().find_one({'email': email})
+        if not user or not verify_password(password, user.get('password')):
+            return None
+
+        # Upgrade plain-text passwords migrated from users.csv
+        if not is_hashed(user.get('password')):
+            users_collection().update_one({'_id': user['_id']},
+                                        {'$set': {'password': hash_password(password)}})
+        return user
+
     def handle_login(self, data):
         try:
-            user = users_collection.find_one({
-                'email': data['email'],
-                'password': data['password']  # In production, you should compare hashed passwords
-            })
+            user = self._authenticate(data['email'], data['password'])
             
             if user:
                 logging.info(f'Successful login for: {data["email"]}')
-                return {'success': True, 'name': user.get('name')}
+                session_cache.set(data['email'], {
+                    'name': user.get('name'),
+                    'password_changed_at': user.get('password_changed_at', 0)
+                })
+                return {'success': True, 'name': user.get('name'), 'token': issue_token(data['email'])}
             
             logging.info(f'Failed login attempt for: {data["email"]}')
             return {'success': False}
@@ -117,16 +287,258 @@ class AuthHandler(SimpleHTTPRequestHandler):
             # Not raising here to allow the server to send a 500 error if needed, 
             # but the calling function (do_POST) will handle the error response.
 
+    def handle_session(self, data):
+        """Validate a session token, answered from the cache when possible"""
+        claims = verify_token(data.get('token'))
+        if not claims:
+            return {'success': False}
+
+        email = claims['email']
+        session = session_cache.get(email)
+        if session is None:
+            try:
+                user = users_collection().find_one({'email': email},
+                                                 {'name': 1, 'password_changed_at': 1})
+            except Exception as e:
+                logging.error(f'Error in handle_session: {str(e)}\n{traceback.format_exc()}')
+                return {'success': False, 'error': 'Database error during session check'}
+            if not user:
+                return {'success': False}
+            session = {'name': user.get('name'),
+                       'password_changed_at': user.get('password_changed_at', 0)}
+            session_cache.set(email, session)
+
+        # Tokens issued before a password change are no longer valid
+        if claims['iat'] < session['password_changed_at']:
+            return {'success': False}
+
+        return {'success': True, 'name': session['name'], 'email': email}
+
+    def handle_change_password(self, data):
+        try:
+            if not all(key in data for key in ['email', 'password', 'new_password']):
+                return {'success': False}
+
+            user = self._authenticate(data['email'], data['password'])
+            if not user:
+                logging.info(f'Failed password change for: {data["email"]}')
+                return {'success': False}
+
+            users_collection().update_one({'_id': user['_id']}, {'$set': {
+                'password': hash_password(data['new_password']),
+                'password_changed_at': time.time()
+            }})
+            session_cache.invalidate(data['email'])
+            logging.info(f'Changed password for: {data["email"]}')
+            return {'success': True}
+
+        except Exception as e:
+            logging.error(f'Error in handle_change_password: {str(e)}\n{traceback.format_exc()}')
+            return {'success': False, 'error': 'Database error during password change'}
+
 class CORSHTTPServer(HTTPServer):
-    def __init__(self, *args, **kwargs):
+    """
+    HTTP server that handles requests on a bounded pool of worker threads
+    A worker only holds a connection while one request is read and answered.
+    Idle keep-alive connections are parked in a selector watched by a single
+    thread and handed back to the pool once their next request arrives, so
+    idle browsers never occupy workers. At most max_idle connections are
+    parked (the longest idle one is closed to make room) and each is closed
+    after keep_alive_timeout idle seconds. When every worker is busy the
+    accept loop waits for one to free up, so load beyond max_workers queues
+    in the listen backlog instead of spawning unbounded threads.
+    """
+    request_queue_size = 256
+
+    def __init__(self, *args, max_workers=64, max_idle=1024, keep_alive_timeout=15.0, **kwargs):
         super().__init__(*args, **kwargs)
-        logging.info('Server initialized')
+        self.max_idle = max_idle
+        self.keep_alive_timeout = keep_alive_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='auth-worker')
+        self._slots = threading.BoundedSemaphore(max_workers)
 
-if __name__ == '__main__':
+        # fd -> (request, client_address, handler, idle deadline), oldest first
+        self._idle = OrderedDict()
+        self._parking = queue.SimpleQueue()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_read, self._wakeup_write = socket.socketpair()
+        self._wakeup_write.setblocking(False)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+        self._closing = False
+        self._keep_alive_thread = threading.Thread(target=self._watch_idle, name='auth-keep-alive',
+                                                   daemon=True)
+        self._keep_alive_thread.start()
+        logging.info(f'Server initialized with {max_workers} workers')
+
+    def process_request(self, request, client_address):
+        self._dispatch(request, client_address, None)
+
+    def _dispatch(self, request, client_address, handler):
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address, handler)
+        except RuntimeError:
+            # Executor already shut down
+            self._slots.release()
+            self._close_connection(request, handler)
+
+    def _process_request_worker(self, request, client_address, handler):
+        keep_alive = False
+        try:
+            if handler is None:
+                # The handler answers the first request from its constructor
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                try:
+                    handler.handle()
+                finally:
+                    handler.finish()
+            keep_alive = not handler.close_connection
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self._slots.release()
+            if keep_alive and not self._closing:
+                self._park(request, client_address, handler)
+            else:
+                self._close_connection(request, handler)
+
+    def _park(self, request, client_address, handler):
+        """Hand an idle keep-alive connection to the selector thread"""
+        # A pipelined request may already sit in the read buffer, where the
+        # selector cannot see it
+        request.setblocking(False)
+        try:
+            pending = handler.rfile.peek(1)
+        except OSError:
+            pending = None
+        request.settimeout(handler.timeout)
+        if pending is None:
+            self._close_connection(request, handler)
+        elif pending:
+            self._dispatch(request, client_address, handler)
+        else:
+            self._parking.put((request, client_address, handler))
+            try:
+                self._wakeup_write.send(b'\0')
+            except (BlockingIOError, OSError):
+                # Already woken up, or shutting down
+                pass
+
+    def _close_connection(self, request, handler):
+        if handler is not None:
+            handler.close_connection = True
+            try:
+                handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def _watch_idle(self):
+        """Selector loop of the parked connections"""
+        while not self._closing:
+            timeout = None
+            if self._idle:
+                timeout = max(next(iter(self._idle.values()))[3] - time.monotonic(), 0)
+            for key, _ in self._selector.select(timeout):
+                if key.fileobj is self._wakeup_read:
+                    try:
+                        self._wakeup_read.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                # The next request (or the client closing) has arrived
+                request, client_address, handler, _ = self._idle.pop(key.fd)
+                self._selector.unregister(request)
+                self._dispatch(request, client_address, handler)
+
+            while True:
+                try:
+                    request, client_address, handler = self._parking.get_nowait()
+                except queue.Empty:
+                    break
+                if len(self._idle) >= self.max_idle:
+                    self._expire(next(iter(self._idle)))
+                self._idle[request.fileno()] = (request, client_address, handler,
+                                                time.monotonic() + self.keep_alive_timeout)
+                self._selector.register(request, selectors.EVENT_READ)
+
+            now = time.monotonic()
+            while self._idle and next(iter(self._idle.values()))[3] <= now:
+                self._expire(next(iter(self._idle)))
+
+        for fd in list(self._idle):
+            self._expire(fd)
+
+    def _expire(self, fd):
+        request, _, handler, _ = self._idle.pop(fd)
+        self._selector.unregister(request)
+        self._close_connection(request, handler)
+
+    def idle_connections(self):
+        return len(self._idle)
+
+    def server_close(self):
+        """Stop listening, let in-flight requests finish and close idle connections"""
+        super().server_close()
+        # Requests finishing from now on close their connection
+        self._closing = True
+        self._executor.shutdown(wait=True)
+        try:
+            self._wakeup_write.send(b'\0')
+        except OSError:
+            pass
+        self._keep_alive_thread.join()
+        while True:
+            try:
+                request, _, handler = self._parking.get_nowait()
+            except queue.Empty:
+                break
+            self._close_connection(request, handler)
+        self._selector.close()
+        self._wakeup_read.close()
+        self._wakeup_write.close()
+
+def serve(host='localhost', port=8000, max_workers=64, max_idle=1024, keep_alive_timeout=15.0):
+    """Run the auth server until SIGINT/SIGTERM, then shut down gracefully"""
+    try:
+        ensure_indexes()
+        logging.info('Connected to MongoDB successfully')
+    except Exception as e:
+        logging.error(f'Error connecting to MongoDB: {str(e)}')
+        raise
+
+    # Load and precompress the static files before taking requests
+    logging.info(f'Cached {static_files().preload()} static files')
+
+    server = CORSHTTPServer((host, port), AuthHandler, max_workers=max_workers, max_idle=max_idle,
+                            keep_alive_timeout=keep_alive_timeout)
+    Gauge('auth_idle_connections', 'Keep-alive connections parked between requests',
+          server.idle_connections)
+
+    def stop(signum, frame):
+        logging.info('Shutting down server...')
+        # shutdown() blocks until serve_forever returns, so call it elsewhere
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    install_profiler_toggle()
+
+    logging.info(f'Server starting on port {port}...')
     try:
-        server = CORSHTTPServer(('localhost', 8000), AuthHandler)
-        logging.info('Server starting on port 8000...')
         server.serve_forever()
+    finally:
+        server.server_close()
+        logging.info('Server stopped')
+
+if __name__ == '__main__':
+    try:
+        serve(port=int(os.environ.get('AUTH_PORT', 8000)),
+              max_workers=int(os.environ.get('AUTH_WORKERS', 64)),
+              max_idle=int(os.environ.get('AUTH_MAX_IDLE_CONNECTIONS', 1024)),
+              keep_alive_timeout=float(os.environ.get('AUTH_KEEP_ALIVE_TIMEOUT', 15)))
     except Exception as e:
         logging.error(f'Server failed to start: {str(e)}\n{traceback.format_exc()}')
         raise